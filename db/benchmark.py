@@ -0,0 +1,186 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, bindparam, create_engine, func, insert, select, text, update
+
+from db import sqlite
+from ml.asignacion import _libres
+from ml.features import tarea_statement
+from models.data import (
+	Base, uuid7, User, Universidad, Centro_Practicas, Profesor, Cliente, Concertacion_Tema, Tarea, Estudiante
+)
+
+#Compara el esquema anterior (un indice por cada columna de datos, ninguno en las llaves
+#foraneas) contra el actual de models.data, sobre dos bases SQLite temporales iguales
+
+TABLAS = [User, Universidad, Centro_Practicas, Profesor, Cliente, Concertacion_Tema, Tarea, Estudiante]
+
+
+def _perfil_anterior(conn):
+	for modelo in TABLAS:
+		tabla = modelo.__table__
+		for indice in tabla.indexes:
+			if not indice.unique or indice.name == "ix_concertacion_tema_id_conc_tema":
+				conn.execute(text(f'DROP INDEX "{indice.name}"'))
+		for columna in tabla.columns:
+			if columna.primary_key or columna.foreign_keys or columna.unique:
+				continue
+			if isinstance(columna.type, (DateTime, Float)) or columna.name in ("deshabilitado", "hashed_password", "token_version"):
+				continue
+			conn.execute(text(f'CREATE INDEX "ix_{tabla.name}_{columna.name}" ON "{tabla.name}" ("{columna.name}")'))
+
+
+def _fila(modelo, i, **valores):
+	#Valores de relleno para las columnas de datos; las llaves se pasan en valores
+	fila = {}
+	for columna in modelo.__table__.columns:
+		if columna.name in valores or columna.foreign_keys:
+			continue
+		if columna.primary_key:
+			fila[columna.name] = uuid7()
+		elif isinstance(columna.type, Boolean):
+			fila[columna.name] = random.random() < 0.5
+		elif isinstance(columna.type, Integer):
+			fila[columna.name] = random.randint(0, 20)
+		elif isinstance(columna.type, Float):
+			fila[columna.name] = random.random()
+		elif isinstance(columna.type, DateTime):
+			fila[columna.name] = datetime.utcnow()
+		elif columna.unique:
+			fila[columna.name] = f"{columna.name[:10]}{i}"
+		else:
+			fila[columna.name] = random.choice(["Alta", "Media", "Baja", "Ninguna"]) + " " * random.randint(0, 40)
+	fila.update(valores)
+	return fila
+
+
+def _usuarios(lotes, n, inicio):
+	filas = [_fila(User, inicio + i) for i in range(n)]
+	lotes.append((User, filas))
+	return [fila["id"] for fila in filas]
+
+
+def _datos(profesores, clientes, concertaciones, estudiantes):
+	#[(modelo, filas)] en orden de insercion y los ids que usan las consultas
+	lotes = []
+	universidades = [_fila(Universidad, i) for i in range(5)]
+	centros = [_fila(Centro_Practicas, i) for i in range(5)]
+	lotes += [(Universidad, universidades), (Centro_Practicas, centros)]
+	filas_prf = [
+		_fila(Profesor, i, prf_universidad_id=random.choice(universidades)["id_universidad"], user_profesor_id=usuario)
+		for i, usuario in enumerate(_usuarios(lotes, profesores, 0))
+	]
+	filas_cli = [
+		_fila(Cliente, i, cli_centro_id=random.choice(centros)["id_centro"], user_cliente_id=usuario)
+		for i, usuario in enumerate(_usuarios(lotes, clientes, profesores))
+	]
+	filas_conc = [
+		_fila(Concertacion_Tema, i,
+			conc_profesor_id=random.choice(filas_prf)["id_profesor"],
+			conc_cliente_id=random.choice(filas_cli)["id_cliente"])
+		for i in range(concertaciones)
+	]
+	filas_tarea = [
+		_fila(Tarea, i, concertacion_tarea_id=random.choice(filas_conc)["id_conc_tema"])
+		for i in range(2 * concertaciones)
+	]
+	filas_est = [
+		_fila(Estudiante, i,
+			est_universidad_id=random.choice(universidades)["id_universidad"],
+			tareas_estudiantes_id=random.choice(filas_tarea)["id_tarea"],
+			user_estudiante_id=usuario)
+		for i, usuario in enumerate(_usuarios(lotes, estudiantes, profesores + clientes))
+	]
+	lotes += [(Profesor, filas_prf), (Cliente, filas_cli), (Concertacion_Tema, filas_conc), (Tarea, filas_tarea), (Estudiante, filas_est)]
+	ids = {
+		"universidades": [fila["id_universidad"] for fila in universidades],
+		"profesores": [fila["id_profesor"] for fila in filas_prf],
+		"clientes": [fila["id_cliente"] for fila in filas_cli],
+		"tareas": [fila["id_tarea"] for fila in filas_tarea],
+		"estudiantes": [fila["id_estudiante"] for fila in filas_est],
+	}
+	return lotes, ids
+
+
+def _latencia(conn, statement, repeticiones):
+	conn.execute(statement).all()
+	tiempos = []
+	for _ in range(repeticiones):
+		inicio = time.perf_counter()
+		conn.execute(statement).all()
+		tiempos.append(time.perf_counter() - inicio)
+	return 1e6 * statistics.median(tiempos)
+
+
+def medir(perfil, profesores=200, clientes=200, concertaciones=2000, estudiantes=8000, repeticiones=50):
+	random.seed(0)
+	with tempfile.TemporaryDirectory() as carpeta:
+		engine = create_engine(f"sqlite:///{os.path.join(carpeta, 'benchmark.db')}")
+		sqlite.configurar(engine)
+		Base.metadata.create_all(bind=engine, tables=[modelo.__table__ for modelo in TABLAS])
+		with engine.begin() as conn:
+			if perfil == "antes":
+				_perfil_anterior(conn)
+			indices = conn.execute(text("SELECT count(*) FROM sqlite_master WHERE type = 'index'")).scalar()
+		lotes, ids = _datos(profesores, clientes, concertaciones, estudiantes)
+		inicio = time.perf_counter()
+		with engine.begin() as conn:
+			for modelo, filas in lotes:
+				conn.execute(insert(modelo), filas)
+		insercion = time.perf_counter() - inicio
+		#Lo que cambian la evaluacion y la asignacion: columnas que antes tenian indice propio
+		tarea, estudiante = Tarea.__table__, Estudiante.__table__
+		cambios_tarea = [{"t_id": id, "evaluacion": random.choice(["Positiva", "Mejorable"]), "participantes": random.randint(1, 5)} for id in ids["tareas"]]
+		cambios_est = [{"e_id": id, "tarea": random.choice(ids["tareas"])} for id in ids["estudiantes"][::2]]
+		inicio = time.perf_counter()
+		with engine.begin() as conn:
+			conn.execute(update(tarea).where(tarea.c.id_tarea == bindparam("t_id")).values(
+				tarea_evaluacion=bindparam("evaluacion"), tarea_evaluacion_pred=bindparam("evaluacion"), tarea_participantes=bindparam("participantes")
+			), cambios_tarea)
+			conn.execute(update(estudiante).where(estudiante.c.id_estudiante == bindparam("e_id")).values(
+				est_ocupado=True, tareas_estudiantes_id=bindparam("tarea")
+			), cambios_est)
+		actualizacion = time.perf_counter() - inicio
+		with engine.connect() as conn:
+			consultas = {
+				"tareas_de_cliente": tarea_statement().where(Concertacion_Tema.conc_cliente_id == ids["clientes"][0]),
+				"concertaciones_de_profesor": select(Concertacion_Tema).where(Concertacion_Tema.conc_profesor_id == ids["profesores"][0]),
+				"asignados_por_tarea": select(func.count(Estudiante.id_estudiante)).where(Estudiante.tareas_estudiantes_id == ids["tareas"][0]),
+				"libres_de_universidad": select(Estudiante.id_estudiante).where(Estudiante.est_universidad_id == ids["universidades"][0], _libres()),
+			}
+			latencias = {nombre: _latencia(conn, statement, repeticiones) for nombre, statement in consultas.items()}
+			bytes_base = conn.execute(text("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()")).scalar()
+		engine.dispose()
+	return {
+		"perfil": perfil,
+		"indices": indices,
+		"insercion_filas_s": sum(len(filas) for _, filas in lotes) / insercion,
+		"actualizacion_filas_s": (len(cambios_tarea) + len(cambios_est)) / actualizacion,
+		"latencia_us": latencias,
+		"bytes_base": bytes_base,
+	}
+
+
+def imprimir(antes, despues):
+	print(f"  {'':<28} {'antes':>12} {'despues':>12}")
+	print(f"  {'indices':<28} {antes['indices']:>12} {despues['indices']:>12}")
+	print(f"  {'insercion filas/s':<28} {antes['insercion_filas_s']:>12.0f} {despues['insercion_filas_s']:>12.0f}")
+	print(f"  {'actualizacion filas/s':<28} {antes['actualizacion_filas_s']:>12.0f} {despues['actualizacion_filas_s']:>12.0f}")
+	for nombre in antes["latencia_us"]:
+		print(f"  {nombre + ' us':<28} {antes['latencia_us'][nombre]:>12.1f} {despues['latencia_us'][nombre]:>12.1f}")
+	print(f"  {'tamanno KiB':<28} {antes['bytes_base'] / 1024:>12.0f} {despues['bytes_base'] / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compara escritura y joins con los indices anteriores y los actuales")
+	parser.add_argument("--concertaciones", type=int, default=2000)
+	parser.add_argument("--estudiantes", type=int, default=8000)
+	parser.add_argument("--repeticiones", type=int, default=50)
+	args = parser.parse_args()
+	opciones = {"concertaciones": args.concertaciones, "estudiantes": args.estudiantes, "repeticiones": args.repeticiones}
+	imprimir(medir("antes", **opciones), medir("despues", **opciones))
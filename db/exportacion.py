@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from uuid import UUID
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from core import config
+from db.database import AsyncSessionLocal
+from db.paginacion import Pagina, desde
+
+#Exportacion completa de un listado leer_* sin armar la lista en memoria: la consulta se recorre con
+#un cursor del servidor (yield_per) y cada lote se codifica y se envia antes de leer el siguiente
+
+FORMATOS = {
+	"application/x-ndjson": "ndjson",
+	"text/csv": "csv",
+}
+
+
+def formato(request: Request):
+	#"ndjson", "csv" o None (respuesta JSON paginada) segun el encabezado Accept
+	for tipo in request.headers.get("accept", "").split(","):
+		tipo = tipo.split(";")[0].strip().lower()
+		if tipo in FORMATOS:
+			return FORMATOS[tipo]
+	return None
+
+
+def _valor(valor):
+	#Solo para lo que json no codifica (UUID, fechas); lo demas lo resuelve el codificador en C
+	if isinstance(valor, (datetime, date)):
+		return valor.isoformat()
+	if isinstance(valor, UUID):
+		return str(valor)
+	raise TypeError(f"{type(valor).__name__} no se puede exportar")
+
+
+_json = json.JSONEncoder(ensure_ascii=False, default=_valor).encode
+
+
+def _ndjson(campos, filas):
+	return "".join(_json(dict(zip(campos, fila))) + "\n" for fila in filas)
+
+
+def _csv(filas):
+	#None queda como campo vacio y el resto como str(valor)
+	buffer = io.StringIO()
+	csv.writer(buffer).writerows(filas)
+	return buffer.getvalue()
+
+
+async def _filas(statement, codificar):
+	#Sesion propia: la de get_db puede cerrarse antes de que termine el envio de la respuesta
+	async with AsyncSessionLocal() as db:
+		resultado = await db.stream(statement.execution_options(yield_per=config.EXPORT_BATCH_SIZE))
+		async for lote in resultado.partitions():
+			yield codificar(lote)
+
+
+async def _con_encabezado(encabezado, filas):
+	yield encabezado
+	async for texto in filas:
+		yield texto
+
+
+def exportar(statement, llaves, pagina: Pagina, campos, tipo, nombre):
+	#statement como en paginar (sin order_by ni limit); campos: nombre de cada columna de la fila.
+	#Recorre todo desde el cursor de pagina en el orden de llaves; limit y total no aplican
+	consulta = desde(statement, llaves, pagina)
+	if tipo == "csv":
+		return StreamingResponse(_con_encabezado(_csv([campos]), _filas(consulta, _csv)), media_type="text/csv",
+			headers={"Content-Disposition": f'attachment; filename="{nombre}.csv"'})
+	return StreamingResponse(_filas(consulta, lambda lote: _ndjson(campos, lote)), media_type="application/x-ndjson")
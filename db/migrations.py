@@ -0,0 +1,224 @@
+import json
+import logging
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import LargeBinary, inspect, insert, text
+from sqlalchemy.schema import AddConstraint, CreateTable
+
+#Cambios de esquema sobre bases existentes que Base.metadata.create_all no aplica.
+#Cada paso debe ser idempotente: en una base nueva create_all ya crea el esquema final.
+
+logger = logging.getLogger(__name__)
+
+def _add_column(conn, tabla, columna, tipo):
+	columnas = {c["name"] for c in inspect(conn).get_columns(tabla)}
+	if columna not in columnas:
+		conn.execute(text(f'ALTER TABLE "{tabla}" ADD COLUMN {columna} {tipo}'))
+
+
+def _0001_probabilidad_predicha(conn):
+	_add_column(conn, "tarea", "tarea_evaluacion_prob", "FLOAT")
+	_add_column(conn, "concertacion_tema", "conc_evaluacion_prob", "FLOAT")
+
+
+def _0002_almacen_caracteristicas(conn):
+	#create_all crea las tablas vacias; se llenan a partir de los datos existentes
+	from ml.feature_store import reconstruir
+	reconstruir(conn)
+
+
+def _0003_version_token(conn):
+	_add_column(conn, "user", "token_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _0004_indices(conn):
+	#Quita los indices de una columna que ninguna consulta usa y crea los declarados en
+	#models.data (llaves foraneas de los joins). Los indices unicos no se tocan
+	from models.data import Base
+	inspector = inspect(conn)
+	for tabla in Base.metadata.sorted_tables:
+		if not inspector.has_table(tabla.name):
+			continue
+		declarados = {indice.name for indice in tabla.indexes}
+		for indice in inspector.get_indexes(tabla.name):
+			if indice["name"].startswith("ix_") and not indice["unique"] and indice["name"] not in declarados:
+				conn.execute(text(f'DROP INDEX "{indice["name"]}"'))
+		for indice in tabla.indexes:
+			indice.create(conn, checkfirst=True)
+
+
+def _uuid_blob(valor):
+	if valor is None or isinstance(valor, bytes):
+		return valor
+	return UUID(valor).bytes
+
+
+def _0005_uuid_binario(conn):
+	#En SQLite las llaves GUID pasan de texto hexadecimal CHAR(32) a BLOB de 16 bytes. SQLite no
+	#cambia el tipo de una columna: cada tabla se crea con otro nombre, se copia y se renombra.
+	#Las referencias entre tablas a medio convertir no se revisan: aplicar_migraciones desactiva
+	#foreign_keys. En Postgres ya eran uuid nativo
+	if conn.dialect.name != "sqlite":
+		return
+	from models.data import Base, BinaryGUID
+	conn.connection.dbapi_connection.create_function("uuid_blob", 1, _uuid_blob, deterministic=True)
+	inspector = inspect(conn)
+	preparer = conn.dialect.identifier_preparer
+	for tabla in Base.metadata.sorted_tables:
+		if not inspector.has_table(tabla.name):
+			continue
+		existentes = {columna["name"]: columna["type"] for columna in inspector.get_columns(tabla.name)}
+		guid = {
+			columna.name for columna in tabla.columns
+			if isinstance(columna.type, BinaryGUID) and columna.name in existentes and not isinstance(existentes[columna.name], LargeBinary)
+		}
+		if not guid:
+			continue
+		nombre, nuevo = preparer.format_table(tabla), preparer.quote(f"_nuevo_{tabla.name}")
+		ddl = str(CreateTable(tabla).compile(dialect=conn.dialect))
+		conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {nombre}", f"CREATE TABLE {nuevo}", 1))
+		columnas = [columna.name for columna in tabla.columns if columna.name in existentes]
+		destino = ", ".join(preparer.quote(columna) for columna in columnas)
+		origen = ", ".join(f"uuid_blob({preparer.quote(columna)})" if columna in guid else preparer.quote(columna) for columna in columnas)
+		conn.exec_driver_sql(f"INSERT INTO {nuevo} ({destino}) SELECT {origen} FROM {nombre}")
+		conn.exec_driver_sql(f"DROP TABLE {nombre}")
+		conn.exec_driver_sql(f"ALTER TABLE {nuevo} RENAME TO {nombre}")
+		for indice in tabla.indexes:
+			indice.create(conn)
+
+
+def _0006_roles(conn):
+	#Los roles pasan de una lista JSON en user.role a una fila por rol en user_role
+	from models.data import User_Role
+	if "role" not in {columna["name"] for columna in inspect(conn).get_columns("user")}:
+		return
+	filas = []
+	for id, texto in conn.execute(text('SELECT id, role FROM "user"')).all():
+		#Texto hexadecimal antes de 0005, BLOB despues; uuid en Postgres
+		id = UUID(bytes=id) if isinstance(id, bytes) else UUID(str(id))
+		roles = json.loads(texto) if texto else []
+		for role in dict.fromkeys([roles] if isinstance(roles, str) else roles):
+			filas.append({"role": role, "user_id": id})
+	if filas:
+		conn.execute(insert(User_Role), filas)
+	conn.execute(text('ALTER TABLE "user" DROP COLUMN role'))
+
+
+def _0007_referencias_huerfanas(conn):
+	#Antes de activar las llaves foraneas en SQLite, eliminar un profesor o cliente borraba sus
+	#concertaciones sin sus tareas. Las referencias que admiten NULL y apuntan a una fila
+	#inexistente quedan en NULL; con las llaves activas cualquier UPDATE de esas filas fallaria
+	if conn.dialect.name != "sqlite":
+		return
+	for tabla, rowid, padre, fkid in conn.exec_driver_sql("PRAGMA foreign_key_check").all():
+		if rowid is None:
+			continue
+		columnas = [fila[3] for fila in conn.exec_driver_sql(f'PRAGMA foreign_key_list("{tabla}")') if fila[0] == fkid]
+		obligatorias = {fila[1] for fila in conn.exec_driver_sql(f'PRAGMA table_info("{tabla}")') if fila[3] or fila[5]}
+		if not columnas or obligatorias.intersection(columnas):
+			continue
+		asignaciones = ", ".join(f'"{columna}" = NULL' for columna in columnas)
+		conn.execute(text(f'UPDATE "{tabla}" SET {asignaciones} WHERE rowid = :rowid'), {"rowid": rowid})
+
+
+def _0008_evaluadas(conn):
+	#tarea_evaluacion y conc_evaluacion valen "Mejorable" por defecto: una fila sin evaluar no se
+	#distingue de una evaluada como Mejorable. Solo las que tienen otro valor se dan por evaluadas;
+	#las demas entran al entrenamiento cuando se vuelvan a evaluar
+	from models.data import Tarea, Concertacion_Tema
+	ahora = datetime.utcnow()
+	for tabla, evaluacion, evaluada in ((Tarea.__table__, "tarea_evaluacion", "tarea_evaluada"),
+			(Concertacion_Tema.__table__, "conc_evaluacion", "conc_evaluada")):
+		_add_column(conn, tabla.name, evaluada, "TIMESTAMP")
+		conn.execute(text(f'UPDATE "{tabla.name}" SET {evaluada} = :ahora WHERE {evaluada} IS NULL '
+			f"AND {evaluacion} IS NOT NULL AND {evaluacion} != 'Mejorable'"), {"ahora": ahora})
+		for indice in tabla.indexes:
+			indice.create(conn, checkfirst=True)
+
+
+def _reconstruir(conn, tabla):
+	#SQLite no cambia las restricciones de una tabla existente: se crea con la definicion de
+	#models.data con otro nombre, se copian las columnas comunes y se renombra
+	preparer = conn.dialect.identifier_preparer
+	existentes = {columna["name"] for columna in inspect(conn).get_columns(tabla.name)}
+	nombre, nuevo = preparer.format_table(tabla), preparer.quote(f"_nuevo_{tabla.name}")
+	ddl = str(CreateTable(tabla).compile(dialect=conn.dialect))
+	conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {nombre}", f"CREATE TABLE {nuevo}", 1))
+	columnas = ", ".join(preparer.quote(columna.name) for columna in tabla.columns if columna.name in existentes)
+	conn.exec_driver_sql(f"INSERT INTO {nuevo} ({columnas}) SELECT {columnas} FROM {nombre}")
+	conn.exec_driver_sql(f"DROP TABLE {nombre}")
+	conn.exec_driver_sql(f"ALTER TABLE {nuevo} RENAME TO {nombre}")
+	for indice in tabla.indexes:
+		indice.create(conn)
+
+
+def _0009_estudiante_sin_tarea(conn):
+	#estudiante.tareas_estudiantes_id pasa a ON DELETE SET NULL: eliminar una tarea (o la
+	#concertacion, el profesor o el cliente de los que depende) no elimina a sus estudiantes
+	from models.data import Estudiante
+	tabla = Estudiante.__table__
+	columnas = ["tareas_estudiantes_id"]
+	llave = next((llave for llave in inspect(conn).get_foreign_keys(tabla.name) if llave["constrained_columns"] == columnas), None)
+	if llave is None or (llave.get("options") or {}).get("ondelete", "").upper() == "SET NULL":
+		return
+	if conn.dialect.name == "sqlite":
+		_reconstruir(conn, tabla)
+		return
+	conn.execute(text(f'ALTER TABLE "{tabla.name}" DROP CONSTRAINT "{llave["name"]}"'))
+	conn.execute(AddConstraint(next(restriccion for restriccion in tabla.foreign_key_constraints if restriccion.column_keys == columnas)))
+
+
+#Se ejecutan en el orden de la lista. 0005 va antes de 0002: en una base sin migrar las llaves
+#deben estar en binario antes de leerlas con los modelos. Copia user con las columnas de
+#models.data: va despues de 0003, que agrega token_version, y de 0006, que lee role
+MIGRACIONES = [
+	("0001_probabilidad_predicha", _0001_probabilidad_predicha),
+	("0003_version_token", _0003_version_token),
+	("0006_roles", _0006_roles),
+	("0005_uuid_binario", _0005_uuid_binario),
+	("0002_almacen_caracteristicas", _0002_almacen_caracteristicas),
+	("0004_indices", _0004_indices),
+	("0007_referencias_huerfanas", _0007_referencias_huerfanas),
+	("0008_evaluadas", _0008_evaluadas),
+	("0009_estudiante_sin_tarea", _0009_estudiante_sin_tarea),
+]
+
+
+def aplicar_migraciones(engine):
+	aplicadas = []
+	with engine.connect() as conn:
+		#En SQLite las migraciones corren sin llaves foraneas: 0006 escribe user_role con llaves binarias
+		#antes de que 0005 convierta user.id, y 0005 reconstruye tablas referenciadas. PRAGMA
+		#foreign_keys no cambia dentro de una transaccion; se restaura al terminar y se revisa
+		sqlite = conn.dialect.name == "sqlite"
+		if sqlite:
+			llaves = conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+			conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+			conn.commit()
+		try:
+			with conn.begin():
+				conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (id VARCHAR(100) PRIMARY KEY, aplicada TIMESTAMP NOT NULL)"))
+				existentes = {fila[0] for fila in conn.execute(text("SELECT id FROM schema_version"))}
+				for id, migracion in MIGRACIONES:
+					if id in existentes:
+						continue
+					migracion(conn)
+					conn.execute(text("INSERT INTO schema_version (id, aplicada) VALUES (:id, :aplicada)"), {"id": id, "aplicada": datetime.utcnow()})
+					aplicadas.append(id)
+		finally:
+			if sqlite:
+				conn.exec_driver_sql(f"PRAGMA foreign_keys = {llaves}")
+				conn.commit()
+		if sqlite and llaves and aplicadas:
+			violaciones = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+			if violaciones:
+				logger.warning("Llaves foraneas sin fila referenciada despues de migrar: %s", violaciones)
+	return aplicadas
+
+
+if __name__ == "__main__":
+	#Importar db.database aplica las migraciones pendientes
+	from db.database import engine
+	with engine.connect() as conn:
+		for id, aplicada in conn.execute(text("SELECT id, aplicada FROM schema_version ORDER BY id")):
+			print(id, aplicada)
@@ -0,0 +1,70 @@
+import base64
+import binascii
+import json
+from typing import Union
+from uuid import UUID
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import func, select, tuple_
+
+from core import config
+
+#Paginacion por llave (keyset): cada pagina continua despues de la ultima fila de la anterior en
+#lugar de saltar skip filas, el costo no depende de la profundidad. El orden es el de las llaves
+#GUID de cada fila; con uuid7 coincide con el orden de creacion
+
+
+class Pagina:
+	#Dependencia de los endpoints leer_*: ?cursor=<X-Next-Cursor de la pagina anterior>&limit=&total=
+	def __init__(self, cursor: Union[str, None] = None, limit: int = config.PAGE_SIZE_DEFAULT, total: bool = False):
+		self.limit = max(1, min(limit, config.PAGE_SIZE_MAX))
+		self.despues = _decodificar(cursor) if cursor else None
+		self.total = total
+
+
+def _cursor_invalido():
+	return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor no valido")
+
+
+def _codificar(valores):
+	texto = json.dumps([valor.hex for valor in valores], separators=(",", ":"))
+	return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def _decodificar(cursor):
+	try:
+		texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+		return [UUID(valor) for valor in json.loads(texto)]
+	except (binascii.Error, ValueError, TypeError, AttributeError):
+		raise _cursor_invalido()
+
+
+async def _contar(db, statement):
+	limite = config.PAGE_COUNT_LIMIT
+	total = (await db.execute(select(func.count()).select_from(statement.limit(limite + 1).subquery()))).scalar()
+	return f"{limite}+" if total > limite else str(total)
+
+
+def desde(statement, llaves, pagina: Pagina):
+	#statement en el orden de llaves, a partir de la fila siguiente al cursor de pagina
+	consulta = statement.order_by(*llaves)
+	if pagina.despues is not None:
+		if len(pagina.despues) != len(llaves):
+			raise _cursor_invalido()
+		consulta = consulta.where(tuple_(*llaves) > tuple(pagina.despues))
+	return consulta
+
+
+async def paginar(db, statement, llaves, pagina: Pagina, response: Response):
+	#Filas de una pagina de statement (sin order_by ni limit). llaves: columnas GUID que identifican
+	#cada fila, p. ej. (Estudiante.id_estudiante,) en los listados de tareas, una fila por estudiante;
+	#conviene que sean la llave primaria de la tabla que recorre el join para no ordenar el resultado.
+	#Las filas no incluyen las llaves agregadas; el cursor de la siguiente pagina va en X-Next-Cursor
+	if pagina.total:
+		response.headers["X-Total-Count"] = await _contar(db, statement)
+	consulta = desde(statement.add_columns(*llaves), llaves, pagina).limit(pagina.limit + 1)
+	filas = (await db.execute(consulta)).all()
+	if len(filas) > pagina.limit:
+		filas = filas[:pagina.limit]
+		response.headers["X-Next-Cursor"] = _codificar(filas[-1][-len(llaves):])
+	return [fila[:-len(llaves)] for fila in filas]
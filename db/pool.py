@@ -0,0 +1,120 @@
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from core import config
+
+
+class PoolMetrics:
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.checkouts = 0
+		self.timeouts = 0
+		self.espera_total = 0.0
+		self.espera_maxima = 0.0
+
+	def registrar(self, espera):
+		with self._lock:
+			self.checkouts += 1
+			self.espera_total += espera
+			self.espera_maxima = max(self.espera_maxima, espera)
+
+	def timeout(self):
+		with self._lock:
+			self.timeouts += 1
+
+	def resumen(self):
+		with self._lock:
+			return {
+				"checkouts": self.checkouts,
+				"timeouts": self.timeouts,
+				"espera_promedio_ms": 1000 * self.espera_total / self.checkouts if self.checkouts else 0,
+				"espera_maxima_ms": 1000 * self.espera_maxima,
+			}
+
+
+class _PoolMedido:
+	#Mide cuanto espera cada checkout por una conexion (incluye abrirla si el pool crece).
+	#Las metricas son de la clase: sobreviven a engine.dispose(), que crea un pool nuevo
+	metricas = None
+
+	def _do_get(self):
+		inicio = time.perf_counter()
+		try:
+			conexion = super()._do_get()
+		except exc.TimeoutError:
+			self.metricas.timeout()
+			raise
+		self.metricas.registrar(time.perf_counter() - inicio)
+		return conexion
+
+
+class MeteredQueuePool(_PoolMedido, QueuePool):
+	metricas = PoolMetrics()
+
+
+class MeteredAsyncQueuePool(_PoolMedido, AsyncAdaptedQueuePool):
+	metricas = PoolMetrics()
+
+
+def urls(url=None):
+	#(sincrona, asincrona) para la misma base de datos; en Postgres psycopg 3 sirve para ambas
+	url = make_url(url or config.DATABASE_URL)
+	if url.drivername in ("postgres", "postgresql"):
+		url = url.set(drivername="postgresql+psycopg")
+	if url.get_backend_name() == "sqlite":
+		return url, url.set(drivername="sqlite+aiosqlite")
+	return url, url
+
+
+def opciones_motor(url, asincrono=False):
+	opciones = {
+		"poolclass": MeteredAsyncQueuePool if asincrono else MeteredQueuePool,
+		"pool_size": config.DB_POOL_SIZE,
+		"max_overflow": config.DB_MAX_OVERFLOW,
+		"pool_timeout": config.DB_POOL_TIMEOUT,
+		"pool_recycle": config.DB_POOL_RECYCLE,
+		"pool_pre_ping": config.DB_POOL_PRE_PING,
+	}
+	if url.get_backend_name() == "sqlite":
+		opciones["connect_args"] = {"check_same_thread": False}
+	elif url.get_backend_name() == "postgresql" and config.DB_STATEMENT_TIMEOUT_MS:
+		opciones["connect_args"] = {"options": f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}"}
+	return opciones
+
+
+def estado(engine):
+	pool = engine.pool
+	return {
+		"clase": type(pool).__name__,
+		"tamanno": pool.size(),
+		"disponibles": pool.checkedin(),
+		"en_uso": pool.checkedout(),
+		"overflow": pool.overflow(),
+		**(pool.metricas.resumen() if isinstance(pool, _PoolMedido) else {}),
+	}
+
+
+def reporte(engine, async_engine, workers=None):
+	#Para dimensionar: cada worker de gunicorn tiene sus dos motores con su propio pool
+	por_motor = config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW
+	resultado = {
+		"url": engine.url.render_as_string(hide_password=True),
+		"dialecto": engine.dialect.name,
+		**({"perfil_sqlite": config.SQLITE_PROFILE} if engine.dialect.name == "sqlite" else {}),
+		"pool_size": config.DB_POOL_SIZE,
+		"max_overflow": config.DB_MAX_OVERFLOW,
+		"pool_timeout": config.DB_POOL_TIMEOUT,
+		"pool_recycle": config.DB_POOL_RECYCLE,
+		"pool_pre_ping": config.DB_POOL_PRE_PING,
+		"conexiones_maximas_por_worker": 2 * por_motor,
+		"sincrono": estado(engine),
+		"asincrono": estado(async_engine.sync_engine),
+	}
+	if workers:
+		resultado["workers"] = workers
+		resultado["conexiones_maximas"] = workers * 2 * por_motor
+	return resultado
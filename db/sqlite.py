@@ -0,0 +1,55 @@
+from sqlalchemy import event, text
+
+from core import config
+
+#Perfil de SQLite para varios workers escribiendo: en modo WAL los lectores no esperan al escritor
+#y un escritor espera al otro hasta busy_timeout en lugar de fallar con "database is locked".
+#journal_mode=WAL queda guardado en el archivo; el resto es por conexion.
+
+PERFILES = ("wal", "ninguno")
+
+
+def pragmas():
+	#Nombre -> valor esperado al consultar el pragma
+	if config.SQLITE_PROFILE == "ninguno":
+		return {}
+	if config.SQLITE_PROFILE not in PERFILES:
+		raise ValueError(f"SQLITE_PROFILE no valido: {config.SQLITE_PROFILE}, opciones: {', '.join(PERFILES)}")
+	return {
+		"journal_mode": "wal",
+		#NORMAL en WAL: sin fsync por commit, solo en los checkpoints; la base nunca queda corrupta
+		"synchronous": 1,
+		"busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+		"mmap_size": config.SQLITE_MMAP_SIZE,
+		"cache_size": config.SQLITE_CACHE_SIZE,
+		#MEMORY
+		"temp_store": 2,
+		"foreign_keys": int(config.SQLITE_FOREIGN_KEYS),
+	}
+
+
+def _aplicar(dbapi_connection, connection_record):
+	cursor = dbapi_connection.cursor()
+	for nombre, valor in pragmas().items():
+		cursor.execute(f"PRAGMA {nombre}={valor}")
+	cursor.close()
+
+
+def configurar(engine):
+	#Antes de la primera conexion; engine es el motor sincrono (o AsyncEngine.sync_engine)
+	if engine.dialect.name == "sqlite" and pragmas():
+		event.listen(engine, "connect", _aplicar)
+
+
+def verificar(engine):
+	#{pragma: {"esperado", "obtenido"}} de los que no quedaron aplicados (vacio si todo esta bien).
+	#WAL no se puede activar en una base en memoria ni en algunos sistemas de archivos de red
+	if engine.dialect.name != "sqlite":
+		return {}
+	diferencias = {}
+	with engine.connect() as conn:
+		for nombre, esperado in pragmas().items():
+			obtenido = conn.execute(text(f"PRAGMA {nombre}")).scalar()
+			if str(obtenido).lower() != str(esperado).lower():
+				diferencias[nombre] = {"esperado": esperado, "obtenido": obtenido}
+	return diferencias
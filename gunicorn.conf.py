@@ -0,0 +1,25 @@
+import multiprocessing
+from os import getenv
+
+#gunicorn -c gunicorn.conf.py
+wsgi_app = "main:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = "0.0.0.0:" + getenv("PORT", "8000")
+workers = int(getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+timeout = int(getenv("GUNICORN_TIMEOUT", "120"))
+
+#La aplicacion se importa en el maestro y los modelos se cargan antes del fork:
+#los workers comparten las mismas paginas (copy-on-write, o mmap con INFERENCE_BACKEND=compact)
+preload_app = True
+
+
+def on_starting(server):
+	from ml.registry import registry
+	registry.cargar_todos()
+
+
+def post_fork(server, worker):
+	#Las conexiones abiertas por el maestro (migraciones al importar) no se comparten con los hijos
+	from db.database import engine, async_engine
+	engine.dispose(close=False)
+	async_engine.sync_engine.dispose(close=False)
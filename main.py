@@ -1,5 +1,8 @@
+import logging
+from os import getenv
 from fastapi import FastAPI
 from functools import lru_cache
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from uuid import uuid4
 
@@ -13,9 +16,32 @@ from routers.clientes import cliente
 from routers.estudiantes import estudiante
 from routers.tareas import tarea
 from routers.concertaciones import concertacion
+from routers.modelos import modelo
+from routers.sistema import sistema
+from db.database import engine, async_engine
+from db import pool, sqlite
+from ml.registry import registry
+from ml.inference import scheduler
+from ml.training import trabajos
+from security.passwords import contrasennas
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	#Cargar los modelos una sola vez al iniciar
+	registry.cargar_todos()
+	logger.info("Pool de conexiones: %s", pool.reporte(engine, async_engine, int(getenv("WEB_CONCURRENCY", "0"))))
+	diferencias = sqlite.verificar(engine)
+	if diferencias:
+		logger.warning("Perfil de SQLite %s no aplicado por completo: %s", config.SQLITE_PROFILE, diferencias)
+	yield
+	await scheduler.detener()
+	trabajos.detener()
+	contrasennas.detener()
 
 #Create our main app "https://pp-back-end.onrender.com"
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(auth.router)  #, prefix="/auth", tags=["auth"]
 app.include_router(users.router, prefix="/usuario", tags=["usuario"])
@@ -26,6 +52,8 @@ app.include_router(estudiante.router, prefix="/estudiante", tags=["estudiante"])
 app.include_router(cliente.router, prefix="/cliente", tags=["cliente"])
 app.include_router(tarea.router, prefix="/tarea", tags=["tarea"])
 app.include_router(concertacion.router, prefix="/concertacion", tags=["concertacion"])
+app.include_router(modelo.router, prefix="/modelo", tags=["modelo"])
+app.include_router(sistema.router, prefix="/sistema", tags=["sistema"])
 
 
 # Allow these methods to be used
@@ -0,0 +1,136 @@
+import time
+from collections import Counter
+from uuid import UUID
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sqlalchemy import select, update, func, or_, bindparam
+
+from core import config
+from models.data import Tarea, Estudiante
+from ml.features import tarea_base_statement, estudiante_statement
+from ml.feature_store import refrescar
+from ml.registry import registry
+from ml.emparejamiento import codificar_parte
+from ml.simulacion import CLASE_POSITIVA
+
+#Asignacion de estudiantes libres a tareas abiertas maximizando la probabilidad total de
+#exito predicha: cada tarea aporta tantas plazas como participantes le faltan
+
+
+class AssignmentError(Exception):
+	pass
+
+
+class AssignmentConflict(AssignmentError):
+	pass
+
+
+def _libres():
+	tabla = Estudiante.__table__
+	return or_(tabla.c.est_ocupado == False, tabla.c.est_ocupado.is_(None))
+
+
+def _asignados():
+	return select(func.count(Estudiante.id_estudiante)
+		).where(Estudiante.tareas_estudiantes_id == Tarea.id_tarea
+		).correlate(Tarea).scalar_subquery()
+
+
+def _plazas(db, ids=None):
+	statement = tarea_base_statement().add_columns(_asignados().label("asignados")).where(Tarea.tarea_activa == True)
+	if ids is not None:
+		statement = statement.where(Tarea.id_tarea.in_(ids))
+	tareas = []
+	for fila in db.execute(statement):
+		plazas = (fila.tarea_participantes or 0) - fila.asignados
+		if plazas > 0:
+			tareas.append((fila.id_tarea, dict(fila._mapping), plazas))
+	return tareas
+
+
+def proponer(db, universidad=None, minimo=0.0, filas_bloque=None):
+	inicio = time.perf_counter()
+	filas_bloque = filas_bloque or config.MATCHING_CHUNK_ROWS
+	artefacto = registry.obtener("tarea")
+	encoder = artefacto.encoder
+	statement = estudiante_statement().where(_libres())
+	if universidad is not None:
+		statement = statement.where(Estudiante.est_universidad_id == universidad)
+	estudiantes = [(fila.id_estudiante, dict(fila._mapping)) for fila in db.execute(statement)]
+	tareas = _plazas(db)
+	resultado = {"version": artefacto.version, "estudiantes": len(estudiantes), "tareas": len(tareas),
+		"plazas": sum(plazas for _, _, plazas in tareas), "asignaciones": []}
+	if not estudiantes or not tareas:
+		return resultado
+	E, T = len(estudiantes), len(tareas)
+	capacidad = np.array([plazas for _, _, plazas in tareas])
+	if E * int(capacidad.sum()) > config.ASSIGNMENT_MAX_CELLS:
+		raise AssignmentError(f"{E} estudiantes x {int(capacidad.sum())} plazas supera el maximo de {config.ASSIGNMENT_MAX_CELLS} celdas")
+
+	#Matriz de puntajes estudiante x tarea por bloques de estudiantes, como en emparejamiento
+	Xe = codificar_parte(encoder, [fila for _, fila in estudiantes], "est_")
+	Xt = codificar_parte(encoder, [fila for _, fila, _ in tareas], ("conc_", "tarea_"))
+	clases = list(encoder.classes_)
+	positiva = clases.index(CLASE_POSITIVA) if CLASE_POSITIVA in clases else len(clases) - 1
+	puntaje = np.empty((E, T))
+	bloque = max(1, filas_bloque // T)
+	for i in range(0, E, bloque):
+		fin = min(E, i + bloque)
+		X = (Xe[i:fin, np.newaxis, :] + Xt[np.newaxis, :, :]).reshape(-1, encoder.n_salida)
+		puntaje[i:fin] = encoder.predict_proba(X)[:, positiva].reshape(fin - i, T)
+
+	#Una columna por plaza: la tarea j aparece capacidad[j] veces
+	duenno = np.repeat(np.arange(T), capacidad)
+	filas, plazas = linear_sum_assignment(puntaje[:, duenno], maximize=True)
+	tarea = duenno[plazas]
+	elegidas = puntaje[filas, tarea] >= minimo
+	resultado["asignaciones"] = [
+		{"id_estudiante": str(estudiantes[e][0]), "id_tarea": str(tareas[t][0]), "probabilidad": float(puntaje[e, t])}
+		for e, t in zip(filas[elegidas], tarea[elegidas])
+	]
+	resultado["probabilidad_media"] = float(puntaje[filas[elegidas], tarea[elegidas]].mean()) if elegidas.any() else 0.0
+	resultado["segundos"] = time.perf_counter() - inicio
+	return resultado
+
+
+def confirmar(db, asignaciones):
+	#Aplica una propuesta (o parte de ella) con un UPDATE por lotes; si otra solicitud ocupo
+	#estudiantes o plazas entretanto, lanza AssignmentConflict y quien llama hace rollback.
+	#No hace commit: la transaccion es de quien llama
+	try:
+		pares = [(UUID(str(e)), UUID(str(t))) for e, t in asignaciones]
+	except ValueError:
+		raise AssignmentError("Identificador no valido en las asignaciones")
+	if not pares:
+		raise AssignmentError("No hay asignaciones que confirmar")
+	estudiantes = [e for e, _ in pares]
+	if len(set(estudiantes)) != len(estudiantes):
+		raise AssignmentError("Un estudiante aparece en mas de una asignacion")
+	#Un estudiante libre puede seguir vinculado a una tarea anterior: esa tarea tambien se refresca
+	anteriores = dict(db.execute(select(Estudiante.id_estudiante, Estudiante.tareas_estudiantes_id
+		).where(Estudiante.id_estudiante.in_(estudiantes), _libres())).all())
+	libres = set(anteriores)
+	ocupados = [str(e) for e in estudiantes if e not in libres]
+	if ocupados:
+		raise AssignmentConflict(f"Estudiantes ya ocupados o inexistentes: {', '.join(ocupados)}")
+	pedidas = Counter(t for _, t in pares)
+	plazas = {id: disponibles for id, _, disponibles in _plazas(db, list(pedidas))}
+	sin_plazas = [str(t) for t, n in pedidas.items() if plazas.get(t, 0) < n]
+	if sin_plazas:
+		raise AssignmentConflict(f"Tareas sin plazas suficientes: {', '.join(sin_plazas)}")
+	#Solo estudiantes que siguen libres; tras escribir (con el bloqueo de escritura tomado) se
+	#revisa que nada haya cambiado desde la verificacion anterior
+	tabla = Estudiante.__table__
+	escritos = db.execute(
+		update(tabla).where(tabla.c.id_estudiante == bindparam("e_id"), _libres()
+		).values(tareas_estudiantes_id=bindparam("t_id"), est_ocupado=True),
+		[{"e_id": e, "t_id": t} for e, t in pares]
+	).rowcount
+	excedidas = db.execute(select(Tarea.id_tarea).where(Tarea.id_tarea.in_(list(pedidas)), _asignados() > Tarea.tarea_participantes)).scalars().all()
+	if escritos != len(pares) or excedidas:
+		raise AssignmentConflict("Otra asignacion ocupo estudiantes o plazas, vuelva a generar la propuesta")
+	#El primer estudiante de cada tarea define sus caracteristicas en el almacen
+	refrescar(db, tareas=set(pedidas) | {t for t in anteriores.values() if t is not None})
+	db.flush()
+	return {"asignados": len(pares), "tareas": len(pedidas)}
@@ -0,0 +1,101 @@
+import argparse
+import gc
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import psutil
+
+from core import config
+from ml.features import FeatureEncoder, TAREA_SCHEMAS, CONC_SCHEMAS
+from ml.forest import CompactForest, verificar_paridad, muestras_paridad
+
+LOTES = [1, 8, 64, 512]
+
+ARCHIVOS = {
+	"tarea": (config.TAREA_MODEL_FILE, TAREA_SCHEMAS),
+	"concertacion": (config.CONC_MODEL_FILE, CONC_SCHEMAS),
+}
+
+
+def _latencia(funcion, X, repeticiones):
+	funcion(X)
+	tiempos = []
+	for _ in range(repeticiones):
+		inicio = time.perf_counter()
+		funcion(X)
+		tiempos.append(time.perf_counter() - inicio)
+	return 1e6 * float(np.median(tiempos))
+
+
+def _memoria_carga(ruta, backend):
+	#En un proceso nuevo: una carga previa importa todo lo que el unpickle necesita y
+	#luego se mide lo que agrega una segunda copia (asignado segun tracemalloc y RSS)
+	cargar = (lambda: joblib.load(ruta)) if backend == "sklearn" else (lambda: CompactForest.cargar(ruta))
+	previo = cargar()
+	del previo
+	gc.collect()
+	proceso = psutil.Process()
+	antes = proceso.memory_info().rss
+	tracemalloc.start()
+	modelo = cargar()
+	gc.collect()
+	asignado = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return {"asignado": asignado, "rss": proceso.memory_info().rss - antes}
+
+
+def medir(nombre, repeticiones=200):
+	archivo, esquemas = ARCHIVOS[nombre]
+	ruta = config.UPLOAD_TRAIN_MODELS_PATH + archivo
+	encoder = FeatureEncoder.desde_modelo(joblib.load(ruta), esquemas)
+	forest = encoder.clasificador
+	compacto = CompactForest.desde_sklearn(forest)
+	X = muestras_paridad(encoder, max(LOTES))
+	resultado = {
+		"modelo": nombre,
+		"archivo": archivo,
+		"paridad": verificar_paridad(forest, compacto, X),
+		"latencia_us": {},
+		"bytes_arreglos": compacto.nbytes,
+	}
+	for lote in LOTES:
+		resultado["latencia_us"][lote] = {
+			"sklearn": _latencia(forest.predict_proba, X[:lote], repeticiones),
+			"compact": _latencia(compacto.predict_proba, X[:lote], repeticiones),
+		}
+	#Un proceso por medicion para que no se mezclen las asignaciones
+	contexto = multiprocessing.get_context("spawn")
+	with tempfile.TemporaryDirectory() as carpeta:
+		rutas = {"sklearn": ruta, "compact": os.path.join(carpeta, nombre + ".forest")}
+		compacto.guardar(rutas["compact"])
+		resultado["memoria_carga"] = {}
+		for backend, ruta_backend in rutas.items():
+			with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+				resultado["memoria_carga"][backend] = pool.submit(_memoria_carga, ruta_backend, backend).result()
+	return resultado
+
+
+def imprimir(resultado):
+	print(f"{resultado['modelo']} ({resultado['archivo']})")
+	print(f"  paridad: {resultado['paridad']}")
+	print(f"  {'lote':>6} {'sklearn us':>12} {'compact us':>12} {'x':>6}")
+	for lote, tiempos in resultado["latencia_us"].items():
+		print(f"  {lote:>6} {tiempos['sklearn']:>12.1f} {tiempos['compact']:>12.1f} {tiempos['sklearn'] / tiempos['compact']:>6.1f}")
+	for backend, memoria in resultado["memoria_carga"].items():
+		print(f"  memoria por copia {backend}: {memoria['asignado'] / 1024:.0f} KiB asignados, RSS +{memoria['rss'] / 1024:.0f} KiB")
+	print(f"  arreglos del bosque compacto: {resultado['bytes_arreglos'] / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compara latencia y memoria del bosque de sklearn contra el compacto")
+	parser.add_argument("modelo", nargs="?", choices=list(ARCHIVOS) + ["todos"], default="todos")
+	parser.add_argument("--repeticiones", type=int, default=200)
+	args = parser.parse_args()
+	for nombre in list(ARCHIVOS) if args.modelo == "todos" else [args.modelo]:
+		imprimir(medir(nombre, args.repeticiones))
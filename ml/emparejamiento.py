@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+
+from core import config
+from models.data import Profesor, Cliente
+from ml.features import profesor_statement, cliente_statement
+from ml.registry import registry
+from ml.simulacion import CLASE_POSITIVA
+
+#Cada columna codificada sale de una sola columna del esquema: la fila de una pareja es la
+#suma de la parte del profesor, la del cliente y la de los atributos comunes (el resto en cero).
+#Se codifica cada profesor y cada cliente una vez y las parejas se arman por bloques.
+
+
+def codificar_parte(encoder, filas, prefijo):
+	#Solo las columnas con el prefijo (texto o tupla de prefijos); el resto queda en cero
+	columnas = encoder.schema.columnas
+	posiciones = {i for i, c in enumerate(columnas) if c.startswith(prefijo)}
+	return encoder.encode(encoder.ordenar({c: fila.get(c) for c in columnas} for fila in filas), posiciones)
+
+
+def _leer(db, statement, llave):
+	return [(str(getattr(fila, llave)), dict(fila._mapping)) for fila in db.execute(statement)]
+
+
+def _ordenar_mejores(valores, indices, eje):
+	orden = np.argsort(-valores, axis=eje, kind="stable")
+	return np.take_along_axis(valores, orden, eje), np.take_along_axis(indices, orden, eje)
+
+
+def sugerir(db, base, k=5, universidad=None, centro=None, filas_bloque=None):
+	#Las k mejores parejas de cada profesor y de cada cliente segun la probabilidad de la clase positiva
+	inicio_total = time.perf_counter()
+	filas_bloque = filas_bloque or config.MATCHING_CHUNK_ROWS
+	artefacto = registry.obtener("concertacion")
+	encoder = artefacto.encoder
+	statement_prf = profesor_statement()
+	if universidad is not None:
+		statement_prf = statement_prf.where(Profesor.prf_universidad_id == universidad)
+	statement_cli = cliente_statement()
+	if centro is not None:
+		statement_cli = statement_cli.where(Cliente.cli_centro_id == centro)
+	profesores = _leer(db, statement_prf, "id_profesor")
+	clientes = _leer(db, statement_cli, "id_cliente")
+	resultado = {"version": artefacto.version, "parejas": len(profesores) * len(clientes), "profesores": [], "clientes": []}
+	if not profesores or not clientes:
+		return resultado
+
+	Xp = codificar_parte(encoder, [fila for _, fila in profesores], "prf_")
+	Xc = codificar_parte(encoder, [fila for _, fila in clientes], "cli_")
+	Xb = codificar_parte(encoder, [base], "conc_")[0]
+	clases = list(encoder.classes_)
+	positiva = clases.index(CLASE_POSITIVA) if CLASE_POSITIVA in clases else len(clases) - 1
+	P, C = len(profesores), len(clientes)
+	k_prf, k_cli = min(k, C), min(k, P)
+	mejores_prf = np.empty((P, k_prf)), np.empty((P, k_prf), dtype=np.intp)
+	mejores_cli = np.full((k_cli, C), -np.inf), np.zeros((k_cli, C), dtype=np.intp)
+	#Bloques de profesores completos: cada bloque cruza con todos los clientes
+	bloque = max(1, filas_bloque // C)
+	for inicio in range(0, P, bloque):
+		fin = min(P, inicio + bloque)
+		X = (Xp[inicio:fin, np.newaxis, :] + Xb + Xc[np.newaxis, :, :]).reshape(-1, encoder.n_salida)
+		puntaje = encoder.predict_proba(X)[:, positiva].reshape(fin - inicio, C)
+		#Por profesor: la fila completa esta en este bloque
+		indices = np.argpartition(-puntaje, k_prf - 1, axis=1)[:, :k_prf]
+		valores, indices = _ordenar_mejores(np.take_along_axis(puntaje, indices, 1), indices, 1)
+		mejores_prf[0][inicio:fin], mejores_prf[1][inicio:fin] = valores, indices
+		#Por cliente: se combinan los mejores acumulados con los del bloque
+		valores = np.concatenate([mejores_cli[0], puntaje])
+		indices = np.concatenate([mejores_cli[1], np.broadcast_to(np.arange(inicio, fin)[:, np.newaxis], puntaje.shape)])
+		seleccion = np.argpartition(-valores, k_cli - 1, axis=0)[:k_cli]
+		mejores_cli = np.take_along_axis(valores, seleccion, 0), np.take_along_axis(indices, seleccion, 0)
+	mejores_cli = _ordenar_mejores(*mejores_cli, 0)
+
+	resultado["profesores"] = [
+		{"profesor": id_prf, "sugerencias": [
+			{"cliente": clientes[j][0], "probabilidad": float(p)} for p, j in zip(mejores_prf[0][i], mejores_prf[1][i])
+		]}
+		for i, (id_prf, _) in enumerate(profesores)
+	]
+	resultado["clientes"] = [
+		{"cliente": id_cli, "sugerencias": [
+			{"profesor": profesores[i][0], "probabilidad": float(p)} for p, i in zip(mejores_cli[0][:, j], mejores_cli[1][:, j])
+		]}
+		for j, (id_cli, _) in enumerate(clientes)
+	]
+	resultado["segundos"] = time.perf_counter() - inicio_total
+	return resultado
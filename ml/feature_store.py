@@ -0,0 +1,182 @@
+import argparse
+from datetime import datetime
+from sqlalchemy import select, delete, insert
+from models.data import (Tarea, Concertacion_Tema, Estudiante, Profesor, Cliente,
+	Tarea_Features, Concertacion_Features)
+from ml.features import TAREA_SCHEMA_EXT, CONC_SCHEMA_EXT, tarea_statement, concertacion_statement
+from ml.prediction_cache import prediction_cache
+
+#Las tablas *_features guardan una fila por tarea (con su primer estudiante) y por
+#concertacion con todas las caracteristicas conocidas; cada modelo toma las suyas.
+#Las funciones reciben una Session o una Connection y no hacen commit.
+
+CHUNK_SIZE = 500
+
+CONC_LLAVES = ["id_conc_tema", "conc_profesor_id", "conc_cliente_id"]
+
+
+def _chunks(valores, size):
+	for i in range(0, len(valores), size):
+		yield valores[i:i + size]
+
+
+def _primeras(filas, llave):
+	#Una fila por llave: la consulta viene ordenada y se queda la primera
+	resultado = {}
+	for fila in filas:
+		resultado.setdefault(getattr(fila, llave), fila)
+	return resultado
+
+
+def _filas_tarea(db, ids=None):
+	statement = tarea_statement()
+	if ids is not None:
+		statement = statement.where(Tarea.id_tarea.in_(ids))
+	ahora = datetime.utcnow()
+	return [
+		{**fila._mapping, "actualizado": ahora}
+		for fila in _primeras(db.execute(statement), "id_tarea").values()
+	]
+
+
+def _filas_concertacion(db, ids=None):
+	statement = concertacion_statement()
+	if ids is not None:
+		statement = statement.where(Concertacion_Tema.id_conc_tema.in_(ids))
+	ahora = datetime.utcnow()
+	return [
+		{**fila._mapping, "actualizado": ahora}
+		for fila in _primeras(db.execute(statement), "id_conc_tema").values()
+	]
+
+
+def _reemplazar(db, tabla, llave, ids, filas):
+	if ids is None:
+		db.execute(delete(tabla))
+	else:
+		for chunk in _chunks(list(ids), CHUNK_SIZE):
+			db.execute(delete(tabla).where(llave.in_(chunk)))
+	for chunk in _chunks(filas, CHUNK_SIZE):
+		db.execute(insert(tabla), chunk)
+	return len(filas)
+
+
+def afectados(db, usuarios=(), profesores=(), clientes=(), estudiantes=(), concertaciones=(),
+		tareas=(), universidades=(), centros=()):
+	#Tareas y concertaciones cuyas caracteristicas dependen de las filas indicadas
+	profesores, clientes, estudiantes = set(profesores), set(clientes), set(estudiantes)
+	concertaciones, tareas = set(concertaciones), set(tareas)
+	if usuarios:
+		usuarios = list(usuarios)
+		profesores.update(db.execute(select(Profesor.id_profesor).where(Profesor.user_profesor_id.in_(usuarios))).scalars())
+		clientes.update(db.execute(select(Cliente.id_cliente).where(Cliente.user_cliente_id.in_(usuarios))).scalars())
+		estudiantes.update(db.execute(select(Estudiante.id_estudiante).where(Estudiante.user_estudiante_id.in_(usuarios))).scalars())
+	if universidades:
+		universidades = list(universidades)
+		profesores.update(db.execute(select(Profesor.id_profesor).where(Profesor.prf_universidad_id.in_(universidades))).scalars())
+		estudiantes.update(db.execute(select(Estudiante.id_estudiante).where(Estudiante.est_universidad_id.in_(universidades))).scalars())
+	if centros:
+		clientes.update(db.execute(select(Cliente.id_cliente).where(Cliente.cli_centro_id.in_(list(centros)))).scalars())
+	if profesores:
+		concertaciones.update(db.execute(select(Concertacion_Tema.id_conc_tema).where(Concertacion_Tema.conc_profesor_id.in_(list(profesores)))).scalars())
+	if clientes:
+		concertaciones.update(db.execute(select(Concertacion_Tema.id_conc_tema).where(Concertacion_Tema.conc_cliente_id.in_(list(clientes)))).scalars())
+	if estudiantes:
+		tareas.update(
+			id for id in db.execute(select(Estudiante.tareas_estudiantes_id).where(Estudiante.id_estudiante.in_(list(estudiantes)))).scalars()
+			if id is not None
+		)
+	if concertaciones:
+		tareas.update(db.execute(select(Tarea.id_tarea).where(Tarea.concertacion_tarea_id.in_(list(concertaciones)))).scalars())
+	return tareas, concertaciones
+
+
+def refrescar(db, tareas=(), concertaciones=()):
+	#Recalcula las filas indicadas; las que ya no tienen origen se eliminan
+	if hasattr(db, "flush"):
+		db.flush()
+	resultado = {"tareas": 0, "concertaciones": 0}
+	if tareas:
+		resultado["tareas"] = _reemplazar(db, Tarea_Features, Tarea_Features.id_tarea, tareas, _filas_tarea(db, list(tareas)))
+	if concertaciones:
+		resultado["concertaciones"] = _reemplazar(db, Concertacion_Features, Concertacion_Features.id_conc_tema,
+			concertaciones, _filas_concertacion(db, list(concertaciones)))
+	#Las predicciones guardadas de estas filas dejan de valer
+	prediction_cache.invalidar_al_confirmar(db, "tarea" if tareas else None, "concertacion" if concertaciones else None)
+	return resultado
+
+
+def refrescar_afectados(db, **origen):
+	tareas, concertaciones = afectados(db, **origen)
+	return refrescar(db, tareas, concertaciones)
+
+
+def reconstruir(db):
+	if hasattr(db, "flush"):
+		db.flush()
+	prediction_cache.invalidar_al_confirmar(db, "tarea", "concertacion")
+	return {
+		"tareas": _reemplazar(db, Tarea_Features, None, None, _filas_tarea(db)),
+		"concertaciones": _reemplazar(db, Concertacion_Features, None, None, _filas_concertacion(db)),
+	}
+
+
+def _comparar(guardadas, vivas, columnas):
+	faltantes = [str(id) for id in vivas if id not in guardadas]
+	sobrantes = [str(id) for id in guardadas if id not in vivas]
+	distintas = [
+		str(id) for id, fila in vivas.items()
+		if id in guardadas and any(getattr(guardadas[id], c) != getattr(fila, c) for c in columnas)
+	]
+	return {"faltantes": faltantes, "sobrantes": sobrantes, "distintas": distintas}
+
+
+def tarea_features_statement():
+	return select(Tarea_Features.id_tarea, *[getattr(Tarea_Features, c) for c in TAREA_SCHEMA_EXT.columnas])
+
+
+def concertacion_features_statement():
+	return select(*[getattr(Concertacion_Features, c) for c in CONC_LLAVES + CONC_SCHEMA_EXT.columnas])
+
+
+def verificar(db):
+	#Compara el almacen contra la consulta con joins sobre las tablas de origen
+	tareas = _comparar(
+		{fila.id_tarea: fila for fila in db.execute(tarea_features_statement())},
+		_primeras(db.execute(tarea_statement()), "id_tarea"),
+		TAREA_SCHEMA_EXT.columnas)
+	concertaciones = _comparar(
+		{fila.id_conc_tema: fila for fila in db.execute(concertacion_features_statement())},
+		_primeras(db.execute(concertacion_statement()), "id_conc_tema"),
+		CONC_LLAVES + CONC_SCHEMA_EXT.columnas)
+	consistente = not any(tareas.values()) and not any(concertaciones.values())
+	return {"consistente": consistente, "tareas": tareas, "concertaciones": concertaciones}
+
+
+def leer_tarea(db, id):
+	#Lectura por llave primaria; si la tarea aun no esta en el almacen se usa la consulta con joins
+	fila = db.execute(tarea_features_statement().where(Tarea_Features.id_tarea == id)).first()
+	if fila is None:
+		fila = db.execute(tarea_statement().where(Tarea.id_tarea == id).limit(1)).first()
+	return fila
+
+
+def leer_concertacion(db, id):
+	fila = db.execute(concertacion_features_statement().where(Concertacion_Features.id_conc_tema == id)).first()
+	if fila is None:
+		fila = db.execute(concertacion_statement().where(Concertacion_Tema.id_conc_tema == id).limit(1)).first()
+	return fila
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Mantenimiento del almacen de caracteristicas")
+	parser.add_argument("accion", choices=["reconstruir", "verificar"])
+	args = parser.parse_args()
+
+	from db.database import SessionLocal
+	with SessionLocal() as db:
+		if args.accion == "reconstruir":
+			print(reconstruir(db))
+			db.commit()
+		else:
+			print(verificar(db))
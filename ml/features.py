@@ -0,0 +1,348 @@
+import logging
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from models.data import Tarea, Concertacion_Tema, Estudiante, Profesor, Cliente, User
+
+logger = logging.getLogger(__name__)
+
+NIVELES = ["Alta", "Baja", "Media"]
+CATEGORIAS_DOCENTES = ["Instructor", "Auxiliar", "Asistente", "Titular", "Ninguna"]
+CATEGORIAS_CIENTIFICAS = ["Ingeniero", "Licenciado", "Master", "Doctor", "Tecnico", "Ninguna"]
+TIPOS_TAREA = ["Desarrollo", "Investigación", "Documental"]
+ESTADOS_CIVILES = ["Soltero", "Casado", "Divorciado", "Viudo"]
+GENEROS = ["F", "M"]
+
+
+class FeatureSchemaError(Exception):
+	pass
+
+
+class Feature:
+	#tipo: "num" (entero/real), "bool" o "cat" (texto con vocabulario conocido)
+	def __init__(self, nombre, tipo, vocabulario=None):
+		self.nombre = nombre
+		self.tipo = tipo
+		self.vocabulario = vocabulario
+
+
+class FeatureSchema:
+	def __init__(self, nombre, features):
+		self.nombre = nombre
+		self.features = features
+
+	@property
+	def columnas(self):
+		return [f.nombre for f in self.features]
+
+
+#Esquemas en el orden exacto de columnas con que se entrenaron los modelos.
+#Las variantes "_ext" agregan estado civil, genero e hijos del usuario (artefactos .joblib).
+TAREA_SCHEMA = FeatureSchema("tarea", [
+	Feature("conc_actores_externos", "num"),
+	Feature("conc_complejidad", "cat", NIVELES),
+	Feature("est_becado", "bool"),
+	Feature("est_pos_tecnica_escuela", "cat", NIVELES),
+	Feature("est_pos_tecnica_hogar", "cat", NIVELES),
+	Feature("est_posibilidad_economica", "cat", NIVELES),
+	Feature("est_trab_remoto", "bool"),
+	Feature("est_trabajo", "bool"),
+	Feature("tarea_complejidad_estimada", "cat", NIVELES),
+	Feature("tarea_participantes", "num"),
+	Feature("tarea_tipo", "cat", TIPOS_TAREA),
+])
+
+TAREA_SCHEMA_EXT = FeatureSchema("tarea_ext", TAREA_SCHEMA.features[:8] + [
+	Feature("est_estadocivil", "cat", ESTADOS_CIVILES),
+	Feature("est_genero", "cat", GENEROS),
+	Feature("est_hijos", "bool"),
+] + TAREA_SCHEMA.features[8:])
+
+_CONC_PROFESOR = [
+	Feature("prf_trab_remoto", "bool"),
+	Feature("prf_cargo", "bool"),
+	Feature("prf_categoria_cientifica", "cat", CATEGORIAS_CIENTIFICAS),
+	Feature("prf_categoria_docente", "cat", CATEGORIAS_DOCENTES),
+	Feature("prf_pos_tecnica_trabajo", "cat", NIVELES),
+	Feature("prf_pos_tecnica_hogar", "cat", NIVELES),
+	Feature("prf_experiencia_practicas", "bool"),
+	Feature("prf_numero_empleos", "num"),
+	Feature("prf_numero_est_atendidos", "num"),
+]
+_CONC_CLIENTE = [
+	Feature("cli_cargo", "bool"),
+	Feature("cli_categoria_cientifica", "cat", CATEGORIAS_CIENTIFICAS),
+	Feature("cli_categoria_docente", "cat", CATEGORIAS_DOCENTES),
+	Feature("cli_experiencia_practicas", "bool"),
+	Feature("cli_numero_empleos", "num"),
+	Feature("cli_numero_est_atendidos", "num"),
+	Feature("cli_pos_tecnica_hogar", "cat", NIVELES),
+	Feature("cli_pos_tecnica_trabajo", "cat", NIVELES),
+	Feature("cli_trab_remoto", "bool"),
+]
+_CONC_BASE = [
+	Feature("conc_actores_externos", "num"),
+	Feature("conc_complejidad", "cat", NIVELES),
+]
+
+CONC_SCHEMA = FeatureSchema("concertacion", _CONC_BASE + _CONC_PROFESOR + _CONC_CLIENTE)
+
+CONC_SCHEMA_EXT = FeatureSchema("concertacion_ext", _CONC_BASE + _CONC_PROFESOR + [
+	Feature("prf_estadocivil", "cat", ESTADOS_CIVILES),
+	Feature("prf_genero", "cat", GENEROS),
+	Feature("prf_hijos", "bool"),
+] + _CONC_CLIENTE + [
+	Feature("cli_estadocivil", "cat", ESTADOS_CIVILES),
+	Feature("cli_genero", "cat", GENEROS),
+	Feature("cli_hijos", "bool"),
+])
+
+TAREA_SCHEMAS = [TAREA_SCHEMA, TAREA_SCHEMA_EXT]
+CONC_SCHEMAS = [CONC_SCHEMA, CONC_SCHEMA_EXT]
+
+
+class FeatureEncoder:
+	#Reproduce en NumPy el ColumnTransformer ajustado del Pipeline (imputacion,
+	#escalado y one-hot) para pasar las filas directamente al clasificador
+	def __init__(self, schema, pipeline):
+		self.schema = schema
+		self.clasificador = pipeline.steps[-1][1]
+		self.classes_ = self.clasificador.classes_
+		self.advertencias = []
+		preprocesador = pipeline.steps[0][1]
+		posicion = {nombre: i for i, nombre in enumerate(schema.columnas)}
+		tipos = {f.nombre: f for f in schema.features}
+		self._numericas = []
+		self._categoricas = []
+		for nombre, transformador, columnas in preprocesador.transformers_:
+			if transformador == "drop" or nombre == "remainder":
+				continue
+			salida = preprocesador.output_indices_[nombre]
+			pasos = dict(transformador.steps) if hasattr(transformador, "steps") else {nombre: transformador}
+			imputador = next((p for p in pasos.values() if type(p).__name__ == "SimpleImputer"), None)
+			escalador = next((p for p in pasos.values() if type(p).__name__ == "StandardScaler"), None)
+			onehot = next((p for p in pasos.values() if type(p).__name__ == "OneHotEncoder"), None)
+			otros = [p for p in pasos.values() if p not in (imputador, escalador, onehot)]
+			if otros or (onehot is not None and escalador is not None):
+				raise FeatureSchemaError(f"Transformador no soportado en {schema.nombre}: {nombre}")
+			columnas = list(columnas)
+			if onehot is None:
+				for j, columna in enumerate(columnas):
+					if tipos[columna].tipo == "cat":
+						raise FeatureSchemaError(f"{columna} es categorica en el esquema y numerica en el modelo")
+					self._numericas.append((
+						posicion[columna],
+						salida.start + j,
+						imputador.statistics_[j] if imputador is not None else np.nan,
+						escalador.mean_[j] if escalador is not None and escalador.mean_ is not None else 0.0,
+						escalador.scale_[j] if escalador is not None and escalador.scale_ is not None else 1.0,
+					))
+			else:
+				if onehot.drop is not None or onehot.min_frequency is not None or onehot.max_categories is not None:
+					raise FeatureSchemaError(f"OneHotEncoder no soportado en {schema.nombre}")
+				inicio = salida.start
+				for j, columna in enumerate(columnas):
+					feature = tipos[columna]
+					if feature.tipo != "cat":
+						raise FeatureSchemaError(f"{columna} es {feature.tipo} en el esquema y categorica en el modelo")
+					categorias = list(onehot.categories_[j])
+					desconocidas = set(categorias) - set(feature.vocabulario or categorias)
+					if desconocidas:
+						self.advertencias.append(f"{columna}: el modelo conoce valores fuera del vocabulario {sorted(desconocidas)}")
+					ausentes = set(feature.vocabulario or []) - set(categorias)
+					if ausentes:
+						self.advertencias.append(f"{columna}: valores sin entrenar {sorted(ausentes)}")
+					self._categoricas.append((posicion[columna], {v: inicio + k for k, v in enumerate(categorias)}))
+					inicio += len(categorias)
+		self.n_salida = max(s.stop for s in preprocesador.output_indices_.values())
+		if self.n_salida != self.clasificador.n_features_in_:
+			raise FeatureSchemaError(f"El clasificador espera {self.clasificador.n_features_in_} columnas y el esquema produce {self.n_salida}")
+		for advertencia in self.advertencias:
+			logger.warning("Esquema %s: %s", schema.nombre, advertencia)
+
+	@classmethod
+	def desde_modelo(cls, pipeline, schemas):
+		#Elige el esquema cuyas columnas coinciden exactamente con las del modelo
+		columnas = list(getattr(pipeline, "feature_names_in_", []))
+		for schema in schemas:
+			if schema.columnas == columnas:
+				encoder = cls(schema, pipeline)
+				encoder.verificar(pipeline)
+				return encoder
+		esperado = schemas[0].columnas
+		raise FeatureSchemaError(
+			f"Las columnas del modelo no coinciden con ningun esquema declarado. "
+			f"Sobran: {sorted(set(columnas) - set(esperado))}, faltan: {sorted(set(esperado) - set(columnas))}"
+		)
+
+	def ordenar(self, mapeos):
+		#Filas con nombre (Row._mapping o dict) a tuplas en el orden del esquema
+		return [tuple(mapeo[c] for c in self.schema.columnas) for mapeo in mapeos]
+
+	def encode(self, filas, columnas=None):
+		#filas: tuplas con los valores en el orden del esquema.
+		#columnas: si se indica, solo se codifican esas posiciones (el resto queda en cero)
+		filas = list(filas)
+		X = np.zeros((len(filas), self.n_salida), dtype=np.float64)
+		if not filas:
+			return X
+		for origen, destino, mediana, media, escala in self._numericas:
+			if columnas is not None and origen not in columnas:
+				continue
+			valores = np.array([np.nan if fila[origen] is None else float(fila[origen]) for fila in filas], dtype=np.float64)
+			valores[np.isnan(valores)] = mediana
+			X[:, destino] = (valores - media) / escala
+		for origen, indices in self._categoricas:
+			if columnas is not None and origen not in columnas:
+				continue
+			for i, fila in enumerate(filas):
+				#Valores nulos o desconocidos quedan en cero, como handle_unknown="ignore"
+				destino = indices.get(fila[origen])
+				if destino is not None:
+					X[i, destino] = 1.0
+		return X
+
+	def predict_proba(self, X):
+		return self.clasificador.predict_proba(X)
+
+	def verificar(self, pipeline):
+		#Compara contra el Pipeline original con filas sinteticas que recorren el vocabulario.
+		#La fila de nulos va en su propio DataFrame, como llegaba una prediccion individual
+		import pandas as pd
+		n = max([len(indices) for _, indices in self._categoricas] + [2])
+		vocabularios = {origen: list(indices) for origen, indices in self._categoricas}
+		filas = []
+		for i in range(n):
+			fila = []
+			for j, feature in enumerate(self.schema.features):
+				if j in vocabularios:
+					fila.append(vocabularios[j][i % len(vocabularios[j])])
+				elif feature.tipo == "bool":
+					fila.append(bool(i % 2))
+				else:
+					fila.append(i)
+			filas.append(tuple(fila))
+		nulos = [tuple(None for _ in self.schema.features)]
+		for bloque in (filas, nulos):
+			esperado = pipeline.predict_proba(pd.DataFrame(bloque, columns=self.schema.columnas))
+			obtenido = self.predict_proba(self.encode(bloque))
+			if not np.allclose(esperado, obtenido):
+				raise FeatureSchemaError(f"La codificacion de {self.schema.nombre} no reproduce el Pipeline del modelo")
+
+	def info(self):
+		return {
+			"esquema": self.schema.nombre,
+			"columnas": self.schema.columnas,
+			"columnas_codificadas": self.n_salida,
+			"backend": "compact" if type(self.clasificador).__name__ == "CompactForest" else "sklearn",
+			"advertencias": self.advertencias,
+		}
+
+
+def _tarea_fuentes(est_user):
+	return {
+		"conc_actores_externos": Concertacion_Tema.conc_actores_externos,
+		"conc_complejidad": Concertacion_Tema.conc_complejidad,
+		"est_becado": Estudiante.est_becado,
+		"est_pos_tecnica_escuela": Estudiante.est_pos_tecnica_escuela,
+		"est_pos_tecnica_hogar": Estudiante.est_pos_tecnica_hogar,
+		"est_posibilidad_economica": Estudiante.est_posibilidad_economica,
+		"est_trab_remoto": Estudiante.est_trab_remoto,
+		"est_trabajo": Estudiante.est_trabajo,
+		"est_estadocivil": est_user.estado_civil,
+		"est_genero": est_user.genero,
+		"est_hijos": est_user.hijos,
+		"tarea_complejidad_estimada": Tarea.tarea_complejidad_estimada,
+		"tarea_participantes": Tarea.tarea_participantes,
+		"tarea_tipo": Tarea.tarea_tipo,
+	}
+
+
+def _concertacion_fuentes(prf_user, cli_user):
+	fuentes = {
+		"conc_actores_externos": Concertacion_Tema.conc_actores_externos,
+		"conc_complejidad": Concertacion_Tema.conc_complejidad,
+		"prf_estadocivil": prf_user.estado_civil,
+		"prf_genero": prf_user.genero,
+		"prf_hijos": prf_user.hijos,
+		"cli_estadocivil": cli_user.estado_civil,
+		"cli_genero": cli_user.genero,
+		"cli_hijos": cli_user.hijos,
+	}
+	for feature in _CONC_PROFESOR:
+		fuentes[feature.nombre] = getattr(Profesor, feature.nombre)
+	for feature in _CONC_CLIENTE:
+		fuentes[feature.nombre] = getattr(Cliente, feature.nombre)
+	return fuentes
+
+
+def tarea_statement(schema=TAREA_SCHEMA_EXT):
+	#Una fila por tarea y estudiante asignado: id_tarea seguido de las columnas del esquema.
+	#Por defecto se seleccionan todas las caracteristicas conocidas y cada modelo toma las suyas
+	est_user = aliased(User)
+	fuentes = _tarea_fuentes(est_user)
+	return select(
+		Tarea.id_tarea,
+		*[fuentes[nombre].label(nombre) for nombre in schema.columnas]
+	).select_from(Tarea
+	).join(Concertacion_Tema, Concertacion_Tema.id_conc_tema == Tarea.concertacion_tarea_id
+	).join(Estudiante, Estudiante.tareas_estudiantes_id == Tarea.id_tarea
+	).join(est_user, est_user.id == Estudiante.user_estudiante_id
+	).join(Profesor, Profesor.id_profesor == Concertacion_Tema.conc_profesor_id
+	).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id
+	).order_by(Tarea.id_tarea, Estudiante.id_estudiante)
+
+
+def concertacion_statement(schema=CONC_SCHEMA_EXT):
+	#Una fila por concertacion: llave primaria compuesta seguida de las columnas del esquema
+	prf_user = aliased(User)
+	cli_user = aliased(User)
+	fuentes = _concertacion_fuentes(prf_user, cli_user)
+	return select(
+		Concertacion_Tema.id_conc_tema,
+		Concertacion_Tema.conc_profesor_id,
+		Concertacion_Tema.conc_cliente_id,
+		*[fuentes[nombre].label(nombre) for nombre in schema.columnas]
+	).select_from(Concertacion_Tema
+	).join(Profesor, Profesor.id_profesor == Concertacion_Tema.conc_profesor_id
+	).join(prf_user, prf_user.id == Profesor.user_profesor_id
+	).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id
+	).join(cli_user, cli_user.id == Cliente.user_cliente_id
+	).order_by(Concertacion_Tema.id_conc_tema)
+
+
+def profesor_statement():
+	#Caracteristicas propias de cada profesor (prf_*) para armar parejas que aun no existen
+	prf_user = aliased(User)
+	fuentes = _concertacion_fuentes(prf_user, aliased(User))
+	return select(
+		Profesor.id_profesor,
+		*[fuentes[nombre].label(nombre) for nombre in CONC_SCHEMA_EXT.columnas if nombre.startswith("prf_")]
+	).join(prf_user, prf_user.id == Profesor.user_profesor_id)
+
+
+def cliente_statement():
+	cli_user = aliased(User)
+	fuentes = _concertacion_fuentes(aliased(User), cli_user)
+	return select(
+		Cliente.id_cliente,
+		*[fuentes[nombre].label(nombre) for nombre in CONC_SCHEMA_EXT.columnas if nombre.startswith("cli_")]
+	).join(cli_user, cli_user.id == Cliente.user_cliente_id)
+
+
+def estudiante_statement():
+	est_user = aliased(User)
+	fuentes = _tarea_fuentes(est_user)
+	return select(
+		Estudiante.id_estudiante,
+		*[fuentes[nombre].label(nombre) for nombre in TAREA_SCHEMA_EXT.columnas if nombre.startswith("est_")]
+	).join(est_user, est_user.id == Estudiante.user_estudiante_id)
+
+
+def tarea_base_statement():
+	#Caracteristicas de la tarea y su concertacion, sin las del estudiante
+	fuentes = _tarea_fuentes(aliased(User))
+	return select(
+		Tarea.id_tarea,
+		*[fuentes[nombre].label(nombre) for nombre in TAREA_SCHEMA_EXT.columnas if not nombre.startswith("est_")]
+	).join(Concertacion_Tema, Concertacion_Tema.id_conc_tema == Tarea.concertacion_tarea_id)
@@ -0,0 +1,175 @@
+import argparse
+import os
+import joblib
+import numpy as np
+
+#Arreglos que definen un bosque compacto (ver CompactForest.desde_sklearn)
+ARREGLOS = ["feature", "threshold", "children", "value", "roots"]
+
+
+class CompactForest:
+	#Bosque de decision en arreglos planos y contiguos: todos los arboles se recorren
+	#a la vez sobre el lote, sin despachar un predict por estimador como sklearn
+	def __init__(self, feature, threshold, children, value, roots, classes_, n_features_in_, depth):
+		self.feature = feature
+		self.threshold = threshold
+		#children[i] = (izquierdo, derecho)
+		self.children = children
+		self.value = value
+		self.roots = roots
+		self.classes_ = classes_
+		self.n_features_in_ = n_features_in_
+		self.depth = depth
+
+	@classmethod
+	def desde_sklearn(cls, forest):
+		#Exporta un RandomForestClassifier ajustado; los nodos de cada arbol quedan
+		#uno tras otro y los hijos se guardan con indices globales
+		features, thresholds, children, values, roots = [], [], [], [], []
+		inicio = 0
+		depth = 0
+		for estimador in forest.estimators_:
+			tree = estimador.tree_
+			n = tree.node_count
+			hoja = tree.children_left == -1
+			nodos = np.arange(inicio, inicio + n, dtype=np.int32)
+			#Las hojas apuntan a si mismas con un umbral infinito: el recorrido se detiene solo
+			features.append(np.where(hoja, 0, tree.feature).astype(np.int32))
+			thresholds.append(np.where(hoja, np.inf, tree.threshold).astype(np.float64))
+			children.append(np.stack([
+				np.where(hoja, nodos, tree.children_left + inicio),
+				np.where(hoja, nodos, tree.children_right + inicio),
+			], axis=1).astype(np.int32))
+			#Igual que DecisionTreeClassifier.predict_proba: la hoja normalizada por su suma
+			valor = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+			normalizador = valor.sum(axis=1)[:, np.newaxis]
+			normalizador[normalizador == 0.0] = 1.0
+			values.append(valor / normalizador)
+			roots.append(inicio)
+			depth = max(depth, tree.max_depth)
+			inicio += n
+		return cls(
+			np.ascontiguousarray(np.concatenate(features)),
+			np.ascontiguousarray(np.concatenate(thresholds)),
+			np.ascontiguousarray(np.concatenate(children)),
+			np.ascontiguousarray(np.concatenate(values)),
+			np.asarray(roots, dtype=np.int32),
+			forest.classes_,
+			forest.n_features_in_,
+			depth,
+		)
+
+	@property
+	def n_estimators(self):
+		return len(self.roots)
+
+	@property
+	def nbytes(self):
+		return sum(getattr(self, nombre).nbytes for nombre in ARREGLOS)
+
+	def apply(self, X):
+		#Indice global de la hoja de cada (arbol, fila)
+		#sklearn compara en float32, se reproduce el mismo redondeo
+		X = np.asarray(X, dtype=np.float32).astype(np.float64)
+		n, m = X.shape
+		valores = X.ravel()
+		hijos = self.children.ravel()
+		nodos = np.repeat(self.roots, n)
+		filas = np.tile(np.arange(n) * m, self.n_estimators)
+		for _ in range(self.depth):
+			#Las entradas codificadas nunca son NaN: "no <=" equivale a ">"
+			derecha = valores[filas + self.feature[nodos]] > self.threshold[nodos]
+			nodos = hijos[2 * nodos + derecha]
+		return nodos.reshape(self.n_estimators, n)
+
+	def predict_proba(self, X):
+		#Suma arbol por arbol en el mismo orden que sklearn y luego promedia
+		proba = np.add.reduce(self.value[self.apply(X)], axis=0)
+		proba /= self.n_estimators
+		return proba
+
+	def predict(self, X):
+		return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+	def guardar(self, ruta):
+		#Sin compresion para poder abrir los arreglos con mmap; se escribe a un temporal
+		#y se renombra, asi otro proceso nunca lee un archivo a medias
+		temporal = f"{ruta}.{os.getpid()}.tmp"
+		joblib.dump(self, temporal)
+		os.replace(temporal, ruta)
+
+	@classmethod
+	def cargar(cls, ruta, mmap_mode="r"):
+		#Con mmap_mode los arreglos quedan mapeados del archivo: todos los procesos que
+		#lo abren comparten las mismas paginas fisicas a traves de la cache del sistema
+		compacto = joblib.load(ruta, mmap_mode=mmap_mode)
+		if not isinstance(compacto, cls):
+			raise ValueError(f"{ruta} no contiene un bosque compacto")
+		return compacto
+
+
+def verificar_paridad(forest, compacto, X):
+	#predict_proba y predict deben coincidir exactamente con los del bosque de sklearn
+	esperado = forest.predict_proba(X)
+	obtenido = compacto.predict_proba(X)
+	return {
+		"filas": int(X.shape[0]),
+		"proba_identica": bool(np.array_equal(esperado, obtenido)),
+		"diferencia_maxima": float(np.max(np.abs(esperado - obtenido))) if X.shape[0] else 0.0,
+		"predict_identico": bool(np.array_equal(forest.predict(X), compacto.predict(X))),
+	}
+
+
+def muestras_paridad(encoder, n=2000, semilla=0):
+	#Filas codificadas al azar sobre el vocabulario de cada columna, con nulos y valores desconocidos
+	rng = np.random.default_rng(semilla)
+	filas = []
+	for _ in range(n):
+		fila = []
+		for feature in encoder.schema.features:
+			if feature.tipo == "cat":
+				opciones = list(feature.vocabulario or []) + [None]
+				fila.append(opciones[rng.integers(len(opciones))])
+			elif feature.tipo == "bool":
+				fila.append(bool(rng.integers(2)))
+			else:
+				fila.append(None if rng.random() < 0.05 else int(rng.integers(0, 12)))
+		filas.append(tuple(fila))
+	return encoder.encode(filas)
+
+
+def compactar(encoder, n=2000, ruta=None):
+	#Cambia el clasificador del encoder por su version compacta si la paridad es exacta.
+	#Con ruta, la exportacion se guarda (o se reutiliza) y se abre con mmap
+	forest = encoder.clasificador
+	if type(forest).__name__ != "RandomForestClassifier":
+		raise ValueError(f"Solo se compactan RandomForestClassifier, no {type(forest).__name__}")
+	if ruta is not None and os.path.exists(ruta):
+		compacto = CompactForest.cargar(ruta)
+	else:
+		compacto = CompactForest.desde_sklearn(forest)
+	paridad = verificar_paridad(forest, compacto, muestras_paridad(encoder, n))
+	if not (paridad["proba_identica"] and paridad["predict_identico"]):
+		raise ValueError(f"El bosque compacto no reproduce al de sklearn: {paridad}")
+	if ruta is not None and not isinstance(compacto.value, np.memmap):
+		os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+		compacto.guardar(ruta)
+		compacto = CompactForest.cargar(ruta)
+	encoder.clasificador = compacto
+	return paridad
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Exporta un bosque de sklearn a arreglos planos y verifica la paridad")
+	parser.add_argument("modelo", help="Archivo .pkl o .joblib con el Pipeline entrenado")
+	parser.add_argument("--salida", help="Archivo de salida (joblib sin comprimir, se abre con mmap)")
+	parser.add_argument("--muestras", type=int, default=2000)
+	args = parser.parse_args()
+
+	import joblib
+	from ml.features import FeatureEncoder, TAREA_SCHEMAS, CONC_SCHEMAS
+	pipeline = joblib.load(args.modelo)
+	encoder = FeatureEncoder.desde_modelo(pipeline, TAREA_SCHEMAS + CONC_SCHEMAS)
+	forest = encoder.clasificador
+	paridad = compactar(encoder, args.muestras, args.salida)
+	print(encoder.schema.nombre, paridad, f"{encoder.clasificador.nbytes} bytes en {forest.n_estimators} arboles")
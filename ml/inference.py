@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core import config
+from ml.registry import registry
+
+logger = logging.getLogger(__name__)
+
+#Limites superiores de los intervalos del histograma de tamanno de lote
+BATCH_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+class Prediccion:
+	def __init__(self, version, clases, probs):
+		self.version = version
+		self.clases = clases
+		self.probs = probs
+
+
+class _Solicitud:
+	def __init__(self, datos, futuro):
+		self.datos = datos
+		self.futuro = futuro
+		self.encolado = time.perf_counter()
+
+
+class _Metricas:
+	def __init__(self):
+		self.solicitudes = 0
+		self.lotes = 0
+		self.filas = 0
+		self.max_lote = 0
+		self.ultimo_lote = 0
+		self.errores = 0
+		self.espera_total = 0.0
+		self.inferencia_total = 0.0
+		self.histograma = [0] * (len(BATCH_BUCKETS) + 1)
+
+	def registrar_lote(self, filas, espera, duracion):
+		self.lotes += 1
+		self.filas += filas
+		self.ultimo_lote = filas
+		self.max_lote = max(self.max_lote, filas)
+		self.espera_total += espera
+		self.inferencia_total += duracion
+		for i, limite in enumerate(BATCH_BUCKETS):
+			if filas <= limite:
+				self.histograma[i] += 1
+				break
+		else:
+			self.histograma[-1] += 1
+
+	def resumen(self):
+		etiquetas = [f"<={limite}" for limite in BATCH_BUCKETS] + [f">{BATCH_BUCKETS[-1]}"]
+		return {
+			"solicitudes": self.solicitudes,
+			"lotes": self.lotes,
+			"filas": self.filas,
+			"errores": self.errores,
+			"lote_promedio": self.filas / self.lotes if self.lotes else 0,
+			"lote_maximo": self.max_lote,
+			"ultimo_lote": self.ultimo_lote,
+			"espera_promedio_ms": 1000 * self.espera_total / self.lotes if self.lotes else 0,
+			"inferencia_promedio_ms": 1000 * self.inferencia_total / self.lotes if self.lotes else 0,
+			"histograma_lotes": dict(zip(etiquetas, self.histograma)),
+		}
+
+
+class InferenceScheduler:
+	#Agrupa las solicitudes concurrentes de cada modelo en un solo predict_proba
+	def __init__(self, ventana_ms: float, max_batch: int, workers: int):
+		self.ventana = ventana_ms / 1000
+		self.max_batch = max_batch
+		self.workers = workers
+		self._executor = None
+		self._semaforo = None
+		self._loop = None
+		self._colas = {}
+		self._recolectores = {}
+		self._en_curso = {}
+		self._metricas = {}
+
+	def _iniciar(self, nombre):
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			#Las colas y tareas pertenecen a un solo event loop
+			self._colas.clear()
+			self._recolectores.clear()
+			self._loop = loop
+			self._semaforo = asyncio.Semaphore(self.workers)
+		if self._executor is None:
+			self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inferencia")
+		self._colas[nombre] = asyncio.Queue()
+		self._en_curso[nombre] = 0
+		self._metricas.setdefault(nombre, _Metricas())
+		self._recolectores[nombre] = loop.create_task(self._recolectar(nombre))
+
+	async def detener(self):
+		for tarea in self._recolectores.values():
+			tarea.cancel()
+		await asyncio.gather(*self._recolectores.values(), return_exceptions=True)
+		self._recolectores.clear()
+		self._colas.clear()
+		self._loop = None
+		if self._executor is not None:
+			self._executor.shutdown(wait=False)
+			self._executor = None
+
+	async def predecir(self, nombre: str, datos: list) -> Prediccion:
+		#datos: filas con nombre (Row._mapping o dict) con las caracteristicas del modelo
+		if nombre not in self._recolectores or self._loop is not asyncio.get_running_loop():
+			self._iniciar(nombre)
+		futuro = asyncio.get_running_loop().create_future()
+		self._metricas[nombre].solicitudes += 1
+		await self._colas[nombre].put(_Solicitud(datos, futuro))
+		return await futuro
+
+	async def _recolectar(self, nombre):
+		cola = self._colas[nombre]
+		loop = asyncio.get_running_loop()
+		while True:
+			lote = [await cola.get()]
+			filas = len(lote[0].datos)
+			limite = loop.time() + self.ventana
+			while filas < self.max_batch:
+				restante = limite - loop.time()
+				if restante <= 0:
+					break
+				try:
+					solicitud = await asyncio.wait_for(cola.get(), restante)
+				except asyncio.TimeoutError:
+					break
+				lote.append(solicitud)
+				filas += len(solicitud.datos)
+			await self._semaforo.acquire()
+			self._en_curso[nombre] += len(lote)
+			loop.create_task(self._ejecutar(nombre, lote))
+
+	async def _ejecutar(self, nombre, lote):
+		loop = asyncio.get_running_loop()
+		inicio = time.perf_counter()
+		try:
+			resultados = await loop.run_in_executor(self._executor, self._predict_proba, nombre, [s.datos for s in lote])
+		except Exception as e:
+			logger.exception("Fallo la inferencia por lotes del modelo %s", nombre)
+			self._metricas[nombre].errores += 1
+			for solicitud in lote:
+				if not solicitud.futuro.done():
+					solicitud.futuro.set_exception(e)
+		else:
+			for solicitud, resultado in zip(lote, resultados):
+				if not solicitud.futuro.done():
+					solicitud.futuro.set_result(resultado)
+			espera = sum(inicio - s.encolado for s in lote) / len(lote)
+			self._metricas[nombre].registrar_lote(sum(len(s.datos) for s in lote), espera, time.perf_counter() - inicio)
+		finally:
+			self._en_curso[nombre] -= len(lote)
+			self._semaforo.release()
+
+	@staticmethod
+	def _predict_proba(nombre, bloques):
+		#Se ejecuta en un hilo del pool, fuera del event loop
+		#Codificar y predecir con el mismo artefacto evita mezclar versiones durante una recarga
+		artefacto = registry.obtener(nombre)
+		encoder = artefacto.encoder
+		probs = encoder.predict_proba(encoder.encode(encoder.ordenar([fila for bloque in bloques for fila in bloque])))
+		clases = encoder.classes_[probs.argmax(axis=1)]
+		resultados = []
+		inicio = 0
+		for bloque in bloques:
+			fin = inicio + len(bloque)
+			resultados.append(Prediccion(artefacto.version, clases[inicio:fin], probs[inicio:fin]))
+			inicio = fin
+		return resultados
+
+	def metricas(self):
+		resultado = {}
+		for nombre, metricas in self._metricas.items():
+			cola = self._colas.get(nombre)
+			resultado[nombre] = {
+				"en_cola": cola.qsize() if cola is not None else 0,
+				"en_proceso": self._en_curso.get(nombre, 0),
+				**metricas.resumen(),
+			}
+		return resultado
+
+
+scheduler = InferenceScheduler(
+	ventana_ms=config.INFERENCE_BATCH_WINDOW_MS,
+	max_batch=config.INFERENCE_MAX_BATCH,
+	workers=config.INFERENCE_WORKERS,
+)
@@ -0,0 +1,60 @@
+import os
+import psutil
+from core import config
+
+
+def _proceso(proceso):
+	try:
+		info = proceso.memory_full_info()
+	except psutil.Error as e:
+		return {"pid": proceso.pid, "error": str(e)}
+	#uss: paginas exclusivas del proceso; pss: rss con las compartidas repartidas entre quienes las usan
+	return {
+		"pid": proceso.pid,
+		"rss": info.rss,
+		"compartida": info.shared,
+		"uss": info.uss,
+		"pss": getattr(info, "pss", None),
+	}
+
+
+def _modelos_mapeados(proceso):
+	#Exportaciones del bosque compacto abiertas con mmap por este proceso
+	carpeta = os.path.abspath(config.MODEL_CACHE_PATH)
+	try:
+		mapas = proceso.memory_maps(grouped=True)
+	except psutil.Error:
+		return []
+	return [
+		{
+			"archivo": os.path.basename(mapa.path),
+			"rss": mapa.rss,
+			"compartida": mapa.shared_clean + mapa.shared_dirty,
+			"privada": mapa.private_clean + mapa.private_dirty,
+		}
+		for mapa in mapas if mapa.path.startswith(carpeta)
+	]
+
+
+def reporte():
+	actual = psutil.Process()
+	padre = actual.parent()
+	#Bajo gunicorn se reportan todos los workers hijos del maestro
+	maestro = None
+	workers = [actual]
+	try:
+		if padre is not None and "gunicorn" in " ".join(padre.cmdline()):
+			maestro = padre.pid
+			workers = padre.children()
+	except psutil.Error:
+		pass
+	procesos = [_proceso(worker) for worker in workers]
+	return {
+		"pid": actual.pid,
+		"maestro": maestro,
+		"backend": config.INFERENCE_BACKEND,
+		"workers": procesos,
+		"total_rss": sum(p.get("rss", 0) for p in procesos),
+		"total_pss": sum(p.get("pss") or 0 for p in procesos),
+		"modelos_mapeados": _modelos_mapeados(actual),
+	}
@@ -0,0 +1,128 @@
+import hashlib
+import multiprocessing
+import threading
+
+from cachetools import TTLCache
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core import config
+from ml.registry import registry
+from ml.inference import scheduler
+
+
+class Resultado:
+	def __init__(self, version, clase, probs):
+		self.version = version
+		self.clase = clase
+		self.probs = probs
+
+
+class PredictionCache:
+	#Dos niveles: (modelo, version, huella del vector codificado) -> resultado, y
+	#(modelo, id) -> huella para responder una consulta repetida sin leer la base de datos
+	def __init__(self, nombres, maxsize: int, ttl: float):
+		self._resultados = TTLCache(maxsize=maxsize, ttl=ttl)
+		self._entidades = TTLCache(maxsize=maxsize, ttl=ttl)
+		self._lock = threading.Lock()
+		#Generacion por modelo en memoria compartida: creada antes del fork (preload_app),
+		#una invalidacion en un worker la ven todos los demas
+		self._generaciones = {nombre: multiprocessing.Value("Q", 0) for nombre in nombres}
+		self._contadores = {nombre: {"aciertos_entidad": 0, "aciertos_caracteristicas": 0, "fallos": 0} for nombre in nombres}
+
+	@staticmethod
+	def huella(encoder, fila):
+		X = encoder.encode(encoder.ordenar([fila]))
+		return hashlib.blake2b(X.tobytes(), digest_size=16).hexdigest()
+
+	def _generacion(self, nombre):
+		return self._generaciones[nombre].value
+
+	def por_entidad(self, nombre, id):
+		#Solo vale si nada cambio desde que se guardo y el modelo sigue en la misma version
+		with self._lock:
+			entrada = self._entidades.get((nombre, id))
+		if entrada is None:
+			return None
+		version, huella, generacion = entrada
+		#Sin recargar: la version la actualizan las predicciones en los hilos de inferencia
+		actual = registry.actual(nombre)
+		if generacion != self._generacion(nombre) or actual is None or version != actual.version:
+			return None
+		with self._lock:
+			resultado = self._resultados.get((nombre, version, huella))
+		if resultado is not None:
+			self._contadores[nombre]["aciertos_entidad"] += 1
+		return resultado
+
+	async def obtener(self, nombre, id, db, leer):
+		#leer(db, id): fila de caracteristicas o None (sincrona, sobre la AsyncSession con run_sync);
+		#la sesion se cierra antes de esperar al modelo
+		resultado = self.por_entidad(nombre, id)
+		if resultado is not None:
+			return resultado
+		generacion = self._generacion(nombre)
+		fila = await db.run_sync(leer, id)
+		await db.close()
+		if fila is None:
+			return None
+		fila = fila._mapping
+		#Solo la primera vez (modelo aun sin cargar) se carga, en un hilo
+		artefacto = registry.actual(nombre) or await run_in_threadpool(registry.obtener, nombre)
+		huella = self.huella(artefacto.encoder, fila)
+		clave = (nombre, artefacto.version, huella)
+		with self._lock:
+			resultado = self._resultados.get(clave)
+		if resultado is not None:
+			self._contadores[nombre]["aciertos_caracteristicas"] += 1
+		else:
+			self._contadores[nombre]["fallos"] += 1
+			prediccion = await scheduler.predecir(nombre, [fila])
+			resultado = Resultado(prediccion.version, prediccion.clases[0], [float(p) for p in prediccion.probs[0]])
+			if prediccion.version != artefacto.version:
+				#El modelo se recargo entre la codificacion y la prediccion
+				return resultado
+			with self._lock:
+				self._resultados[clave] = resultado
+		if generacion == self._generacion(nombre):
+			with self._lock:
+				self._entidades[(nombre, id)] = (artefacto.version, huella, generacion)
+		return resultado
+
+	def invalidar(self, *nombres):
+		for nombre in nombres:
+			generacion = self._generaciones[nombre]
+			with generacion.get_lock():
+				generacion.value += 1
+
+	def invalidar_al_confirmar(self, db, *nombres):
+		#Con una Session se invalida al hacer commit: antes, otras sesiones aun leen las filas anteriores
+		nombres = [nombre for nombre in nombres if nombre]
+		if not nombres:
+			return
+		if isinstance(db, Session):
+			event.listen(db, "after_commit", lambda session: self.invalidar(*nombres), once=True)
+		else:
+			self.invalidar(*nombres)
+
+	def metricas(self):
+		resultado = {}
+		for nombre, contadores in self._contadores.items():
+			consultas = sum(contadores.values())
+			aciertos = contadores["aciertos_entidad"] + contadores["aciertos_caracteristicas"]
+			resultado[nombre] = {
+				**contadores,
+				"tasa_aciertos": aciertos / consultas if consultas else 0,
+				"generacion": self._generacion(nombre),
+			}
+		with self._lock:
+			resultado["entradas"] = {"resultados": len(self._resultados), "entidades": len(self._entidades)}
+		return resultado
+
+
+prediction_cache = PredictionCache(
+	registry.nombres(),
+	maxsize=config.PREDICTION_CACHE_SIZE,
+	ttl=config.PREDICTION_CACHE_TTL,
+)
@@ -0,0 +1,218 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+from core import config
+from ml.features import FeatureEncoder, TAREA_SCHEMAS, CONC_SCHEMAS
+from ml.forest import compactar
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotAvailable(Exception):
+	pass
+
+
+class ModelArtifact:
+	#Modelo deserializado junto con la identidad del archivo del que salio
+	def __init__(self, nombre, ruta, modelo, mtime, size, sha256, encoder=None, etiquetas_hasta=None):
+		self.nombre = nombre
+		self.ruta = ruta
+		self.modelo = modelo
+		self.encoder = encoder
+		self.mtime = mtime
+		self.size = size
+		self.sha256 = sha256
+		self.etiquetas_hasta = etiquetas_hasta or datetime.utcfromtimestamp(mtime)
+		self.cargado = datetime.utcnow()
+
+	@property
+	def version(self):
+		return self.sha256[:12]
+
+	def info(self):
+		return {
+			"modelo": self.nombre,
+			"archivo": os.path.basename(self.ruta),
+			"version": self.version,
+			"sha256": self.sha256,
+			"modificado": datetime.utcfromtimestamp(self.mtime),
+			"etiquetas_hasta": self.etiquetas_hasta,
+			"cargado": self.cargado,
+			"esquema": self.encoder.info() if self.encoder is not None else None,
+		}
+
+
+def etiquetas_hasta(ruta: str):
+	#Hasta cuando se leyeron las evaluaciones de la base de datos para entrenar el artefacto, segun
+	#su reporte; None si no lo dice (entrenado desde archivo o modelo original: vale su mtime)
+	try:
+		with open(os.path.splitext(ruta)[0] + ".json") as f:
+			return datetime.fromisoformat(json.load(f)["etiquetas_hasta"])
+	except (OSError, ValueError, KeyError, TypeError):
+		return None
+
+
+def load_artifact(ruta: str, data: bytes):
+	if ruta.endswith(".joblib"):
+		return joblib.load(io.BytesIO(data))
+	if ruta.endswith(".pkl"):
+		return pickle.loads(data)
+	raise ModelNotAvailable(f"Formato de modelo no soportado: {ruta}")
+
+
+class ModelRegistry:
+	def __init__(self, intervalo: float = 5.0):
+		self.intervalo = intervalo
+		self._rutas = {}
+		self._esquemas = {}
+		self._artefactos = {}
+		self._revisado = {}
+		self._vigentes = {}
+		self._lock = threading.Lock()
+		self._recargando = {}
+
+	def registrar(self, nombre: str, ruta: str, esquemas=None):
+		with self._lock:
+			self._rutas[nombre] = ruta
+			self._esquemas[nombre] = esquemas
+			self._recargando.setdefault(nombre, threading.Lock())
+
+	def nombres(self):
+		return list(self._rutas)
+
+	def cargar_todos(self):
+		for nombre in self.nombres():
+			try:
+				self.cargar(nombre)
+			except Exception:
+				logger.exception("No se pudo cargar el modelo %s", nombre)
+
+	def _seguir_vigente(self, nombre):
+		#Un modelo promovido en otro worker (o en otra ejecucion) reemplaza el archivo .vigente;
+		#solo se relee cuando cambia
+		try:
+			stat = os.stat(_archivo_vigente(nombre))
+		except FileNotFoundError:
+			return
+		marca = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+		if self._vigentes.get(nombre) == marca:
+			return
+		archivo = _leer_vigente(nombre)
+		self._vigentes[nombre] = marca
+		if archivo:
+			with self._lock:
+				self._rutas[nombre] = config.UPLOAD_TRAIN_MODELS_PATH + archivo
+
+	def cargar(self, nombre: str) -> ModelArtifact:
+		#Revisa el archivo vigente y lo carga si cambio; la sustitucion es atomica
+		if nombre not in self._rutas:
+			raise ModelNotAvailable(f"Modelo no registrado: {nombre}")
+		with self._recargando[nombre]:
+			self._seguir_vigente(nombre)
+			return self._cargar(nombre, self._rutas[nombre])
+
+	def _cargar(self, nombre, ruta):
+		actual = self._artefactos.get(nombre)
+		self._revisado[nombre] = time.monotonic()
+		stat = os.stat(ruta)
+		if actual is not None and actual.ruta == ruta and (actual.mtime, actual.size) == (stat.st_mtime, stat.st_size):
+			return actual
+		with open(ruta, "rb") as f:
+			data = f.read()
+		sha256 = hashlib.sha256(data).hexdigest()
+		if actual is not None and actual.ruta == ruta and actual.sha256 == sha256:
+			#Solo cambio el mtime, el contenido es el mismo
+			actual.mtime, actual.size = stat.st_mtime, stat.st_size
+			return actual
+		modelo = load_artifact(ruta, data)
+		#Se valida el esquema antes de publicar: si falla se sigue sirviendo la version anterior
+		encoder = FeatureEncoder.desde_modelo(modelo, self._esquemas[nombre]) if self._esquemas.get(nombre) else None
+		if encoder is not None and config.INFERENCE_BACKEND == "compact":
+			try:
+				#Exportacion por version en un archivo mapeado en memoria compartido entre workers
+				compactar(encoder, ruta=f"{config.MODEL_CACHE_PATH}{nombre}_{sha256[:12]}.forest")
+				#El bosque de sklearn ya no se usa para servir; se libera (se puede releer de ruta)
+				modelo = None
+			except Exception:
+				logger.exception("No se pudo compactar el modelo %s, se usa el bosque de sklearn", nombre)
+		artefacto = ModelArtifact(nombre, ruta, modelo, stat.st_mtime, stat.st_size, sha256, encoder, etiquetas_hasta(ruta))
+		with self._lock:
+			self._artefactos[nombre] = artefacto
+		logger.info("Modelo %s cargado desde %s (version %s)", nombre, ruta, artefacto.version)
+		return artefacto
+
+	def obtener(self, nombre: str) -> ModelArtifact:
+		actual = self._artefactos.get(nombre)
+		if actual is None:
+			try:
+				return self.cargar(nombre)
+			except ModelNotAvailable:
+				raise
+			except Exception as e:
+				raise ModelNotAvailable(f"No se pudo cargar el modelo {nombre}") from e
+		if time.monotonic() - self._revisado.get(nombre, 0) >= self.intervalo:
+			if self._recargando[nombre].locked():
+				#Otro hilo esta recargando, se sigue sirviendo la version actual
+				return actual
+			try:
+				return self.cargar(nombre)
+			except Exception:
+				logger.exception("Fallo la recarga del modelo %s, se mantiene la version %s", nombre, actual.version)
+		return actual
+
+	def actual(self, nombre: str):
+		#Artefacto publicado, sin revisar el archivo ni cargarlo (None si aun no hay uno). Para el
+		#event loop, donde una recarga detendria todas las solicitudes; obtener, en los hilos de
+		#inferencia, se encarga de las recargas
+		return self._artefactos.get(nombre)
+
+	def promover(self, nombre: str, ruta: str) -> ModelArtifact:
+		#Cambia el archivo vigente de un modelo; si no carga se mantiene el anterior. Los demas
+		#workers lo toman de .vigente en su proxima revision (MODEL_RELOAD_INTERVAL)
+		if nombre not in self._rutas:
+			raise ModelNotAvailable(f"Modelo no registrado: {nombre}")
+		with self._recargando[nombre]:
+			artefacto = self._cargar(nombre, ruta)
+			with self._lock:
+				self._rutas[nombre] = ruta
+			#Reemplazo atomico: otro worker nunca lee el archivo a medio escribir
+			temporal = f"{_archivo_vigente(nombre)}.{os.getpid()}"
+			with open(temporal, "w") as f:
+				f.write(os.path.basename(ruta))
+			os.replace(temporal, _archivo_vigente(nombre))
+			stat = os.stat(_archivo_vigente(nombre))
+			self._vigentes[nombre] = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+		return artefacto
+
+	def versiones(self):
+		return {nombre: artefacto.info() for nombre, artefacto in self._artefactos.items()}
+
+
+def _archivo_vigente(nombre):
+	return config.UPLOAD_TRAIN_MODELS_PATH + nombre + ".vigente"
+
+
+def _leer_vigente(nombre):
+	with open(_archivo_vigente(nombre)) as f:
+		return f.read().strip()
+
+
+def _ruta_vigente(nombre, archivo):
+	#Un modelo promovido tras un entrenamiento sigue vigente al reiniciar
+	if os.path.exists(_archivo_vigente(nombre)):
+		archivo = _leer_vigente(nombre) or archivo
+	return config.UPLOAD_TRAIN_MODELS_PATH + archivo
+
+
+registry = ModelRegistry(intervalo=config.MODEL_RELOAD_INTERVAL)
+registry.registrar("tarea", _ruta_vigente("tarea", config.TAREA_MODEL_FILE), TAREA_SCHEMAS)
+registry.registrar("concertacion", _ruta_vigente("concertacion", config.CONC_MODEL_FILE), CONC_SCHEMAS)
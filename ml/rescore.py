@@ -0,0 +1,96 @@
+import argparse
+import time
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from models.data import Tarea, Concertacion_Tema
+from models.data import Tarea_Features, Concertacion_Features
+from ml.feature_store import tarea_features_statement, concertacion_features_statement
+from ml.registry import registry
+
+CHUNK_SIZE = 500
+
+
+def _chunks(valores, size):
+	for i in range(0, len(valores), size):
+		yield valores[i:i + size]
+
+
+def _predecir(nombre, filas):
+	#Una sola llamada a predict_proba para todas las filas
+	artefacto = registry.obtener(nombre)
+	encoder = artefacto.encoder
+	prob = encoder.predict_proba(encoder.encode(encoder.ordenar(fila._mapping for fila in filas)))
+	clases = encoder.classes_[prob.argmax(axis=1)]
+	return artefacto, clases, prob.max(axis=1)
+
+
+def recalcular_tareas(db: Session, ids=None, solo_activas: bool = True, chunk_size: int = CHUNK_SIZE):
+	inicio = time.perf_counter()
+	#Lectura del almacen de caracteristicas: una fila por tarea
+	statement = tarea_features_statement().join(Tarea, Tarea.id_tarea == Tarea_Features.id_tarea)
+	if solo_activas:
+		statement = statement.where(Tarea.tarea_activa == True)
+	if ids:
+		statement = statement.where(Tarea.id_tarea.in_(ids))
+	filas = db.execute(statement).all()
+	if not filas:
+		return {"modelo": "tarea", "filas": 0, "segundos": time.perf_counter() - inicio}
+	artefacto, clases, probs = _predecir("tarea", filas)
+	valores = [
+		{"id_tarea": fila.id_tarea, "tarea_evaluacion_pred": clase, "tarea_evaluacion_prob": float(prob)}
+		for fila, clase, prob in zip(filas, clases, probs)
+	]
+	for chunk in _chunks(valores, chunk_size):
+		db.execute(update(Tarea), chunk)
+	db.commit()
+	return {"modelo": "tarea", "version": artefacto.version, "filas": len(valores), "segundos": time.perf_counter() - inicio}
+
+
+def recalcular_concertaciones(db: Session, ids=None, solo_activas: bool = True, chunk_size: int = CHUNK_SIZE):
+	inicio = time.perf_counter()
+	statement = concertacion_features_statement().join(
+		Concertacion_Tema, Concertacion_Tema.id_conc_tema == Concertacion_Features.id_conc_tema)
+	if solo_activas:
+		statement = statement.where(Concertacion_Tema.conc_activa == True)
+	if ids:
+		statement = statement.where(Concertacion_Tema.id_conc_tema.in_(ids))
+	filas = db.execute(statement).all()
+	if not filas:
+		return {"modelo": "concertacion", "filas": 0, "segundos": time.perf_counter() - inicio}
+	artefacto, clases, probs = _predecir("concertacion", filas)
+	#La llave primaria de Concertacion_Tema es compuesta
+	valores = [
+		{
+			"id_conc_tema": fila.id_conc_tema,
+			"conc_profesor_id": fila.conc_profesor_id,
+			"conc_cliente_id": fila.conc_cliente_id,
+			"conc_evaluacion_pred": clase,
+			"conc_evaluacion_prob": float(prob),
+		}
+		for fila, clase, prob in zip(filas, clases, probs)
+	]
+	for chunk in _chunks(valores, chunk_size):
+		db.execute(update(Concertacion_Tema), chunk)
+	db.commit()
+	return {"modelo": "concertacion", "version": artefacto.version, "filas": len(valores), "segundos": time.perf_counter() - inicio}
+
+
+RECALCULOS = {
+	"tarea": recalcular_tareas,
+	"concertacion": recalcular_concertaciones,
+}
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Recalcula las predicciones guardadas de tareas y concertaciones")
+	parser.add_argument("modelo", choices=list(RECALCULOS) + ["todos"])
+	parser.add_argument("--ids", nargs="*", help="Limitar a estos identificadores")
+	parser.add_argument("--todas", action="store_true", help="Incluir tambien las filas inactivas")
+	parser.add_argument("--chunk", type=int, default=CHUNK_SIZE)
+	args = parser.parse_args()
+
+	from db.database import SessionLocal
+	nombres = list(RECALCULOS) if args.modelo == "todos" else [args.modelo]
+	with SessionLocal() as db:
+		for nombre in nombres:
+			print(RECALCULOS[nombre](db, ids=args.ids, solo_activas=not args.todas, chunk_size=args.chunk))
@@ -0,0 +1,113 @@
+import itertools
+import json
+from uuid import UUID
+
+import numpy as np
+
+from core import config
+from models.data import Profesor, Cliente, Estudiante
+from ml.features import (TAREA_SCHEMA_EXT, CONC_SCHEMA_EXT, profesor_statement, cliente_statement,
+	estudiante_statement)
+from ml.registry import registry
+
+#Prediccion de filas hipoteticas: nada se escribe en la base de datos
+
+CHUNK_SIZE = 500
+
+CLASE_POSITIVA = "Positiva"
+
+
+class SimulationError(Exception):
+	pass
+
+
+class CandidateNotFound(SimulationError):
+	pass
+
+
+def _leer(db, statement, columna, ids, entidad):
+	#Caracteristicas por id en el orden pedido, sin repetidos
+	try:
+		ids = list(dict.fromkeys(UUID(str(id)) for id in ids))
+	except ValueError:
+		raise SimulationError(f"Identificador de {entidad} no valido")
+	filas = {}
+	for i in range(0, len(ids), CHUNK_SIZE):
+		for fila in db.execute(statement.where(columna.in_(ids[i:i + CHUNK_SIZE]))):
+			filas[fila[0]] = dict(fila._mapping)
+			del filas[fila[0]][columna.key]
+	faltan = [str(id) for id in ids if id not in filas]
+	if faltan:
+		raise CandidateNotFound(f"No existen {entidad}: {', '.join(faltan)}")
+	return [(str(id), filas[id]) for id in ids]
+
+
+def _libres(schema, filas):
+	#Filas completas enviadas por el cliente; las columnas que falten se imputan como en el modelo
+	desconocidas = sorted(set().union(*filas) - set(schema.columnas)) if filas else []
+	if desconocidas:
+		raise SimulationError(f"Columnas desconocidas: {', '.join(desconocidas)}")
+	return [({"fila": i}, dict(fila)) for i, fila in enumerate(filas)]
+
+
+def _verificar_total(total):
+	#Antes de leer la base de datos
+	if total > config.SIMULATION_MAX_CANDIDATES:
+		raise SimulationError(f"Se pidieron {total} candidatos, el maximo es {config.SIMULATION_MAX_CANDIDATES}")
+	if not total:
+		raise SimulationError("No hay candidatos para predecir")
+
+
+def candidatos_concertacion(db, base, profesores=(), clientes=(), filas=()):
+	#Todas las parejas profesor x cliente con los atributos comunes de la concertacion (base)
+	if bool(profesores) != bool(clientes):
+		raise SimulationError("Se necesitan profesores y clientes para formar parejas")
+	_verificar_total(len(filas) + len(profesores) * len(clientes))
+	candidatos = _libres(CONC_SCHEMA_EXT, filas)
+	if profesores:
+		prf = _leer(db, profesor_statement(), Profesor.id_profesor, profesores, "profesores")
+		cli = _leer(db, cliente_statement(), Cliente.id_cliente, clientes, "clientes")
+		candidatos += [
+			({"profesor": id_prf, "cliente": id_cli}, {**base, **caracteristicas_prf, **caracteristicas_cli})
+			for (id_prf, caracteristicas_prf), (id_cli, caracteristicas_cli) in itertools.product(prf, cli)
+		]
+	return candidatos
+
+
+def candidatos_tarea(db, base, estudiantes=(), filas=()):
+	#Cada estudiante con los atributos comunes de la tarea y su concertacion (base)
+	_verificar_total(len(filas) + len(estudiantes))
+	candidatos = _libres(TAREA_SCHEMA_EXT, filas)
+	if estudiantes:
+		est = _leer(db, estudiante_statement(), Estudiante.id_estudiante, estudiantes, "estudiantes")
+		candidatos += [({"estudiante": id_est}, {**base, **caracteristicas}) for id_est, caracteristicas in est]
+	return candidatos
+
+
+def puntuar(nombre, candidatos, limite=None):
+	#Un solo predict_proba para todos los candidatos, ordenados por probabilidad de la clase positiva
+	artefacto = registry.obtener(nombre)
+	encoder = artefacto.encoder
+	try:
+		X = encoder.encode(encoder.ordenar({c: mapeo.get(c) for c in encoder.schema.columnas} for _, mapeo in candidatos))
+	except (TypeError, ValueError) as e:
+		raise SimulationError(f"Valor no valido en las filas: {e}")
+	probs = encoder.predict_proba(X)
+	clases = list(encoder.classes_)
+	puntaje = probs[:, clases.index(CLASE_POSITIVA)] if CLASE_POSITIVA in clases else probs.max(axis=1)
+	orden = np.argsort(-puntaje, kind="stable")[:limite]
+	predichas = encoder.classes_[probs.argmax(axis=1)]
+	return artefacto.version, [
+		{
+			"posicion": posicion + 1,
+			**candidatos[i][0],
+			"clase": str(predichas[i]),
+			**{f"prob{j + 1}": float(p) for j, p in enumerate(probs[i])},
+		}
+		for posicion, i in enumerate(orden)
+	]
+
+
+def ndjson(resultados):
+	for resultado in resultados:
+		yield json.dumps(resultado, ensure_ascii=False) + "\n"
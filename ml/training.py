@@ -0,0 +1,501 @@
+import argparse
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import joblib
+from fastapi.concurrency import run_in_threadpool
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.utils.class_weight import compute_class_weight
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from core import config
+from ml.features import FeatureEncoder, TAREA_SCHEMAS, CONC_SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+FUENTES = ["archivo", "db"]
+
+#Prefijo de los artefactos, archivo de datos por defecto y esquemas aceptados por modelo
+MODELOS = {
+	"tarea": {"prefijo": "tarea", "archivo": "Tarea_datos.xlsx", "esquemas": TAREA_SCHEMAS, "llave": "id_tarea"},
+	"concertacion": {"prefijo": "conc", "archivo": "Concertaciones_datos.xlsx", "esquemas": CONC_SCHEMAS, "llave": "id_conc_tema"},
+}
+
+#Nombres de columnas de los CSV exportados que difieren de los del modelo
+RENOMBRAR = {
+	"asg_complejidad_estimada": "tarea_complejidad_estimada",
+	"asg_participantes": "tarea_participantes",
+	"tarea_tipo_nombre": "tarea_tipo",
+	"est_estado_civil": "est_estadocivil",
+	"prf_estado_civil": "prf_estadocivil",
+	"cli_estado_civil": "cli_estadocivil",
+	"asg_evaluacion": "evaluacion",
+	"conc_evaluacion": "evaluacion",
+}
+
+
+class TrainingError(Exception):
+	pass
+
+
+def _leer_archivo(modelo, archivo):
+	#Solo archivos de la carpeta de subidas
+	ruta = config.UPLOAD_TRAIN_FILES_PATH + os.path.basename(archivo or MODELOS[modelo]["archivo"])
+	if not os.path.exists(ruta):
+		raise TrainingError(f"No existe el archivo de entrenamiento {ruta}")
+	if ruta.endswith(".csv"):
+		datos = pd.read_csv(ruta)
+	elif ruta.endswith(".xlsx"):
+		datos = pd.read_excel(ruta)
+	else:
+		raise TrainingError(f"Formato de archivo no soportado: {ruta}")
+	return datos.rename(columns=RENOMBRAR), ruta
+
+
+def _evaluada(modelo):
+	from models.data import Tarea, Concertacion_Tema
+	return Tarea.tarea_evaluada if modelo == "tarea" else Concertacion_Tema.conc_evaluada
+
+
+def _leer_db(modelo):
+	#Solo filas evaluadas con evaluar_tarea / evaluar_concertacion, no las que tienen el valor por defecto
+	from db.database import SessionLocal
+	from models.data import Tarea, Concertacion_Tema, Tarea_Features, Concertacion_Features
+	from ml.feature_store import tarea_features_statement, concertacion_features_statement
+	if modelo == "tarea":
+		statement = tarea_features_statement().add_columns(Tarea.tarea_evaluacion.label("evaluacion"), Tarea.tarea_evaluada.label("evaluada")
+			).join(Tarea, Tarea.id_tarea == Tarea_Features.id_tarea
+			).where(Tarea.tarea_evaluada.isnot(None), Tarea.tarea_evaluacion.isnot(None))
+	else:
+		statement = concertacion_features_statement().add_columns(Concertacion_Tema.conc_evaluacion.label("evaluacion"), Concertacion_Tema.conc_evaluada.label("evaluada")
+			).join(Concertacion_Tema, Concertacion_Tema.id_conc_tema == Concertacion_Features.id_conc_tema
+			).where(Concertacion_Tema.conc_evaluada.isnot(None), Concertacion_Tema.conc_evaluacion.isnot(None))
+	#Corte de las etiquetas que ve el artefacto; las evaluadas despues son nuevas para EtiquetasNuevas
+	hasta = datetime.utcnow()
+	with SessionLocal() as db:
+		filas = db.execute(statement).all()
+	return pd.DataFrame([fila._mapping for fila in filas]), "db", hasta
+
+
+def _esquema(modelo, datos):
+	#El esquema mas completo que cubran las columnas disponibles
+	for schema in reversed(MODELOS[modelo]["esquemas"]):
+		if set(schema.columnas) <= set(datos.columns):
+			return schema
+	faltan = sorted(set(MODELOS[modelo]["esquemas"][0].columnas) - set(datos.columns))
+	raise TrainingError(f"Faltan columnas para entrenar el modelo {modelo}: {faltan}")
+
+
+def _matriz(schema, datos):
+	X = datos[schema.columnas].copy()
+	for feature in schema.features:
+		if feature.tipo != "cat":
+			X[feature.nombre] = pd.to_numeric(X[feature.nombre]).astype(float)
+		else:
+			X[feature.nombre] = X[feature.nombre].astype(object).where(X[feature.nombre].notna(), None)
+	return X
+
+
+def _guardar(modelo, pipeline, reporte):
+	marca = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+	base = f"{config.UPLOAD_TRAIN_MODELS_PATH}{MODELOS[modelo]['prefijo']}_rf_{marca}"
+	joblib.dump(pipeline, base + ".joblib")
+	with open(base + ".joblib", "rb") as f:
+		sha256 = hashlib.sha256(f.read()).hexdigest()
+	reporte = {
+		"modelo": modelo,
+		"artefacto": os.path.basename(base + ".joblib"),
+		"version": sha256[:12],
+		"sha256": sha256,
+		**reporte,
+		"entrenado": datetime.utcnow().isoformat(),
+	}
+	with open(base + ".json", "w") as f:
+		json.dump(reporte, f, indent=2, ensure_ascii=False)
+	return {**reporte, "ruta": base + ".joblib"}
+
+
+def construir_pipeline(schema, n_jobs=-1):
+	#Misma forma que los modelos existentes; los booleanos entran como numericos
+	numericas = [f.nombre for f in schema.features if f.tipo != "cat"]
+	categoricas = [f.nombre for f in schema.features if f.tipo == "cat"]
+	preprocesador = ColumnTransformer([
+		("num", Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())]), numericas),
+		("cat", Pipeline([("imputer", SimpleImputer(strategy="most_frequent")), ("onehot", OneHotEncoder(handle_unknown="ignore"))]), categoricas),
+	])
+	return Pipeline([
+		("preprocessor", preprocesador),
+		("classifier", RandomForestClassifier(n_estimators=100, class_weight="balanced", random_state=42, n_jobs=n_jobs)),
+	])
+
+
+def entrenar(modelo, fuente="archivo", archivo=None, n_jobs=None, test_size=None):
+	#Se ejecuta en un proceso del pool: lee los datos, entrena, valida y escribe artefacto y reporte
+	if modelo not in MODELOS:
+		raise TrainingError(f"Modelo no registrado: {modelo}")
+	if fuente not in FUENTES:
+		raise TrainingError(f"Fuente de datos no soportada: {fuente}")
+	n_jobs = config.TRAINING_N_JOBS if n_jobs is None else n_jobs
+	test_size = config.TRAINING_TEST_SIZE if test_size is None else test_size
+	inicio = time.perf_counter()
+	if fuente == "archivo":
+		datos, origen = _leer_archivo(modelo, archivo)
+		hasta = None
+	else:
+		datos, origen, hasta = _leer_db(modelo)
+	if datos.empty or "evaluacion" not in datos.columns:
+		raise TrainingError("No hay ejemplos evaluados para entrenar")
+	datos = datos.dropna(subset=["evaluacion"])
+	schema = _esquema(modelo, datos)
+	X = _matriz(schema, datos)
+	y = datos["evaluacion"].astype(str)
+	clases = y.value_counts()
+	if len(clases) < 2:
+		raise TrainingError("Se necesitan ejemplos de al menos dos clases")
+	estratificar = y if clases.min() >= 2 else None
+	X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42, stratify=estratificar)
+
+	pipeline = construir_pipeline(schema, n_jobs)
+	pipeline.fit(X_train, y_train)
+	pred = pipeline.predict(X_test)
+	#Los nucleos son para entrenar; al servir se predicen pocas filas por llamada
+	pipeline.named_steps["classifier"].set_params(n_jobs=None)
+	#Un artefacto que no pueda servirse no se escribe
+	FeatureEncoder.desde_modelo(pipeline, MODELOS[modelo]["esquemas"])
+
+	return _guardar(modelo, pipeline, {
+		"esquema": schema.nombre,
+		"fuente": fuente,
+		"origen": origen,
+		"filas": len(datos),
+		"filas_entrenamiento": len(X_train),
+		"filas_prueba": len(X_test),
+		"clases": {clase: int(n) for clase, n in clases.items()},
+		"exactitud": float(accuracy_score(y_test, pred)),
+		"reporte": classification_report(y_test, pred, output_dict=True, zero_division=0),
+		"segundos": time.perf_counter() - inicio,
+		**({"etiquetas_hasta": hasta.isoformat()} if hasta is not None else {}),
+	})
+
+
+def _en_holdout(id):
+	#Particion fija por id: una fila de evaluacion nunca se usa para ajustar arboles
+	return int(hashlib.sha256(str(id).encode()).hexdigest(), 16) % 100 < config.ONLINE_HOLDOUT_PERCENT
+
+
+def ampliar(modelo, ruta, arboles=None, n_jobs=None):
+	#Reentrenamiento incremental: conserva el preprocesador y los arboles del modelo vigente
+	#(ruta) y agrega arboles ajustados con las filas evaluadas de la base de datos, con mas peso
+	#para las evaluadas despues de las que vio el modelo (etiquetas_hasta de su reporte, o su
+	#mtime). Todas las filas entran al ajuste para que los arboles nuevos vean todas las clases
+	from ml.registry import etiquetas_hasta
+	if modelo not in MODELOS:
+		raise TrainingError(f"Modelo no registrado: {modelo}")
+	arboles = config.ONLINE_EXTRA_TREES if arboles is None else arboles
+	n_jobs = config.TRAINING_N_JOBS if n_jobs is None else n_jobs
+	inicio = time.perf_counter()
+	with open(ruta, "rb") as f:
+		data = f.read()
+	vigente = joblib.load(io.BytesIO(data))
+	encoder = FeatureEncoder.desde_modelo(vigente, MODELOS[modelo]["esquemas"])
+	desde = etiquetas_hasta(ruta) or datetime.utcfromtimestamp(os.stat(ruta).st_mtime)
+	datos, origen, hasta = _leer_db(modelo)
+	if datos.empty:
+		raise TrainingError("No hay ejemplos evaluados para entrenar")
+	#Una clase que el modelo no conoce requiere un entrenamiento completo
+	conocidas = datos["evaluacion"].astype(str).isin([str(c) for c in encoder.classes_])
+	ignoradas = int((~conocidas).sum())
+	datos = datos[conocidas]
+	holdout = datos[MODELOS[modelo]["llave"]].map(_en_holdout)
+	entrenamiento, prueba = datos[~holdout], datos[holdout]
+	if len(prueba) < config.ONLINE_MIN_HOLDOUT:
+		raise TrainingError(f"El holdout tiene {len(prueba)} filas, se necesitan {config.ONLINE_MIN_HOLDOUT}")
+	y = entrenamiento["evaluacion"].astype(str)
+	es_nueva = (pd.to_datetime(entrenamiento["evaluada"]) > desde).to_numpy(dtype=bool)
+	if set(y) != {str(c) for c in encoder.classes_}:
+		raise TrainingError("Las filas de entrenamiento no cubren todas las clases del modelo")
+
+	candidato = joblib.load(io.BytesIO(data))
+	clasificador = candidato.named_steps["classifier"]
+	preprocesador = candidato.named_steps["preprocessor"]
+	#Con un lote distinto al original "balanced" no aplica a warm_start: pesos explicitos del lote
+	pesos = compute_class_weight("balanced", classes=clasificador.classes_, y=y)
+	#Ventana de arboles: los mas antiguos salen cuando se supera el maximo
+	sobrantes = len(clasificador.estimators_) + arboles - config.ONLINE_MAX_TREES
+	if sobrantes > 0:
+		clasificador.estimators_ = clasificador.estimators_[sobrantes:]
+	clasificador.set_params(
+		warm_start=True,
+		n_estimators=len(clasificador.estimators_) + arboles,
+		class_weight=dict(zip(clasificador.classes_, pesos)),
+		n_jobs=n_jobs,
+	)
+	clasificador.fit(preprocesador.transform(_matriz(encoder.schema, entrenamiento)), y,
+		sample_weight=np.where(es_nueva, config.ONLINE_NEW_LABEL_WEIGHT, 1.0))
+	clasificador.set_params(warm_start=False, n_jobs=None)
+	FeatureEncoder.desde_modelo(candidato, MODELOS[modelo]["esquemas"])
+
+	#El candidato se compara con el modelo vigente sobre las mismas filas
+	X_prueba = _matriz(encoder.schema, prueba)
+	y_prueba = prueba["evaluacion"].astype(str)
+	exactitud_vigente = float(accuracy_score(y_prueba, vigente.predict(X_prueba)))
+	exactitud_candidato = float(accuracy_score(y_prueba, candidato.predict(X_prueba)))
+	return _guardar(modelo, candidato, {
+		"esquema": encoder.schema.nombre,
+		"fuente": "db",
+		"origen": origen,
+		"incremental": True,
+		"base": os.path.basename(ruta),
+		"version_base": hashlib.sha256(data).hexdigest()[:12],
+		"etiquetas_desde": desde.isoformat(),
+		"etiquetas_hasta": hasta.isoformat(),
+		"etiquetas_nuevas": int((pd.to_datetime(datos["evaluada"]) > desde).sum()),
+		#Las demas etiquetas nuevas cayeron en el holdout
+		"filas_nuevas_entrenamiento": int(es_nueva.sum()),
+		"peso_etiquetas_nuevas": config.ONLINE_NEW_LABEL_WEIGHT,
+		"filas_entrenamiento": len(entrenamiento),
+		"filas_prueba": len(prueba),
+		"etiquetas_ignoradas": ignoradas,
+		"arboles": len(clasificador.estimators_),
+		"arboles_descartados": max(sobrantes, 0),
+		"exactitud_vigente": exactitud_vigente,
+		"exactitud": exactitud_candidato,
+		#No peor que el vigente
+		"aceptado": exactitud_candidato >= exactitud_vigente,
+		"segundos": time.perf_counter() - inicio,
+	})
+
+
+class Trabajo:
+	def __init__(self, modelo, fuente, archivo, promover, tipo="completo"):
+		self.id = uuid4().hex
+		self.modelo = modelo
+		self.tipo = tipo
+		self.fuente = fuente
+		self.archivo = archivo
+		self.promover = promover
+		self.estado = "pendiente"
+		self.creado = datetime.utcnow()
+		self.terminado = None
+		self.resultado = None
+		self.error = None
+		self.promovido = False
+
+	def info(self):
+		return {
+			"id": self.id,
+			"modelo": self.modelo,
+			"tipo": self.tipo,
+			"fuente": self.fuente,
+			"archivo": self.archivo,
+			"estado": self.estado,
+			"creado": self.creado,
+			"terminado": self.terminado,
+			"promover": self.promover,
+			"promovido": self.promovido,
+			"resultado": self.resultado,
+			"error": self.error,
+		}
+
+
+class TrainingJobs:
+	#Pool de procesos separado del servidor: entrenar nunca bloquea el event loop ni los hilos de inferencia
+	def __init__(self, workers: int):
+		self.workers = workers
+		self._executor = None
+		self._trabajos = {}
+		self._lock = threading.Lock()
+
+	def _pool(self):
+		with self._lock:
+			if self._executor is None:
+				#spawn: el proceso hijo no hereda conexiones ni hilos del servidor
+				self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+			return self._executor
+
+	def _enviar(self, trabajo, funcion, *args):
+		self._trabajos[trabajo.id] = trabajo
+		futuro = self._pool().submit(funcion, *args)
+		trabajo.estado = "ejecutando"
+		futuro.add_done_callback(lambda f: self._terminar(trabajo, f))
+		return trabajo
+
+	def enviar(self, modelo, fuente="archivo", archivo=None, promover=False) -> Trabajo:
+		if modelo not in MODELOS:
+			raise TrainingError(f"Modelo no registrado: {modelo}")
+		if fuente not in FUENTES:
+			raise TrainingError(f"Fuente de datos no soportada: {fuente}")
+		return self._enviar(Trabajo(modelo, fuente, archivo, promover), entrenar, modelo, fuente, archivo)
+
+	def enviar_incremental(self, modelo, ruta, promover=True) -> Trabajo:
+		#ruta: artefacto que se esta sirviendo; el proceso hijo lo lee de disco
+		if modelo not in MODELOS:
+			raise TrainingError(f"Modelo no registrado: {modelo}")
+		return self._enviar(Trabajo(modelo, "db", None, promover, tipo="incremental"), ampliar, modelo, ruta)
+
+	def _terminar(self, trabajo, futuro):
+		trabajo.terminado = datetime.utcnow()
+		try:
+			trabajo.resultado = futuro.result()
+		except Exception as e:
+			if isinstance(e, TrainingError):
+				logger.warning("Entrenamiento %s del modelo %s rechazado: %s", trabajo.id, trabajo.modelo, e)
+			else:
+				logger.exception("Fallo el entrenamiento %s del modelo %s", trabajo.id, trabajo.modelo)
+			trabajo.estado = "error"
+			trabajo.error = str(e)
+			return
+		trabajo.estado = "terminado"
+		if trabajo.promover:
+			from ml.registry import registry
+			if not trabajo.resultado.get("aceptado", True):
+				trabajo.error = "El candidato es peor que el modelo vigente en el holdout"
+				return
+			if "version_base" in trabajo.resultado and registry.obtener(trabajo.modelo).version != trabajo.resultado["version_base"]:
+				trabajo.error = "El modelo vigente cambio durante el entrenamiento"
+				return
+			try:
+				registry.promover(trabajo.modelo, trabajo.resultado["ruta"])
+				trabajo.promovido = True
+			except Exception as e:
+				logger.exception("No se pudo promover el modelo entrenado %s", trabajo.resultado["ruta"])
+				trabajo.error = "No se pudo promover: " + str(e)
+
+	def obtener(self, id):
+		return self._trabajos.get(id)
+
+	def listar(self):
+		return [trabajo.info() for trabajo in sorted(self._trabajos.values(), key=lambda t: t.creado, reverse=True)]
+
+	def detener(self):
+		with self._lock:
+			if self._executor is not None:
+				self._executor.shutdown(wait=False, cancel_futures=True)
+				self._executor = None
+
+
+trabajos = TrainingJobs(workers=config.TRAINING_WORKERS)
+
+
+class EtiquetasNuevas:
+	#Al llegar a umbral las filas evaluadas despues de las etiquetas que vio el modelo vigente
+	#(etiquetas_hasta del artefacto) se envia un reentrenamiento incremental al pool. La cuenta sale
+	#de la base de datos: la comparten todos los workers y no se pierde al reiniciar; la fila del
+	#modelo en reentrenamiento hace que un solo proceso lo lance por version base
+	def __init__(self, umbral: int, plazo: int):
+		self.umbral = umbral
+		self.plazo = plazo
+		self._ultimo = {}
+
+	async def pendientes(self, db, modelo, artefacto):
+		evaluada = _evaluada(modelo)
+		return await db.scalar(select(func.count()).select_from(evaluada.table).where(evaluada > artefacto.etiquetas_hasta))
+
+	async def _reclamar(self, db, modelo, version, forzar):
+		#UPDATE condicional: de los procesos que llegan al umbral con la misma version solo uno lo
+		#cambia; los demas esperan a una version nueva o a que venza el plazo
+		from models.data import Reentrenamiento
+		ahora = datetime.utcnow()
+		statement = update(Reentrenamiento).where(Reentrenamiento.modelo == modelo).values(version_base=version, lanzado=ahora)
+		if not forzar:
+			statement = statement.where(or_(Reentrenamiento.version_base != version,
+				Reentrenamiento.lanzado < ahora - timedelta(seconds=self.plazo)))
+		try:
+			if (await db.execute(statement.execution_options(synchronize_session=False))).rowcount == 0:
+				#Sin fila para el modelo (primer reentrenamiento); si ya existe, otro proceso lo reclamo
+				await db.execute(insert(Reentrenamiento).values(modelo=modelo, version_base=version, lanzado=ahora))
+			await db.commit()
+		except IntegrityError:
+			await db.rollback()
+			return False
+		return True
+
+	async def _liberar(self, db, modelo, version):
+		from models.data import Reentrenamiento
+		await db.execute(delete(Reentrenamiento).where(Reentrenamiento.modelo == modelo, Reentrenamiento.version_base == version))
+		await db.commit()
+
+	async def registrar(self, db, modelo):
+		#Despues de guardar una evaluacion; db: la AsyncSession del endpoint, ya confirmada
+		if self.umbral <= 0 or modelo not in MODELOS:
+			return None
+		from ml.registry import registry
+		artefacto = registry.actual(modelo)
+		if artefacto is None:
+			return None
+		try:
+			if await self.pendientes(db, modelo, artefacto) < self.umbral:
+				return None
+			return await self.lanzar(db, modelo, forzar=False)
+		except Exception:
+			#La evaluacion ya se guardo; las etiquetas siguen contando para el proximo intento
+			return None
+
+	async def lanzar(self, db, modelo, forzar=True):
+		#forzar: /ampliar, sin esperar al umbral ni a que venza el plazo de otro proceso
+		if modelo not in MODELOS:
+			raise TrainingError(f"Modelo no registrado: {modelo}")
+		from ml.registry import registry
+		ultimo = self._ultimo.get(modelo)
+		if ultimo is not None and ultimo.estado == "ejecutando":
+			#Las etiquetas siguen acumulandose para el proximo
+			return ultimo
+		artefacto = registry.actual(modelo) or await run_in_threadpool(registry.obtener, modelo)
+		if not await self._reclamar(db, modelo, artefacto.version, forzar):
+			return None
+		try:
+			trabajo = trabajos.enviar_incremental(modelo, artefacto.ruta)
+		except Exception:
+			logger.exception("No se pudo enviar el reentrenamiento incremental del modelo %s", modelo)
+			await self._liberar(db, modelo, artefacto.version)
+			raise
+		self._ultimo[modelo] = trabajo
+		return trabajo
+
+	async def estado(self, db):
+		from ml.registry import registry
+		resultado = {}
+		for modelo in MODELOS:
+			artefacto = registry.actual(modelo)
+			resultado[modelo] = {
+				"pendientes": await self.pendientes(db, modelo, artefacto) if artefacto is not None else None,
+				"desde": artefacto.etiquetas_hasta if artefacto is not None else None,
+				"umbral": self.umbral,
+				"ultimo": self._ultimo[modelo].info() if modelo in self._ultimo else None,
+			}
+		return resultado
+
+
+etiquetas = EtiquetasNuevas(umbral=config.ONLINE_RETRAIN_THRESHOLD, plazo=config.ONLINE_RETRAIN_LEASE)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Entrena los modelos de tareas y concertaciones")
+	parser.add_argument("modelo", choices=list(MODELOS))
+	parser.add_argument("--fuente", choices=FUENTES, default="archivo")
+	parser.add_argument("--archivo", help="Archivo dentro de " + config.UPLOAD_TRAIN_FILES_PATH)
+	parser.add_argument("--incremental", help="Agregar arboles al artefacto indicado en lugar de entrenar desde cero")
+	args = parser.parse_args()
+	if args.incremental:
+		resultado = ampliar(args.modelo, args.incremental)
+	else:
+		resultado = entrenar(args.modelo, args.fuente, args.archivo)
+	print(json.dumps({k: v for k, v in resultado.items() if k != "reporte"}, indent=2, ensure_ascii=False))
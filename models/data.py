@@ -1,92 +1,124 @@
 #from db.database import Base
 import datetime
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, Float, String, Text, UniqueConstraint
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, Float, String, Text, UniqueConstraint, event
 from sqlalchemy.orm import relationship
-from fastapi_utils.guid_type import GUID, GUID_DEFAULT_SQLITE
-from sqlalchemy.types import TypeDecorator, String
-import json
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator, String, LargeBinary
+import os
+import time
 from uuid import UUID, uuid4 
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
-class JSONEncodeDict(TypeDecorator):
-	impl = String	
+def uuid7():
+	#RFC 9562: 48 bits de milisegundos Unix, version, 74 bits aleatorios. Las llaves nuevas quedan
+	#al final del indice en lugar de repartirse por todas sus paginas como con uuid4
+	ms = time.time_ns() // 1_000_000
+	aleatorio = int.from_bytes(os.urandom(10), "big")
+	return UUID(int=(ms & 0xFFFFFFFFFFFF) << 80 | 0x7 << 76 | (aleatorio >> 62 & 0xFFF) << 64 | 0b10 << 62 | aleatorio & 0x3FFFFFFFFFFFFFFF)
+
+class BinaryGUID(TypeDecorator):
+	#UUID como BLOB de 16 bytes en SQLite (la mitad que el texto hexadecimal) y uuid nativo en Postgres
+	impl = LargeBinary
 	cache_ok = True
+
+	def load_dialect_impl(self, dialect):
+		if dialect.name == "postgresql":
+			return dialect.type_descriptor(postgresql.UUID(as_uuid=True))
+		return dialect.type_descriptor(LargeBinary(16))
+
 	def process_bind_param(self, value, dialect):
-		if value is not None:
-			value = json.dumps(value)
-		return value
-	
+		if value is None:
+			return value
+		if not isinstance(value, UUID):
+			value = UUID(str(value))
+		return value if dialect.name == "postgresql" else value.bytes
+
 	def process_result_value(self, value, dialect):
-		if value is not None:
-			value = json.loads(value)
-		return value
+		if value is None or isinstance(value, UUID):
+			return value
+		return UUID(bytes=value)
 		
 class User(Base):
 	__tablename__ = "user"
 	
-	id = Column(GUID, primary_key=True, default=GUID_DEFAULT_SQLITE)
+	id = Column(BinaryGUID, primary_key=True, default=uuid7)
 	usuario = Column(String(30), unique=True, index=True) 
 	email = Column(String(30), unique=True, nullable=False, index=True) 
 	ci = Column(String(50), unique=True, nullable=False, index=True)
-	nombre = Column(String(50), nullable=False, index=True) 
-	primer_appellido = Column(String(50), nullable=False, index=True) 
-	segundo_appellido = Column(String(50), nullable=False, index=True)  
-	genero = Column(String(5), nullable=False, index=True) 
-	estado_civil = Column(String(10), nullable=False, index=True)  
-	hijos = Column(Boolean, nullable=False, index=True) 
-	role = Column(JSONEncodeDict)
+	nombre = Column(String(50), nullable=False) 
+	primer_appellido = Column(String(50), nullable=False) 
+	segundo_appellido = Column(String(50), nullable=False)  
+	genero = Column(String(5), nullable=False) 
+	estado_civil = Column(String(10), nullable=False)  
+	hijos = Column(Boolean, nullable=False) 
 	deshabilitado = Column(Boolean, nullable=True, default=False)	
 	hashed_password = Column(String(100), nullable=True, default=False)	
+	#Se incrementa al cambiar contraseña, roles o estado: revoca los tokens emitidos antes
+	token_version = Column(Integer, nullable=False, default=0)
 	
 	profesor = relationship("Profesor", uselist=False, back_populates="user_profesor", cascade="all, delete")
 	cliente = relationship("Cliente", uselist=False, back_populates="user_cliente", cascade="all, delete")
 	estudiante = relationship("Estudiante", uselist=False, back_populates="user_estudiante", cascade="all, delete")
+	#Roles en user_role; role se lee y asigna como lista de nombres
+	roles = relationship("User_Role", cascade="all, delete-orphan", lazy="selectin")
+	role = association_proxy("roles", "role", creator=lambda role: User_Role(role=role))
+
+class User_Role(Base):
+	#Un rol por fila: los usuarios de un rol son una busqueda en la llave primaria (role, user_id)
+	__tablename__ = "user_role"
+	
+	role = Column(String(20), primary_key=True)
+	user_id = Column(BinaryGUID, ForeignKey("user.id"), primary_key=True, index=True)
 
 class Profesor(Base):
 	__tablename__ = "profesor"
 	
-	id_profesor = Column(GUID, primary_key=True, default=GUID_DEFAULT_SQLITE) 
-	prf_numero_empleos = Column(Integer, nullable=False, index=True) 
-	prf_pos_tecnica_trabajo = Column(String(20), nullable=True, index=True) 
-	prf_pos_tecnica_hogar = Column(String(20), nullable=True, index=True) 
-	prf_trab_remoto = Column(Boolean, nullable=False, index=True) 
-	prf_cargo = Column(Boolean, nullable=False, index=True) 
-	prf_categoria_docente = Column(String(15), nullable=False, index=True) 
-	prf_categoria_cientifica = Column(String(15), nullable=False, index=True) 
-	prf_experiencia_practicas = Column(Boolean, nullable=False, index=True) 
-	prf_numero_est_atendidos = Column(Integer, nullable=False, index=True) 
-
-	prf_universidad_id = Column(GUID, ForeignKey("universidad.id_universidad"))
+	id_profesor = Column(BinaryGUID, primary_key=True, default=uuid7) 
+	prf_numero_empleos = Column(Integer, nullable=False) 
+	prf_pos_tecnica_trabajo = Column(String(20), nullable=True) 
+	prf_pos_tecnica_hogar = Column(String(20), nullable=True) 
+	prf_trab_remoto = Column(Boolean, nullable=False) 
+	prf_cargo = Column(Boolean, nullable=False) 
+	prf_categoria_docente = Column(String(15), nullable=False) 
+	prf_categoria_cientifica = Column(String(15), nullable=False) 
+	prf_experiencia_practicas = Column(Boolean, nullable=False) 
+	prf_numero_est_atendidos = Column(Integer, nullable=False) 
+
+	prf_universidad_id = Column(BinaryGUID, ForeignKey("universidad.id_universidad"), index=True)
 	prf_universidad = relationship("Universidad", back_populates="profesores")	
-	user_profesor_id = Column(GUID, ForeignKey("user.id"), unique=True)
+	user_profesor_id = Column(BinaryGUID, ForeignKey("user.id"), unique=True)
 	user_profesor = relationship("User", back_populates="profesor")
 	
-	profesor_concertacion = relationship("Cliente", secondary="concertacion_tema", back_populates="cliente_concertacion", cascade="all, delete") 	
+	#Solo lectura: borrar por la tabla secondary eliminaria las filas de concertacion_tema sin sus
+	#tareas (y con cascade, a los clientes). Al eliminar el profesor se borra por concertaciones
+	profesor_concertacion = relationship("Cliente", secondary="concertacion_tema", back_populates="cliente_concertacion", viewonly=True) 	
+	concertaciones = relationship("Concertacion_Tema", foreign_keys="Concertacion_Tema.conc_profesor_id", cascade="all, delete")
 
 class Centro_Practicas(Base):
 	__tablename__ = "centro_practicas"
 	
-	id_centro = Column(GUID, primary_key=True, default=GUID_DEFAULT_SQLITE) 
+	id_centro = Column(BinaryGUID, primary_key=True, default=uuid7) 
 	centro_nombre = Column(String(50), unique=True, nullable=False, index=True) 
 	centro_siglas = Column(String(20), unique=True, nullable=True, index=True)
-	centro_tec = Column(String(20), nullable=True, index=True) 
-	centro_transp = Column(Boolean, nullable=False, index=True) 
-	centro_experiencia = Column(Boolean, nullable=False, index=True) 
-	centro_teletrab = Column(Boolean, nullable=False, index=True) 
+	centro_tec = Column(String(20), nullable=True) 
+	centro_transp = Column(Boolean, nullable=False) 
+	centro_experiencia = Column(Boolean, nullable=False) 
+	centro_teletrab = Column(Boolean, nullable=False) 
 	
 	clientes = relationship("Cliente", back_populates="cli_centro_practicas", cascade="all, delete")
 
 class Universidad(Base):
 	__tablename__ = "universidad"
 	
-	id_universidad = Column(GUID, primary_key=True, default=GUID_DEFAULT_SQLITE) 
+	id_universidad = Column(BinaryGUID, primary_key=True, default=uuid7) 
 	universidad_nombre = Column(String(50), unique=True, nullable=False, index=True) 
 	universidad_siglas = Column(String(20), unique=True, nullable=True, index=True) 
-	universidad_tec = Column(String(20), nullable=True, index=True) 
-	universidad_transp = Column(Boolean, nullable=False, index=True) 
-	universidad_teletrab = Column(Boolean, nullable=False, index=True) 
+	universidad_tec = Column(String(20), nullable=True) 
+	universidad_transp = Column(Boolean, nullable=False) 
+	universidad_teletrab = Column(Boolean, nullable=False) 
 	
 	estudiantes = relationship("Estudiante", back_populates="est_universidad", cascade="all, delete")
 	profesores = relationship("Profesor", back_populates="prf_universidad", cascade="all, delete")
@@ -94,76 +126,178 @@ class Universidad(Base):
 class Cliente(Base):
 	__tablename__ = "cliente"
 	
-	id_cliente = Column(GUID, primary_key=True, default=GUID_DEFAULT_SQLITE) 
-	cli_numero_empleos = Column(Integer, nullable=False, index=True) 
-	cli_pos_tecnica_trabajo = Column(String(20), nullable=True, index=True) 
-	cli_pos_tecnica_hogar = Column(String(20), nullable=True, index=True) 
-	cli_cargo = Column(Boolean, nullable=False, index=True) 
-	cli_trab_remoto = Column(Boolean, nullable=False, index=True) 
-	cli_categoria_docente = Column(String(5), nullable=False, index=True) #Instructor, Auxiliar, Asistente, Titular, Ninguna
-	cli_categoria_cientifica = Column(String(5), nullable=False, index=True) #Ingeniero, Licenciado, Master, Doctor, Tecnico, Ninguna
-	cli_experiencia_practicas = Column(Boolean, nullable=False, index=True) 
-	cli_numero_est_atendidos = Column(Integer, nullable=False, index=True) #Numero de estudiantes atendidos en el pasado
-
-	cli_centro_id = Column(GUID, ForeignKey("centro_practicas.id_centro"))
+	id_cliente = Column(BinaryGUID, primary_key=True, default=uuid7) 
+	cli_numero_empleos = Column(Integer, nullable=False) 
+	cli_pos_tecnica_trabajo = Column(String(20), nullable=True) 
+	cli_pos_tecnica_hogar = Column(String(20), nullable=True) 
+	cli_cargo = Column(Boolean, nullable=False) 
+	cli_trab_remoto = Column(Boolean, nullable=False) 
+	cli_categoria_docente = Column(String(5), nullable=False) #Instructor, Auxiliar, Asistente, Titular, Ninguna
+	cli_categoria_cientifica = Column(String(5), nullable=False) #Ingeniero, Licenciado, Master, Doctor, Tecnico, Ninguna
+	cli_experiencia_practicas = Column(Boolean, nullable=False) 
+	cli_numero_est_atendidos = Column(Integer, nullable=False) #Numero de estudiantes atendidos en el pasado
+
+	cli_centro_id = Column(BinaryGUID, ForeignKey("centro_practicas.id_centro"), index=True)
 	cli_centro_practicas = relationship("Centro_Practicas", back_populates="clientes")
-	user_cliente_id = Column(GUID, ForeignKey("user.id"), unique=True)
+	user_cliente_id = Column(BinaryGUID, ForeignKey("user.id"), unique=True)
 	user_cliente = relationship("User", back_populates="cliente")
 	
-	cliente_concertacion = relationship("Profesor", secondary="concertacion_tema", back_populates="profesor_concertacion", cascade="all, delete") 	
+	#Solo lectura, como Profesor.profesor_concertacion
+	cliente_concertacion = relationship("Profesor", secondary="concertacion_tema", back_populates="profesor_concertacion", viewonly=True) 	
+	concertaciones = relationship("Concertacion_Tema", foreign_keys="Concertacion_Tema.conc_cliente_id", cascade="all, delete")
 
 class Concertacion_Tema(Base):
 	__tablename__ = "concertacion_tema"
 	
-	id_conc_tema = Column(GUID, primary_key=True, default=GUID_DEFAULT_SQLITE)
+	#Unico por si solo: tarea lo referencia sin el resto de la clave primaria compuesta
+	id_conc_tema = Column(BinaryGUID, primary_key=True, default=uuid7, unique=True, index=True)
 	conc_tema = Column(String(50), unique=True, nullable=False, index=True)
-	conc_descripcion = Column(String(200), nullable=False, index=True)
-	conc_valoracion_prof = Column(String(200), nullable=False, index=True)
-	conc_valoracion_cliente = Column(String(200), nullable=False, index=True)
-	conc_complejidad = Column(String(15), nullable=False, index=True) #Alta, Baja, Media	
-	conc_activa = Column(Boolean, nullable=True, index=True, default=True) 
-	conc_evaluacion = Column(String(15), nullable=True, index=True, default="Mejorable") #Positiva, Mejorable
-	conc_evaluacion_pred = Column(String(15), nullable=True, index=True) #Positiva, Mejorable
-	conc_actores_externos = Column(Integer, nullable=False,  index=True) #N�mero de miembros en el equipo
-
-	conc_profesor_id = Column(GUID, ForeignKey('profesor.id_profesor'), primary_key=True)   
-	conc_cliente_id = Column(GUID, ForeignKey('cliente.id_cliente'), primary_key=True) 
+	conc_descripcion = Column(String(200), nullable=False)
+	conc_valoracion_prof = Column(String(200), nullable=False)
+	conc_valoracion_cliente = Column(String(200), nullable=False)
+	conc_complejidad = Column(String(15), nullable=False) #Alta, Baja, Media	
+	conc_activa = Column(Boolean, nullable=True, default=True) 
+	conc_evaluacion = Column(String(15), nullable=True, default="Mejorable") #Positiva, Mejorable
+	#Fecha de la ultima evaluacion; NULL si conc_evaluacion solo tiene el valor por defecto
+	conc_evaluada = Column(DateTime, nullable=True, index=True)
+	conc_evaluacion_pred = Column(String(15), nullable=True) #Positiva, Mejorable
+	conc_evaluacion_prob = Column(Float, nullable=True) #Probabilidad de la clase predicha
+	conc_actores_externos = Column(Integer, nullable=False) #N�mero de miembros en el equipo
+
+	conc_profesor_id = Column(BinaryGUID, ForeignKey('profesor.id_profesor'), primary_key=True, index=True)   
+	conc_cliente_id = Column(BinaryGUID, ForeignKey('cliente.id_cliente'), primary_key=True, index=True) 
 	tareas = relationship("Tarea", back_populates="concertacion_tareas", cascade="all, delete")
 
 class Tarea(Base):
 	__tablename__ = "tarea"
 	
-	id_tarea = Column(GUID, primary_key=True, default=GUID_DEFAULT_SQLITE) 
-	tarea_tipo = Column(String(20), unique=False, nullable=False, index=True) 
-	tarea_descripcion = Column(String(200), unique=False, nullable=False, index=True) 
+	id_tarea = Column(BinaryGUID, primary_key=True, default=uuid7) 
+	tarea_tipo = Column(String(20), unique=False, nullable=False) 
+	tarea_descripcion = Column(String(200), unique=False, nullable=False) 
 	tarea_fecha_inicio = Column(DateTime, nullable=False)
 	tarea_fecha_fin = Column(DateTime, nullable=False)
-	tarea_complejidad_estimada = Column(String(50), nullable=False, index=True) 
-	tarea_participantes = Column(Integer, nullable=False,  index=True) #N�mero de miembros en el equipo
-	tarea_asignada = Column(Boolean, nullable=True, index=True, default=True) 
-	tarea_activa = Column(Boolean, nullable=False, index=True, default=True) 
-	tarea_evaluacion = Column(String(15), nullable=True, index=True, default="Mejorable") #Positiva, Mejorable
-	tarea_evaluacion_pred = Column(String(15), nullable=True, index=True) #Positiva, Mejorable 
-
-	concertacion_tarea_id = Column(GUID, ForeignKey("concertacion_tema.id_conc_tema"))
+	tarea_complejidad_estimada = Column(String(50), nullable=False) 
+	tarea_participantes = Column(Integer, nullable=False) #N�mero de miembros en el equipo
+	tarea_asignada = Column(Boolean, nullable=True, default=True) 
+	tarea_activa = Column(Boolean, nullable=False, default=True) 
+	tarea_evaluacion = Column(String(15), nullable=True, default="Mejorable") #Positiva, Mejorable
+	#Fecha de la ultima evaluacion; NULL si tarea_evaluacion solo tiene el valor por defecto
+	tarea_evaluada = Column(DateTime, nullable=True, index=True)
+	tarea_evaluacion_pred = Column(String(15), nullable=True) #Positiva, Mejorable 
+	tarea_evaluacion_prob = Column(Float, nullable=True) #Probabilidad de la clase predicha
+
+	concertacion_tarea_id = Column(BinaryGUID, ForeignKey("concertacion_tema.id_conc_tema"), index=True)
 	concertacion_tareas = relationship("Concertacion_Tema", back_populates="tareas")	
-	estudiantes = relationship("Estudiante", back_populates="tareas_estudiantes", cascade="all, delete")
+	#Eliminar una tarea no elimina a sus estudiantes: quedan sin tarea (ON DELETE SET NULL) y libres
+	estudiantes = relationship("Estudiante", back_populates="tareas_estudiantes", passive_deletes=True)
 		
 class Estudiante(Base): #Addicionar CI a todos los actores
 	__tablename__ = "estudiante"
 	
-	id_estudiante = Column(GUID, primary_key=True, default=GUID_DEFAULT_SQLITE) 
-	est_trabajo = Column(Boolean, nullable=False, index=True) 
-	est_becado = Column(Boolean, nullable=False, index=True) 
-	est_posibilidad_economica = Column(String(15), nullable=False, index=True) #Alta, Baja, Media
-	est_pos_tecnica_escuela = Column(String(20), nullable=True, index=True) 
-	est_pos_tecnica_hogar = Column(String(20), nullable=True, index=True) 
-	est_trab_remoto = Column(Boolean, nullable=False, index=True) 
-	est_ocupado = Column(Boolean, nullable=True, index=True, default=False) 
+	id_estudiante = Column(BinaryGUID, primary_key=True, default=uuid7) 
+	est_trabajo = Column(Boolean, nullable=False) 
+	est_becado = Column(Boolean, nullable=False) 
+	est_posibilidad_economica = Column(String(15), nullable=False) #Alta, Baja, Media
+	est_pos_tecnica_escuela = Column(String(20), nullable=True) 
+	est_pos_tecnica_hogar = Column(String(20), nullable=True) 
+	est_trab_remoto = Column(Boolean, nullable=False) 
+	est_ocupado = Column(Boolean, nullable=True, default=False) 
 
-	user_estudiante_id = Column(GUID, ForeignKey("user.id"), unique=True)
+	user_estudiante_id = Column(BinaryGUID, ForeignKey("user.id"), unique=True)
 	user_estudiante = relationship("User", back_populates="estudiante")
-	est_universidad_id = Column(GUID, ForeignKey("universidad.id_universidad"))
+	est_universidad_id = Column(BinaryGUID, ForeignKey("universidad.id_universidad"), index=True)
 	est_universidad = relationship("Universidad", back_populates="estudiantes")
-	tareas_estudiantes_id = Column(GUID, ForeignKey("tarea.id_tarea"))
+	tareas_estudiantes_id = Column(BinaryGUID, ForeignKey("tarea.id_tarea", ondelete="SET NULL"), index=True)
 	tareas_estudiantes = relationship("Tarea", back_populates="estudiantes")	
+
+@event.listens_for(Tarea, "before_delete")
+def _liberar_estudiantes(mapper, connection, tarea):
+	#La llave foranea solo quita la referencia; el estudiante tambien deja de estar ocupado
+	estudiante = Estudiante.__table__
+	connection.execute(estudiante.update().where(estudiante.c.tareas_estudiantes_id == tarea.id_tarea
+		).values(tareas_estudiantes_id=None, est_ocupado=False))
+
+#Almacen de caracteristicas: entradas desnormalizadas de los modelos de prediccion,
+#mantenidas por ml.feature_store cada vez que cambian las filas de origen
+class Tarea_Features(Base):
+	__tablename__ = "tarea_features"
+
+	id_tarea = Column(BinaryGUID, primary_key=True)
+	conc_actores_externos = Column(Integer, nullable=True)
+	conc_complejidad = Column(String(15), nullable=True)
+	est_becado = Column(Boolean, nullable=True)
+	est_pos_tecnica_escuela = Column(String(20), nullable=True)
+	est_pos_tecnica_hogar = Column(String(20), nullable=True)
+	est_posibilidad_economica = Column(String(15), nullable=True)
+	est_trab_remoto = Column(Boolean, nullable=True)
+	est_trabajo = Column(Boolean, nullable=True)
+	est_estadocivil = Column(String(10), nullable=True)
+	est_genero = Column(String(5), nullable=True)
+	est_hijos = Column(Boolean, nullable=True)
+	tarea_complejidad_estimada = Column(String(50), nullable=True)
+	tarea_participantes = Column(Integer, nullable=True)
+	tarea_tipo = Column(String(20), nullable=True)
+	actualizado = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class Concertacion_Features(Base):
+	__tablename__ = "concertacion_features"
+
+	id_conc_tema = Column(BinaryGUID, primary_key=True)
+	conc_profesor_id = Column(BinaryGUID, nullable=False)
+	conc_cliente_id = Column(BinaryGUID, nullable=False)
+	conc_actores_externos = Column(Integer, nullable=True)
+	conc_complejidad = Column(String(15), nullable=True)
+	prf_trab_remoto = Column(Boolean, nullable=True)
+	prf_cargo = Column(Boolean, nullable=True)
+	prf_categoria_cientifica = Column(String(15), nullable=True)
+	prf_categoria_docente = Column(String(15), nullable=True)
+	prf_pos_tecnica_trabajo = Column(String(20), nullable=True)
+	prf_pos_tecnica_hogar = Column(String(20), nullable=True)
+	prf_experiencia_practicas = Column(Boolean, nullable=True)
+	prf_numero_empleos = Column(Integer, nullable=True)
+	prf_numero_est_atendidos = Column(Integer, nullable=True)
+	prf_estadocivil = Column(String(10), nullable=True)
+	prf_genero = Column(String(5), nullable=True)
+	prf_hijos = Column(Boolean, nullable=True)
+	cli_cargo = Column(Boolean, nullable=True)
+	cli_categoria_cientifica = Column(String(15), nullable=True)
+	cli_categoria_docente = Column(String(15), nullable=True)
+	cli_experiencia_practicas = Column(Boolean, nullable=True)
+	cli_numero_empleos = Column(Integer, nullable=True)
+	cli_numero_est_atendidos = Column(Integer, nullable=True)
+	cli_pos_tecnica_hogar = Column(String(20), nullable=True)
+	cli_pos_tecnica_trabajo = Column(String(20), nullable=True)
+	cli_trab_remoto = Column(Boolean, nullable=True)
+	cli_estadocivil = Column(String(10), nullable=True)
+	cli_genero = Column(String(5), nullable=True)
+	cli_hijos = Column(Boolean, nullable=True)
+	actualizado = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class Token_Revocado(Base):
+	#Version minima aceptada por usuario hasta que expiren los tokens anteriores
+	__tablename__ = "token_revocado"
+	
+	id_usuario = Column(BinaryGUID, primary_key=True)
+	token_version = Column(Integer, nullable=False)
+	expira = Column(DateTime, nullable=False)
+
+class Refresh_Token(Base):
+	#Solo se guarda el sha256 del token; cada uso lo rota dentro de la misma familia
+	__tablename__ = "refresh_token"
+	
+	id_refresh = Column(BinaryGUID, primary_key=True, default=uuid7)
+	token_hash = Column(String(64), unique=True, nullable=False, index=True)
+	familia = Column(BinaryGUID, nullable=False, index=True)
+	refresh_user_id = Column(BinaryGUID, ForeignKey("user.id"), nullable=False, index=True)
+	creado = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+	expira = Column(DateTime, nullable=False)
+	usado = Column(DateTime, nullable=True)
+
+class Reentrenamiento(Base):
+	#Ultimo reentrenamiento incremental lanzado por modelo: de los workers que llegan al umbral
+	#de etiquetas con la misma version base solo uno lo lanza (ml.training.EtiquetasNuevas)
+	__tablename__ = "reentrenamiento"
+	
+	modelo = Column(String(20), primary_key=True)
+	version_base = Column(String(12), nullable=False)
+	lanzado = Column(DateTime, nullable=False)
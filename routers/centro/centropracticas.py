@@ -1,18 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, engine, get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Security
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.paginacion import Pagina, paginar
+from db.database import get_db
 from models.data import Centro_Practicas
 from schemas.centro_practicas import Centro_PracticasAdd, Centro_Practicas_InDB
 from schemas.user import User_InDB
 from security.auth import get_current_active_user, get_current_user
 from typing_extensions import Annotated
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from ml.feature_store import afectados, refrescar
 
 router = APIRouter()
 
 @router.post("/crear_centropracticas/", status_code=status.HTTP_201_CREATED)
 async def crear_centropracticas(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					practicas: Centro_PracticasAdd, db: Session = Depends(get_db)):
+					practicas: Centro_PracticasAdd, db: AsyncSession = Depends(get_db)):
 	try:
 		db_practicas = Centro_Practicas(
 			centro_nombre = practicas.centro_nombre,
@@ -23,8 +26,8 @@ async def crear_centropracticas(current_user: Annotated[User_InDB, Security(get_
 			centro_teletrab = practicas.centro_teletrab
 		)			
 		db.add(db_practicas)   	
-		db.commit()
-		db.refresh(db_practicas)			
+		await db.commit()
+		await db.refresh(db_practicas)			
 		return db_practicas
 		
 	except IntegrityError as e:
@@ -35,29 +38,32 @@ async def crear_centropracticas(current_user: Annotated[User_InDB, Security(get_
 
 @router.get("/leer_centropracticas/", status_code=status.HTTP_201_CREATED)  
 async def leer_centropracticas(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor", "cliente", "estudiante"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
-	db_practicas = db.query(Centro_Practicas).all()	
+					response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
+	db_practicas = [fila[0] for fila in await paginar(db, select(Centro_Practicas), (Centro_Practicas.id_centro,), pagina, response)]	
 	return db_practicas
 
 
 @router.delete("/eliminar_centropracticas/{id}", status_code=status.HTTP_201_CREATED) 
 async def eliminar_centropracticas(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					id: str, db: Session = Depends(get_db)):
-	db_practicas = db.query(Centro_Practicas
+					id: str, db: AsyncSession = Depends(get_db)):
+	db_practicas = (await db.execute(select(Centro_Practicas
 						).filter(Centro_Practicas.id_centro == id
-						).first()
+						))).scalars().first()
 	if db_practicas is None:
 		raise HTTPException(status_code=404, detail="La Entidad Destino no existe en la base de datos")	
-	db.delete(db_practicas)	
-	db.commit()
+	#Filas del almacen de caracteristicas que dependen del objeto eliminado
+	tareas, concertaciones = await db.run_sync(afectados, centros=[db_practicas.id_centro])
+	await db.delete(db_practicas)	
+	await db.run_sync(refrescar, tareas, concertaciones)
+	await db.commit()
 	return {"Result": "Centro prácticas eliminada satisfactoriamente"}
 
 		
 @router.put("/actualizar_centropracticas/{id}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_centropracticas(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])], 
-				id: str, centro_nuevo: Centro_PracticasAdd, db: Session = Depends(get_db)):
+				id: str, centro_nuevo: Centro_PracticasAdd, db: AsyncSession = Depends(get_db)):
 	
-	db_practicas = db.query(Centro_Practicas).filter(Centro_Practicas.id_centro == id).first()
+	db_practicas = (await db.execute(select(Centro_Practicas).filter(Centro_Practicas.id_centro == id))).scalars().first()
 	if db_practicas is None:
 		raise HTTPException(status_code=404, detail="La entidad seleccionada no existen en la base de datos")
 	db_practicas.centro_nombre=centro_nuevo.centro_nombre
@@ -66,7 +72,7 @@ async def actualizar_centropracticas(current_user: Annotated[User_InDB, Security
 	db_practicas.centro_transp=centro_nuevo.centro_transp
 	db_practicas.centro_teletrab=centro_nuevo.centro_teletrab
 	db_practicas.centro_experiencia=centro_nuevo.centro_experiencia
-	db.commit()
-	db.refresh(db_practicas)	
+	await db.commit()
+	await db.refresh(db_practicas)	
 	return {"Result": "Entidad Destino actualizada satisfactoriamente"}
 	
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, engine, get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Security
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.paginacion import Pagina, paginar
+from db.database import get_db
 from models.data import Cliente, User
 from schemas.cliente import Cliente_Record, ClienteAdd, Cliente_InDB, ClienteSchema
 from schemas.user import User_InDB
@@ -8,12 +10,13 @@ from security.auth import get_current_active_user, get_current_user
 from typing_extensions import Annotated
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from typing import List
+from ml.feature_store import afectados, refrescar, refrescar_afectados
 
 router = APIRouter()
 
 @router.post("/crear_cliente/", status_code=status.HTTP_201_CREATED)
 async def crear_cliente(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					cliente: ClienteAdd, db: Session = Depends(get_db)):
+					cliente: ClienteAdd, db: AsyncSession = Depends(get_db)):
 	try:
 		db_cliente = Cliente(
 			cli_numero_empleos = cliente.cli_numero_empleos,
@@ -29,8 +32,8 @@ async def crear_cliente(current_user: Annotated[User_InDB, Security(get_current_
 			user_cliente_id = cliente.user_cliente_id			
 		)			
 		db.add(db_cliente)   	
-		db.commit()
-		db.refresh(db_cliente)
+		await db.commit()
+		await db.refresh(db_cliente)
 		return db_cliente 
 	except IntegrityError as e:
 		raise HTTPException(status_code=500, detail="El cliente ya existe en la base de datos")
@@ -40,20 +43,23 @@ async def crear_cliente(current_user: Annotated[User_InDB, Security(get_current_
 
 @router.delete("/eliminar_cliente/{id}", status_code=status.HTTP_201_CREATED) 
 async def eliminar_cliente(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					id: str, db: Session = Depends(get_db)):
-	db_cliente = db.query(Cliente).filter(Cliente.id_cliente == id).first()
+					id: str, db: AsyncSession = Depends(get_db)):
+	db_cliente = (await db.execute(select(Cliente).filter(Cliente.id_cliente == id))).scalars().first()
 	if db_cliente is None:
 		raise HTTPException(status_code=404, detail="El cliente no existe en la base de datos")	
-	db.delete(db_cliente)	
-	db.commit()
+	#Filas del almacen de caracteristicas que dependen del objeto eliminado
+	tareas, concertaciones = await db.run_sync(afectados, clientes=[db_cliente.id_cliente])
+	await db.delete(db_cliente)	
+	await db.run_sync(refrescar, tareas, concertaciones)
+	await db.commit()
 	return {"Result": "Cliente eliminado satisfactoriamente"}
 
 
 @router.put("/actualizar_cliente/{id}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_cliente(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["cliente"])], 
-				id: str, cliente: Cliente_Record, db: Session = Depends(get_db)):
+				id: str, cliente: Cliente_Record, db: AsyncSession = Depends(get_db)):
 	
-	db_cliente = db.query(Cliente).filter(Cliente.id_cliente == id).first()
+	db_cliente = (await db.execute(select(Cliente).filter(Cliente.id_cliente == id))).scalars().first()
 	if db_cliente is None:
 		raise HTTPException(status_code=404, detail="El cliente seleccionado no existen en la base de datos")
 	db_cliente.cli_numero_empleos = cliente.cli_numero_empleos
@@ -65,16 +71,18 @@ async def actualizar_cliente(current_user: Annotated[User_InDB, Security(get_cur
 	db_cliente.cli_categoria_cientifica = cliente.cli_categoria_cientifica
 	db_cliente.cli_experiencia_practicas = cliente.cli_experiencia_practicas 
 	db_cliente.cli_numero_est_atendidos = cliente.cli_numero_est_atendidos
-	db.commit()
-	db.refresh(db_cliente)	
+	#Mantener el almacen de caracteristicas en la misma transaccion
+	await db.run_sync(refrescar_afectados, clientes=[db_cliente.id_cliente])
+	await db.commit()
+	await db.refresh(db_cliente)	
 	return {"Result": "Datos del cliente actualizados satisfactoriamente"}	
 	
 
 @router.get("/leer_clientes/", response_model=List[ClienteSchema], status_code=status.HTTP_201_CREATED)  
 async def leer_clientes(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
 
-	db_clientes = db.query(
+	db_clientes = await paginar(db, select(
 			#Datos cliente
 			Cliente.id_cliente,
 			Cliente.cli_numero_empleos,
@@ -95,7 +103,7 @@ async def leer_clientes(current_user: Annotated[User_InDB, Security(get_current_
 			User.email,							
 			).select_from(Cliente
 			).join(User, User.id == Cliente.user_cliente_id	
-			).all()	
+			), (Cliente.id_cliente,), pagina, response)	
 	# Serializar los datos
 	result = [
         {
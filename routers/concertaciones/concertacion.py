@@ -1,24 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, engine, get_db
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Security
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.paginacion import Pagina, paginar
+from db import exportacion
+from db.database import get_db, ejecutar_en_hilo
 from models.data import Concertacion_Tema, User, Profesor, Cliente
-from schemas.concertacion import Concertacion_Record, ConcertacionAdd, Concertacion_InDB, Concertacion_Eval, Concertacion_Activate, Concertacion_Actores
+from schemas.concertacion import Concertacion_Record, ConcertacionAdd, Concertacion_InDB, Concertacion_Eval, Concertacion_Activate, Concertacion_Actores, Concertacion_Simulacion, Concertacion_Emparejamiento
 from security.auth import get_current_active_user, get_current_user
 from typing_extensions import Annotated
 from schemas.user import User_InDB
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from typing import List
-import pandas as pd
-import pickle
-from core import config
-import numpy as np
+from ml.feature_store import afectados, refrescar, refrescar_afectados, leer_concertacion
+from ml.registry import ModelNotAvailable
+from ml.prediction_cache import prediction_cache
+from ml.training import etiquetas
+from ml import simulacion, emparejamiento
+from ml.simulacion import SimulationError, CandidateNotFound
 
 
 router = APIRouter()
 
+#Nombre de cada columna de los listados leer_concertaciones* (JSON y exportacion)
+CAMPOS_CONCERTACION = (
+	#Datos de Concertacion
+	"id_conc_tema",
+	"conc_tema",
+	"conc_descripcion",
+	"conc_valoracion_cliente",
+	"conc_valoracion_prof",
+	"conc_actores_externos",
+	"conc_cliente_id",
+	"conc_profesor_id",
+	"conc_complejidad",
+	"conc_evaluacion",
+	"conc_evaluacion_pred",
+	#Datos de profesor
+	"id_profesor",
+	"prf_ci",
+	"prf_nombre",
+	"prf_primer_appellido",
+	"prf_segundo_appellido",
+	#Datos de cliente
+	"id_cliente",
+	"cli_user_id",
+	"cli_nombre",
+	"cli_primer_appellido",
+	"cli_segundo_appellido",
+)
+
 @router.post("/crear_concertacion/", status_code=status.HTTP_201_CREATED)
 async def crear_concertacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					concertacion: ConcertacionAdd, db: Session = Depends(get_db)):
+					concertacion: ConcertacionAdd, db: AsyncSession = Depends(get_db)):
 	try:
 		db_concertacion = Concertacion_Tema(
 			conc_tema = concertacion.conc_tema,
@@ -31,8 +67,11 @@ async def crear_concertacion(current_user: Annotated[User_InDB, Security(get_cur
 			conc_cliente_id = concertacion.conc_cliente_id,
 		)			
 		db.add(db_concertacion)   	
-		db.commit()
-		db.refresh(db_concertacion)			
+		#Asignar la llave y registrar sus caracteristicas en la misma transaccion
+		await db.flush()
+		await db.run_sync(refrescar, concertaciones=[db_concertacion.id_conc_tema])
+		await db.commit()
+		await db.refresh(db_concertacion)			
 		return db_concertacion
 	except IntegrityError as e:
 		raise HTTPException(status_code=500, detail="Error de integridad creando objeto Concertación")
@@ -42,20 +81,23 @@ async def crear_concertacion(current_user: Annotated[User_InDB, Security(get_cur
 
 @router.delete("/eliminar_concertacion/{id}", status_code=status.HTTP_201_CREATED) 
 async def eliminar_concertacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					id: str, db: Session = Depends(get_db)):
-	db_concertacion = db.query(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id).first()
+					id: str, db: AsyncSession = Depends(get_db)):
+	db_concertacion = (await db.execute(select(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id))).scalars().first()
 	if db_concertacion is None:
 		raise HTTPException(status_code=404, detail="La concertación no existe en la base de datos")	
-	db.delete(db_concertacion)	
-	db.commit()
+	#Filas del almacen de caracteristicas que dependen del objeto eliminado
+	tareas, concertaciones = await db.run_sync(afectados, concertaciones=[db_concertacion.id_conc_tema])
+	await db.delete(db_concertacion)	
+	await db.run_sync(refrescar, tareas, concertaciones)
+	await db.commit()
 	return {"Result": "Concertacion eliminada satisfactoriamente"}
 
 
 @router.put("/actualizar_concertacion/{id}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_concertacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])], 
-				id: str, concertacion: Concertacion_Record, db: Session = Depends(get_db)):
+				id: str, concertacion: Concertacion_Record, db: AsyncSession = Depends(get_db)):
 	
-	db_conc = db.query(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id).first()
+	db_conc = (await db.execute(select(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id))).scalars().first()
 	if db_conc is None:
 		raise HTTPException(status_code=404, detail="La concertación de tema seleccionada no existen en la base de datos")
 	db_conc.conc_tema = concertacion.conc_tema
@@ -64,53 +106,60 @@ async def actualizar_concertacion(current_user: Annotated[User_InDB, Security(ge
 	db_conc.conc_valoracion_cliente = concertacion.conc_valoracion_prof
 	db_conc.conc_complejidad = concertacion.conc_complejidad
 	db_conc.conc_actores_externos = concertacion.conc_actores_externos
-	db.commit()
-	db.refresh(db_conc)	
+	#Mantener el almacen de caracteristicas en la misma transaccion
+	await db.run_sync(refrescar_afectados, concertaciones=[db_conc.id_conc_tema])
+	await db.commit()
+	await db.refresh(db_conc)	
 	return {"Result": "Datos de la concertación de tema actualizados satisfactoriamente"}	
 	
 
 @router.put("/actualizar_responsables_concertacion/{id}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_responsables_concertacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])], 
-				id: str, concertacion: Concertacion_Actores, db: Session = Depends(get_db)):
+				id: str, concertacion: Concertacion_Actores, db: AsyncSession = Depends(get_db)):
 	
-	db_conc = db.query(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id).first()
+	db_conc = (await db.execute(select(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id))).scalars().first()
 	if db_conc is None:
 		raise HTTPException(status_code=404, detail="La concertación de tema seleccionada no existen en la base de datos")
 	db_conc.conc_profesor_id = concertacion.conc_profesor_id
 	db_conc.conc_cliente_id = concertacion.conc_cliente_id	
-	db.commit()
-	db.refresh(db_conc)	
+	#Mantener el almacen de caracteristicas en la misma transaccion
+	await db.run_sync(refrescar_afectados, concertaciones=[db_conc.id_conc_tema])
+	await db.commit()
+	await db.refresh(db_conc)	
 	return {"Result": "Datos de responsables de la concertación de tema actualizados satisfactoriamente"}	
 	
 
 @router.put("/activar_concertacion/{id}", status_code=status.HTTP_201_CREATED) 
 async def activar_concertacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])], 
-				id: str, concertacion: Concertacion_Activate, db: Session = Depends(get_db)):
-	db_conc = db.query(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id).first()
+				id: str, concertacion: Concertacion_Activate, db: AsyncSession = Depends(get_db)):
+	db_conc = (await db.execute(select(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id))).scalars().first()
 	if db_conc is None:
 		raise HTTPException(status_code=404, detail="La concertación de tema seleccionada no existen en la base de datos")	
 	db_conc.conc_activa = concertacion.conc_activa
-	db.commit()
-	db.refresh(db_conc)	
+	await db.commit()
+	await db.refresh(db_conc)	
 	return {"Result": "Cambio de concertación desarrollada satisfactoriamente"}
 
 @router.put("/evaluar_concertacion/{id}", status_code=status.HTTP_201_CREATED) 
 async def evaluar_concertacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor"])], 
-				id: str, conc_eva: Concertacion_Eval, db: Session = Depends(get_db)):
+				id: str, conc_eva: Concertacion_Eval, db: AsyncSession = Depends(get_db)):
 	
-	db_concertacion = db.query(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id).first()
+	db_concertacion = (await db.execute(select(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id))).scalars().first()
 	if db_concertacion is None:
 		raise HTTPException(status_code=404, detail="Concertación no existe ne base de datos")
 	db_concertacion.conc_evaluacion = conc_eva.conc_evaluacion 	
-	db.commit()
-	db.refresh(db_concertacion)	
+	db_concertacion.conc_evaluada = datetime.utcnow()
+	await db.commit()
+	await db.refresh(db_concertacion)	
+	#Etiqueta nueva para el reentrenamiento incremental del modelo
+	await etiquetas.registrar(db, "concertacion")
 	return db_concertacion
 	
 
 @router.get("/detalle_concertacion/{id}", status_code=status.HTTP_201_CREATED) 
 async def detalle_concertacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor"])],
-					id: str, db: Session = Depends(get_db)):
-	db_concertacion = db.query(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id).first()
+					id: str, db: AsyncSession = Depends(get_db)):
+	db_concertacion = (await db.execute(select(Concertacion_Tema).filter(Concertacion_Tema.id_conc_tema == id))).scalars().first()
 	if db_concertacion is None:
 		raise HTTPException(status_code=404, detail="La concertación no existe en la base de datos")	
 
@@ -119,10 +168,10 @@ async def detalle_concertacion(current_user: Annotated[User_InDB, Security(get_c
 #response_model=List[ProfesorSchema], 
 @router.get("/leer_concertaciones/", status_code=status.HTTP_201_CREATED)  
 async def leer_concertaciones_ext(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)): 
+					request: Request, response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)): 
 
 	#Datos Profesor
-	prf_query = db.query(
+	prf_query = select(
 		User.id.label('prf_user_id'),
 		User.nombre.label('prf_nombre'),
 		User.primer_appellido.label('prf_primer_appellido'),
@@ -132,7 +181,7 @@ async def leer_concertaciones_ext(current_user: Annotated[User_InDB, Security(ge
 	).subquery()
 	
 	#Datos Cliente
-	cli_query = db.query(
+	cli_query = select(
 		User.id.label('cli_user_id'),
 		User.nombre.label('cli_nombre'),
 		User.primer_appellido.label('cli_primer_appellido'),
@@ -141,7 +190,7 @@ async def leer_concertaciones_ext(current_user: Annotated[User_InDB, Security(ge
 		User
 	).subquery()	
 
-	db_conc = db.query(
+	consulta = select(
 			#Datos de Concertacion
 			Concertacion_Tema.id_conc_tema,
 			Concertacion_Tema.conc_tema,
@@ -171,46 +220,23 @@ async def leer_concertaciones_ext(current_user: Annotated[User_InDB, Security(ge
 			).join(prf_query, prf_query.c.prf_user_id == Profesor.user_profesor_id	
 			).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id	
 			).join(cli_query, cli_query.c.cli_user_id == Cliente.user_cliente_id	
-			).all()	 
+			)
+
+	formato = exportacion.formato(request)
+	if formato:
+		return exportacion.exportar(consulta, (Concertacion_Tema.id_conc_tema,), pagina, CAMPOS_CONCERTACION, formato, "concertaciones")
+	db_conc = await paginar(db, consulta, (Concertacion_Tema.id_conc_tema,), pagina, response)	 
 
 	# Serializar los datos
-	result = [
-        {
-			#Datos de Concertacion
-			"id_conc_tema": concertaciones[0],
-			"conc_tema": concertaciones[1],
-			"conc_descripcion": concertaciones[2],
-			"conc_valoracion_cliente": concertaciones[3],
-			"conc_valoracion_prof": concertaciones[4],
-			"conc_actores_externos": concertaciones[5],
-			"conc_cliente_id": concertaciones[6],
-			"conc_profesor_id": concertaciones[7],
-			"conc_complejidad": concertaciones[8],
-			"conc_evaluacion": concertaciones[9],
-			"conc_evaluacion_pred": concertaciones[10],
-			#Datos de profesor
-			"id_profesor": concertaciones[11],			
-			"prf_ci": concertaciones[12],
-			"prf_nombre": concertaciones[13],
-			"prf_primer_appellido": concertaciones[14],
-			"prf_segundo_appellido": concertaciones[15],
-			#Datos de cliente
-			"id_cliente": concertaciones[16],
-			"cli_user_id": concertaciones[17],
-			"cli_nombre": concertaciones[18],
-			"cli_primer_appellido": concertaciones[19],
-			"cli_segundo_appellido": concertaciones[20],
-        }
-        for concertaciones in db_conc
-    ] 
+	result = [dict(zip(CAMPOS_CONCERTACION, concertaciones)) for concertaciones in db_conc]
 	
 	return result
 
 @router.get("/leer_concertaciones_profesor/", status_code=status.HTTP_201_CREATED)  
 async def leer_concertaciones_profesor(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					request: Request, response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
 	#Datos Profesor
-	prf_query = db.query(
+	prf_query = select(
 		User.id.label('prf_user_id'),
 		User.nombre.label('prf_nombre'),
 		User.primer_appellido.label('prf_primer_appellido'),
@@ -220,7 +246,7 @@ async def leer_concertaciones_profesor(current_user: Annotated[User_InDB, Securi
 	).subquery()
 	
 	#Datos Cliente
-	cli_query = db.query(
+	cli_query = select(
 		User.id.label('cli_user_id'),
 		User.nombre.label('cli_nombre'),
 		User.primer_appellido.label('cli_primer_appellido'),
@@ -229,7 +255,7 @@ async def leer_concertaciones_profesor(current_user: Annotated[User_InDB, Securi
 		User
 	).subquery()	
 
-	db_conc = db.query(
+	consulta = select(
 			#Datos de Concertacion
 			Concertacion_Tema.id_conc_tema,
 			Concertacion_Tema.conc_tema,
@@ -260,46 +286,23 @@ async def leer_concertaciones_profesor(current_user: Annotated[User_InDB, Securi
 			).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id	
 			).join(cli_query, cli_query.c.cli_user_id == Cliente.user_cliente_id	
 			).filter(Profesor.user_profesor_id == current_user.id
-			).all()	 
+			)
+
+	formato = exportacion.formato(request)
+	if formato:
+		return exportacion.exportar(consulta, (Concertacion_Tema.id_conc_tema,), pagina, CAMPOS_CONCERTACION, formato, "concertaciones_profesor")
+	db_conc = await paginar(db, consulta, (Concertacion_Tema.id_conc_tema,), pagina, response)	 
 
 	# Serializar los datos
-	result = [
-        {
-			#Datos de Concertacion
-			"id_conc_tema": concertaciones[0],
-			"conc_tema": concertaciones[1],
-			"conc_descripcion": concertaciones[2],
-			"conc_valoracion_cliente": concertaciones[3],
-			"conc_valoracion_prof": concertaciones[4],
-			"conc_actores_externos": concertaciones[5],
-			"conc_cliente_id": concertaciones[6],
-			"conc_profesor_id": concertaciones[7],
-			"conc_complejidad": concertaciones[8],
-			"conc_evaluacion": concertaciones[9],
-			"conc_evaluacion_pred": concertaciones[10],
-			#Datos de profesor
-			"id_profesor": concertaciones[11],			
-			"prf_ci": concertaciones[12],
-			"prf_nombre": concertaciones[13],
-			"prf_primer_appellido": concertaciones[14],
-			"prf_segundo_appellido": concertaciones[15],
-			#Datos de cliente
-			"id_cliente": concertaciones[16],
-			"cli_user_id": concertaciones[17],
-			"cli_nombre": concertaciones[18],
-			"cli_primer_appellido": concertaciones[19],
-			"cli_segundo_appellido": concertaciones[20],
-        }
-        for concertaciones in db_conc
-    ] 
+	result = [dict(zip(CAMPOS_CONCERTACION, concertaciones)) for concertaciones in db_conc]
 	
 	return result
 
 @router.get("/leer_concertaciones_cliente/", status_code=status.HTTP_201_CREATED)  
 async def leer_concertaciones_cliente(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["cliente"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					request: Request, response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
 
-	prf_query = db.query(
+	prf_query = select(
 		User.id.label('prf_user_id'),
 		User.nombre.label('prf_nombre'),
 		User.primer_appellido.label('prf_primer_appellido'),
@@ -309,7 +312,7 @@ async def leer_concertaciones_cliente(current_user: Annotated[User_InDB, Securit
 	).subquery()
 	
 	#Datos Cliente
-	cli_query = db.query(
+	cli_query = select(
 		User.id.label('cli_user_id'),
 		User.nombre.label('cli_nombre'),
 		User.primer_appellido.label('cli_primer_appellido'),
@@ -318,7 +321,7 @@ async def leer_concertaciones_cliente(current_user: Annotated[User_InDB, Securit
 		User
 	).subquery()	
 
-	db_conc = db.query(
+	consulta = select(
 			#Datos de Concertacion
 			Concertacion_Tema.id_conc_tema,
 			Concertacion_Tema.conc_tema,
@@ -349,122 +352,63 @@ async def leer_concertaciones_cliente(current_user: Annotated[User_InDB, Securit
 			).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id	
 			).join(cli_query, cli_query.c.cli_user_id == Cliente.user_cliente_id	
 			).filter(Cliente.user_cliente_id == current_user.id
-			).all()	 
+			)
+
+	formato = exportacion.formato(request)
+	if formato:
+		return exportacion.exportar(consulta, (Concertacion_Tema.id_conc_tema,), pagina, CAMPOS_CONCERTACION, formato, "concertaciones_cliente")
+	db_conc = await paginar(db, consulta, (Concertacion_Tema.id_conc_tema,), pagina, response)	 
 
 	# Serializar los datos
-	result = [
-        {
-			#Datos de Concertacion
-			"id_conc_tema": concertaciones[0],
-			"conc_tema": concertaciones[1],
-			"conc_descripcion": concertaciones[2],
-			"conc_valoracion_cliente": concertaciones[3],
-			"conc_valoracion_prof": concertaciones[4],
-			"conc_actores_externos": concertaciones[5],
-			"conc_cliente_id": concertaciones[6],
-			"conc_profesor_id": concertaciones[7],
-			"conc_complejidad": concertaciones[8],
-			"conc_evaluacion": concertaciones[9],
-			"conc_evaluacion_pred": concertaciones[10],
-			#Datos de profesor
-			"id_profesor": concertaciones[11],			
-			"prf_ci": concertaciones[12],
-			"prf_nombre": concertaciones[13],
-			"prf_primer_appellido": concertaciones[14],
-			"prf_segundo_appellido": concertaciones[15],
-			#Datos de cliente
-			"id_cliente": concertaciones[16],
-			"cli_user_id": concertaciones[17],
-			"cli_nombre": concertaciones[18],
-			"cli_primer_appellido": concertaciones[19],
-			"cli_segundo_appellido": concertaciones[20],
-        }
-        for concertaciones in db_conc
-    ] 
+	result = [dict(zip(CAMPOS_CONCERTACION, concertaciones)) for concertaciones in db_conc]
 	return result 
 
+@router.post("/simular_concertaciones/", status_code=status.HTTP_201_CREATED)
+async def simular_concertaciones(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					solicitud: Concertacion_Simulacion):
+	#Candidatos que aun no existen: se predicen juntos y se devuelven ordenados, sin escribir nada
+	base = solicitud.model_dump(include={"conc_complejidad", "conc_actores_externos"})
+	try:
+		candidatos = await ejecutar_en_hilo(
+			simulacion.candidatos_concertacion, base, solicitud.profesores, solicitud.clientes, solicitud.filas)
+		version, resultados = await run_in_threadpool(simulacion.puntuar, "concertacion", candidatos, solicitud.limite)
+	except CandidateNotFound as e:
+		raise HTTPException(status_code=404, detail=str(e))
+	except SimulationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except ModelNotAvailable:
+		raise HTTPException(status_code=503, detail="Modelo de concertaciones no disponible")
+	return StreamingResponse(simulacion.ndjson(resultados), media_type="application/x-ndjson",
+		headers={"X-Model-Version": version})
+
+@router.post("/sugerir_parejas/", status_code=status.HTTP_201_CREATED)
+async def sugerir_parejas(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					solicitud: Concertacion_Emparejamiento):
+	#Cruce profesor x cliente puntuado por bloques: las k mejores parejas de cada uno
+	if solicitud.k < 1:
+		raise HTTPException(status_code=400, detail="k debe ser mayor que cero")
+	base = solicitud.model_dump(include={"conc_complejidad", "conc_actores_externos"})
+	try:
+		return await ejecutar_en_hilo(emparejamiento.sugerir, base, solicitud.k, solicitud.universidad, solicitud.centro)
+	except ModelNotAvailable:
+		raise HTTPException(status_code=503, detail="Modelo de concertaciones no disponible")
+
 @router.get("/prediccion_concertacion/{id}", status_code=status.HTTP_201_CREATED)
 async def prediccion_concertacion(current_user: Annotated[User_InDB, Depends(get_current_user)],
-					id: str, db: Session = Depends(get_db)):
-	
-	prf_query = db.query(
-		User.id.label('prf_user_id'),
-		User.estado_civil.label('prf_estadocivil'),
-		User.genero.label('prf_genero'),
-		User.hijos.label('prf_hijos'),
-	).select_from(
-		User
-	).subquery()
-	
-	#Datos Cliente
-	cli_query = db.query(
-		User.id.label('cli_user_id'),
-		User.estado_civil.label('cli_estadocivil'),
-		User.genero.label('cli_genero'),
-		User.hijos.label('cli_hijos'),
-	).select_from(
-		User
-	).subquery()	
-
-	db_conc = db.query(
-		#Datos de Concertacion
-		Concertacion_Tema.conc_actores_externos,
-		Concertacion_Tema.conc_complejidad,
-		#Datos de profesor		
-		Profesor.prf_trab_remoto,
-		Profesor.prf_cargo,
-		Profesor.prf_categoria_cientifica,
-		Profesor.prf_categoria_docente,
-		Profesor.prf_pos_tecnica_trabajo,
-		Profesor.prf_pos_tecnica_hogar,
-		Profesor.prf_experiencia_practicas,
-		Profesor.prf_numero_empleos,
-		Profesor.prf_numero_est_atendidos,
-		#Datos de cliente
-		Cliente.cli_cargo,
-		Cliente.cli_categoria_cientifica,
-		Cliente.cli_categoria_docente,
-		Cliente.cli_experiencia_practicas,
-		Cliente.cli_numero_empleos,
-		Cliente.cli_numero_est_atendidos,
-		Cliente.cli_pos_tecnica_hogar,
-		Cliente.cli_pos_tecnica_trabajo,
-		Cliente.cli_trab_remoto,
-		).select_from(Concertacion_Tema
-		).join(Profesor, Profesor.id_profesor == Concertacion_Tema.conc_profesor_id	
-		).join(prf_query, prf_query.c.prf_user_id == Profesor.user_profesor_id	
-		).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id	
-		).join(cli_query, cli_query.c.cli_user_id == Cliente.user_cliente_id	
-		).where(Concertacion_Tema.id_conc_tema == id
-		).statement
-	
-	"""
-		
-		prf_query.c.prf_estadocivil,
-		prf_query.c.prf_genero,
-		prf_query.c.prf_hijos,
-		
-		cli_query.c.cli_estadocivil,
-		cli_query.c.cli_genero,
-		cli_query.c.cli_hijos,
-		"""
+					id: str, db: AsyncSession = Depends(get_db)):
 	
-	#Preparando datos
-	datos = pd.read_sql(db_conc, con=engine)
-	print(datos.columns)
-	#Leer modelo
-	with open(config.UPLOAD_TRAIN_MODELS_PATH + 'conc_rf_model.pkl', 'rb') as f:
-		loaded_modelo = pickle.load(f)
-	#Realizar prediccion
-	if datos.empty:
+	#Una prediccion repetida sale de la cache sin consultar la base de datos ni el modelo;
+	#si no, caracteristicas desde el almacen (lectura por llave primaria) y planificador por lotes
+	try:
+		prediccion = await prediction_cache.obtener("concertacion", id, db, leer_concertacion)
+	except ModelNotAvailable:
+		raise HTTPException(status_code=503, detail="Modelo de concertaciones no disponible")
+	if prediccion is None:
 		raise HTTPException(status_code=404, detail="No existen ejemplos para predecir")
-	prediccion = loaded_modelo.predict(datos)
-	
-	prob = loaded_modelo.predict_proba(datos)
 	resdic = {
-		"clase": prediccion[0],
-		"prob1": prob[0][0],
-		"prob2": prob[0][1]
+		"clase": prediccion.clase,
+		"prob1": prediccion.probs[0],
+		"prob2": prediccion.probs[1]
 	}
 	return resdic
 	
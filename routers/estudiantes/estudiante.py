@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, engine, get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Security
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.paginacion import Pagina, paginar
+from db.database import get_db
 from models.data import Estudiante, User, Tarea, Concertacion_Tema
 from schemas.estudiante import Estudiante_Record, EstudianteAdd, Estudiante_InDB, Estudiante_Activo, EstudianteSchema
 from security.auth import get_current_active_user, get_current_user
@@ -8,12 +10,13 @@ from typing_extensions import Annotated
 from schemas.user import User_InDB
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from typing import List
+from ml.feature_store import afectados, refrescar, refrescar_afectados
 
 router = APIRouter()
 
 @router.post("/crear_estudiante/", status_code=status.HTTP_201_CREATED)
 async def crear_estudiante(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					estudiante: EstudianteAdd, db: Session = Depends(get_db)):
+					estudiante: EstudianteAdd, db: AsyncSession = Depends(get_db)):
 	try:
 		db_estudiante = Estudiante(
 			est_trabajo = estudiante.est_trabajo, 
@@ -27,8 +30,10 @@ async def crear_estudiante(current_user: Annotated[User_InDB, Security(get_curre
 			tareas_estudiantes_id = estudiante.tareas_estudiantes_id
 		)			
 		db.add(db_estudiante)   	
-		db.commit()
-		db.refresh(db_estudiante)
+		#El primer estudiante de la tarea define sus caracteristicas
+		await db.run_sync(refrescar, tareas=[db_estudiante.tareas_estudiantes_id])
+		await db.commit()
+		await db.refresh(db_estudiante)
 		return db_estudiante
 	except IntegrityError as e:
 		raise HTTPException(status_code=500, detail="El estudiante ya existe en la base de datos")
@@ -38,27 +43,30 @@ async def crear_estudiante(current_user: Annotated[User_InDB, Security(get_curre
 
 @router.get("/leer_estudiantes_old/", status_code=status.HTTP_201_CREATED)  
 async def leer_estudiantes(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
 
-		return db.query(Estudiante).offset(skip).limit(limit).all() 
+		return [fila[0] for fila in await paginar(db, select(Estudiante), (Estudiante.id_estudiante,), pagina, response)] 
 	
 
 @router.delete("/eliminar_estudiante/{id}", status_code=status.HTTP_201_CREATED) 
 async def eliminar_estudiante(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					id: str, db: Session = Depends(get_db)):
-	db_estudiante = db.query(Estudiante).filter(Estudiante.id_estudiante == id).first()
+					id: str, db: AsyncSession = Depends(get_db)):
+	db_estudiante = (await db.execute(select(Estudiante).filter(Estudiante.id_estudiante == id))).scalars().first()
 	if db_estudiante is None:
 		raise HTTPException(status_code=404, detail="El estudiante no existe en la base de datos")	
-	db.delete(db_estudiante)	
-	db.commit()
+	#Filas del almacen de caracteristicas que dependen del objeto eliminado
+	tareas, concertaciones = await db.run_sync(afectados, estudiantes=[db_estudiante.id_estudiante])
+	await db.delete(db_estudiante)	
+	await db.run_sync(refrescar, tareas, concertaciones)
+	await db.commit()
 	return {"Result": "Estudiante eliminado satisfactoriamente"}
 	
 
 @router.put("/actualizar_estudiante/{id}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_estudiante(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor", "cliente", "estudiante"])], 
-				id: str, estudiante: Estudiante_Record, db: Session = Depends(get_db)):
+				id: str, estudiante: Estudiante_Record, db: AsyncSession = Depends(get_db)):
 	
-	db_estudiante = db.query(Estudiante).filter(Estudiante.id_estudiante == id).first()
+	db_estudiante = (await db.execute(select(Estudiante).filter(Estudiante.id_estudiante == id))).scalars().first()
 	if db_estudiante is None:
 		raise HTTPException(status_code=404, detail="El estudiante seleccionado no existe en la base de datos")
 	db_estudiante.est_trabajo = estudiante.est_trabajo
@@ -67,15 +75,17 @@ async def actualizar_estudiante(current_user: Annotated[User_InDB, Security(get_
 	db_estudiante.est_pos_tecnica_escuela = estudiante.est_pos_tecnica_escuela
 	db_estudiante.est_pos_tecnica_hogar = estudiante.est_pos_tecnica_hogar
 	db_estudiante.est_trab_remoto = estudiante.est_trab_remoto	
-	db.commit()
-	db.refresh(db_estudiante)	
+	#Mantener el almacen de caracteristicas en la misma transaccion
+	await db.run_sync(refrescar_afectados, estudiantes=[db_estudiante.id_estudiante])
+	await db.commit()
+	await db.refresh(db_estudiante)	
 	return {"Result": "Datos del estudiante actualizados satisfactoriamente"}
 
 @router.get("/leer_estudiantes/", response_model=List[EstudianteSchema], status_code=status.HTTP_201_CREATED)  
 async def leer_clientes(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
 
-	db_estudiantes = db.query(
+	db_estudiantes = await paginar(db, select(
 			#Datos cliente
 			Estudiante.id_estudiante,
 			Estudiante.est_trabajo,
@@ -95,8 +105,9 @@ async def leer_clientes(current_user: Annotated[User_InDB, Security(get_current_
 			Tarea.tarea_descripcion,	
 			).select_from(Estudiante
 			).join(User, User.id == Estudiante.user_estudiante_id	
-		    ).join(Tarea, Tarea.id_tarea == Estudiante.tareas_estudiantes_id
-			).all()	
+			#Un estudiante cuya tarea se elimino queda sin tarea y se sigue listando
+		    ).outerjoin(Tarea, Tarea.id_tarea == Estudiante.tareas_estudiantes_id
+			), (Estudiante.id_estudiante,), pagina, response)	
 	
 
 	# Serializar los datos
@@ -0,0 +1,113 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Security
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing_extensions import Annotated
+from db.database import get_db, ejecutar_en_hilo
+from security.auth import get_current_user
+from schemas.user import User_InDB
+from schemas.modelo import Recalculo, Entrenamiento
+from ml.registry import registry, ModelNotAvailable
+from ml.rescore import RECALCULOS
+from ml.inference import scheduler
+from ml.prediction_cache import prediction_cache
+from ml import feature_store, memoria
+from ml.training import trabajos, etiquetas, TrainingError
+
+router = APIRouter()
+
+@router.get("/versiones/", status_code=status.HTTP_201_CREATED)
+async def versiones_modelos(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	return registry.versiones()
+
+
+@router.get("/metricas/", status_code=status.HTTP_201_CREATED)
+async def metricas_inferencia(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	return scheduler.metricas()
+
+
+@router.get("/cache/", status_code=status.HTTP_201_CREATED)
+async def cache_predicciones(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	return prediction_cache.metricas()
+
+
+@router.get("/memoria/", status_code=status.HTTP_201_CREATED)
+async def memoria_modelos(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	return memoria.reporte()
+
+
+@router.put("/recargar/{nombre}", status_code=status.HTTP_201_CREATED)
+async def recargar_modelo(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					nombre: str):
+	try:
+		#Fuera del event loop: sha256 del archivo, joblib.load y la verificacion de compactar
+		artefacto = await run_in_threadpool(registry.cargar, nombre)
+	except ModelNotAvailable as e:
+		raise HTTPException(status_code=404, detail=str(e))
+	except Exception:
+		raise HTTPException(status_code=500, detail="Error cargando el modelo " + nombre)
+	return artefacto.info()
+
+
+@router.post("/recalcular/{nombre}", status_code=status.HTTP_201_CREATED)
+async def recalcular_predicciones(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					nombre: str, filtro: Recalculo):
+	if nombre not in RECALCULOS:
+		raise HTTPException(status_code=404, detail="Modelo no registrado: " + nombre)
+	try:
+		#Fuera del event loop: una consulta, un predict_proba y UPDATE por lotes
+		return await ejecutar_en_hilo(RECALCULOS[nombre], filtro.ids, filtro.solo_activas)
+	except ModelNotAvailable:
+		raise HTTPException(status_code=503, detail="Modelo no disponible: " + nombre)
+
+
+@router.get("/almacen/verificar/", status_code=status.HTTP_201_CREATED)
+async def verificar_almacen(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	return await ejecutar_en_hilo(feature_store.verificar)
+
+
+@router.put("/almacen/reconstruir/", status_code=status.HTTP_201_CREATED)
+async def reconstruir_almacen(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	return await ejecutar_en_hilo(feature_store.reconstruir)
+
+
+@router.post("/entrenar/{nombre}", status_code=status.HTTP_201_CREATED)
+async def entrenar_modelo(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					nombre: str, entrenamiento: Entrenamiento):
+	try:
+		trabajo = trabajos.enviar(nombre, entrenamiento.fuente, entrenamiento.archivo, entrenamiento.promover)
+	except TrainingError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	return trabajo.info()
+
+
+@router.get("/etiquetas/", status_code=status.HTTP_201_CREATED)
+async def etiquetas_pendientes(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					db: AsyncSession = Depends(get_db)):
+	return await etiquetas.estado(db)
+
+
+@router.post("/ampliar/{nombre}", status_code=status.HTTP_201_CREATED)
+async def ampliar_modelo(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					nombre: str, db: AsyncSession = Depends(get_db)):
+	#Reentrenamiento incremental sin esperar al umbral de etiquetas nuevas
+	try:
+		trabajo = await etiquetas.lanzar(db, nombre)
+	except TrainingError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except ModelNotAvailable:
+		raise HTTPException(status_code=503, detail="Modelo no disponible: " + nombre)
+	return trabajo.info()
+
+
+@router.get("/trabajos/", status_code=status.HTTP_201_CREATED)
+async def leer_trabajos(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	return trabajos.listar()
+
+
+@router.get("/trabajos/{id}", status_code=status.HTTP_201_CREATED)
+async def leer_trabajo(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					id: str):
+	trabajo = trabajos.obtener(id)
+	if trabajo is None:
+		raise HTTPException(status_code=404, detail="Trabajo de entrenamiento no encontrado")
+	return trabajo.info()
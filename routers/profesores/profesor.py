@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, engine, get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Security
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.paginacion import Pagina, paginar
+from db.database import get_db
 from models.data import Profesor, User
 from schemas.profesor import Profesor_Record, ProfesorAdd, Profesor_InDB, ProfesorSchema
 from security.auth import get_current_active_user, get_current_user
@@ -8,12 +10,13 @@ from typing_extensions import Annotated
 from schemas.user import User_InDB
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from typing import List
+from ml.feature_store import afectados, refrescar, refrescar_afectados
 
 router = APIRouter()
 
 @router.post("/crear_profesor/", status_code=status.HTTP_201_CREATED)
 async def crear_profesor(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					profesor: ProfesorAdd, db: Session = Depends(get_db)):
+					profesor: ProfesorAdd, db: AsyncSession = Depends(get_db)):
 	try:
 		db_profesor = Profesor(
 			prf_numero_empleos = profesor.prf_numero_empleos,
@@ -29,7 +32,7 @@ async def crear_profesor(current_user: Annotated[User_InDB, Security(get_current
 			user_profesor_id = profesor.user_profesor_id	
 		)			
 		db.add(db_profesor)   	
-		db.commit()
+		await db.commit()
 		return db_profesor		
 	except IntegrityError as e:
 		raise HTTPException(status_code=500, detail="El profesor ya existe en la base de datos")
@@ -39,19 +42,22 @@ async def crear_profesor(current_user: Annotated[User_InDB, Security(get_current
 
 @router.delete("/eliminar_profesor/{id}", status_code=status.HTTP_201_CREATED) 
 async def eliminar_profesor(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					id: str, db: Session = Depends(get_db)):
-	db_profesor = db.query(Profesor).filter(Profesor.id_profesor == id).first()
+					id: str, db: AsyncSession = Depends(get_db)):
+	db_profesor = (await db.execute(select(Profesor).filter(Profesor.id_profesor == id))).scalars().first()
 	if db_profesor is None:
 		raise HTTPException(status_code=404, detail="El profesor no existe en la base de datos")
-	db.delete(db_profesor)	
-	db.commit()		
+	#Filas del almacen de caracteristicas que dependen del objeto eliminado
+	tareas, concertaciones = await db.run_sync(afectados, profesores=[db_profesor.id_profesor])
+	await db.delete(db_profesor)	
+	await db.run_sync(refrescar, tareas, concertaciones)
+	await db.commit()		
 	return {"Result": "Profesor eliminado satisfactoriamente"}
 
 @router.put("/actualizar_profesor/{id}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_profesor(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor"])], 
-				id: str, profesor: Profesor_Record, db: Session = Depends(get_db)):
+				id: str, profesor: Profesor_Record, db: AsyncSession = Depends(get_db)):
 				
-	db_profesor = db.query(Profesor).filter(Profesor.id_profesor == id).first()
+	db_profesor = (await db.execute(select(Profesor).filter(Profesor.id_profesor == id))).scalars().first()
 	if db_profesor is None:
 		raise HTTPException(status_code=404, detail="El profesor seleccionado no existe en la base de datos")
 	db_profesor.prf_numero_empleos = profesor.prf_numero_empleos
@@ -63,16 +69,18 @@ async def actualizar_profesor(current_user: Annotated[User_InDB, Security(get_cu
 	db_profesor.prf_categoria_cientifica = profesor.prf_categoria_cientifica
 	db_profesor.prf_experiencia_practicas = profesor.prf_experiencia_practicas 
 	db_profesor.prf_numero_est_atendidos = profesor.prf_numero_est_atendidos
-	db.commit()
-	db.refresh(db_profesor)	
+	#Mantener el almacen de caracteristicas en la misma transaccion
+	await db.run_sync(refrescar_afectados, profesores=[db_profesor.id_profesor])
+	await db.commit()
+	await db.refresh(db_profesor)	
 	return {"Result": "Datos del profesor actualizados satisfactoriamente"}	
 
 
 @router.get("/leer_profesores/",  response_model=List[ProfesorSchema], status_code=status.HTTP_201_CREATED)  
 async def leer_profesores(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
 	
-	db_profesores = db.query(
+	db_profesores = await paginar(db, select(
 			#Datos cliente
 			Profesor.id_profesor,
 			Profesor.prf_numero_empleos,
@@ -93,7 +101,7 @@ async def leer_profesores(current_user: Annotated[User_InDB, Security(get_curren
 			User.email,							
 			).select_from(Profesor
 			).join(User, User.id == Profesor.user_profesor_id	
-			).all()	
+			), (Profesor.id_profesor,), pagina, response)	
 	# Serializar los datos
 	result = [
         {
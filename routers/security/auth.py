@@ -2,12 +2,14 @@ from datetime import timedelta
 from fastapi.security import OAuth2PasswordRequestForm
 from typing_extensions import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from schemas.token import Token
-from security.auth import create_access_token, authenticate_user, get_current_active_user, get_current_user
+from schemas.token import Token, Token_Refresh
+from security.auth import create_access_token, authenticate_user, get_current_active_user, get_current_user, get_current_db_user, token_claims
 from db.database import get_db
-from schemas.user import User_InDB, User_Record
+from schemas.user import User_InDB, User_Record, User_Response
+from security.passwords import contrasennas
+from security import refresh
 
 from core.config import ACCESS_TOKEN_EXPIRE_MINUTES
 
@@ -15,8 +17,8 @@ router = APIRouter()
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-                                    db: Session = Depends(get_db)):
-	user = authenticate_user(form_data.username, form_data.password, db)
+                                    db: AsyncSession = Depends(get_db)):
+	user = await authenticate_user(form_data.username, form_data.password, db)
 	if not user:
 		raise HTTPException(
 			status_code=status.HTTP_401_UNAUTHORIZED,
@@ -25,13 +27,32 @@ async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm,
 		)
 	access_token_expires = timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
 	access_token = create_access_token(
-		data={"sub": user.usuario, "scopes": user.role},   #form_data.scopes
+		data=token_claims(user),   #form_data.scopes
 		expires_delta=access_token_expires
 	)
-	return {"detail": "Ok", "access_token": access_token, "token_type": "Bearer"}
+	refresh_token = await refresh.emitir(db, user)
+	await db.commit()
+	return {"detail": "Ok", "access_token": access_token, "refresh_token": refresh_token, "token_type": "Bearer"}
 
-@router.get("/users/me")
-async def read_users_me(current_user: Annotated[User_InDB, Depends(get_current_user)]):
+@router.post("/token/refresh", response_model=Token)
+async def refresh_access_token(solicitud: Token_Refresh, db: AsyncSession = Depends(get_db)):
+	#Nuevo access token sin verificar la contraseña: una busqueda por sha256 y la fila del usuario
+	user, refresh_token = await refresh.rotar(db, solicitud.refresh_token)
+	access_token = create_access_token(
+		data=token_claims(user),
+		expires_delta=timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
+	)
+	await db.commit()
+	return {"detail": "Ok", "access_token": access_token, "refresh_token": refresh_token, "token_type": "Bearer"}
+
+@router.post("/token/logout")
+async def logout(solicitud: Token_Refresh, db: AsyncSession = Depends(get_db)):
+	await refresh.revocar_token(db, solicitud.refresh_token)
+	await db.commit()
+	return {"detail": "Sesión cerrada"}
+
+@router.get("/users/me", response_model=User_Response)
+async def read_users_me(current_user: Annotated[User_InDB, Depends(get_current_db_user)]):
 	return current_user
 
 @router.get("/get_restricted_user")
@@ -45,4 +66,7 @@ async def get_authenticated_admin_resources(current_user: Annotated[User_InDB, S
 @router.get("/get_authenticated_edition_resources")
 async def get_authenticated_edition_resources(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["cliente"])]):
     return current_user
-	
+
+@router.get("/token/metricas")
+async def metricas_contrasennas(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	return contrasennas.metricas()
@@ -0,0 +1,14 @@
+from os import getenv
+from fastapi import APIRouter, status, Security
+from typing_extensions import Annotated
+from db.database import engine, async_engine
+from db import pool
+from security.auth import get_current_user
+from schemas.user import User_InDB
+
+router = APIRouter()
+
+@router.get("/pool/", status_code=status.HTTP_201_CREATED)
+async def pool_conexiones(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):
+	#Conexiones en uso y disponibles, checkouts y espera por una conexion en este worker
+	return pool.reporte(engine, async_engine, int(getenv("WEB_CONCURRENCY", "0")))
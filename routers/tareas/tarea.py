@@ -1,23 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, engine, get_db
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Security
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.paginacion import Pagina, paginar
+from db import exportacion
+from db.database import get_db, ejecutar_en_hilo
 from models.data import Tarea, Profesor, Concertacion_Tema, Cliente, Estudiante, User
-from schemas.tarea import Tarea_Record, TareaAdd, Tarea_InDB, Tarea_Eval, TareaSchema
+from schemas.tarea import Tarea_Record, TareaAdd, Tarea_InDB, Tarea_Eval, TareaSchema, Tarea_Simulacion, Tarea_Propuesta, Tarea_Asignacion
 from security.auth import get_current_active_user, get_current_user
 from typing_extensions import Annotated
 from schemas.user import User_InDB
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy.orm import joinedload
-import pandas as pd
-import joblib
-from core import config
+from ml.registry import ModelNotAvailable
+from ml.prediction_cache import prediction_cache
+from ml.training import etiquetas
+from ml import simulacion, asignacion
+from ml.asignacion import AssignmentError, AssignmentConflict
+from ml.simulacion import SimulationError, CandidateNotFound
 from typing import List
+from ml.feature_store import afectados, refrescar, refrescar_afectados, leer_tarea
 
 router = APIRouter()
 
+#Nombre de cada columna de los listados leer_tareas* (JSON y exportacion)
+CAMPOS_TAREA = (
+	#Datos de Concertacion
+	"id_conc_tema",
+	"conc_tema",
+	"conc_cliente_id",
+	"conc_profesor_id",
+	#Datos de profesor
+	"id_profesor",
+	"prf_ci",
+	"prf_nombre",
+	"prf_primer_appellido",
+	"prf_segundo_appellido",
+	#Datos de cliente
+	"id_cliente",
+	"cli_user_id",
+	"cli_nombre",
+	"cli_primer_appellido",
+	"cli_segundo_appellido",
+	#Datos de estudiante
+	"id_estudiante",
+	"est_user_id",
+	"est_nombre",
+	"est_primer_appellido",
+	"est_segundo_appellido",
+	#Datos de Tarea
+	"id_tarea",
+	"concertacion_tarea_id",
+	"tarea_activa",
+	"tarea_asignada",
+	"tarea_complejidad_estimada",
+	"tarea_descripcion",
+	"tarea_evaluacion",
+	"tarea_evaluacion_pred",
+	"tarea_fecha_fin",
+	"tarea_fecha_inicio",
+	"tarea_participantes",
+	"tarea_tipo",
+)
+
 @router.post("/crear_tarea/", status_code=status.HTTP_201_CREATED)
 async def crear_tarea(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					tarea: TareaAdd, db: Session = Depends(get_db)):
+					tarea: TareaAdd, db: AsyncSession = Depends(get_db)):
 	try:
 		db_tarea = Tarea(
 			tarea_descripcion = tarea.tarea_descripcion,
@@ -29,8 +79,8 @@ async def crear_tarea(current_user: Annotated[User_InDB, Security(get_current_us
 			concertacion_tarea_id = tarea.concertacion_tarea_id,
 		)			
 		db.add(db_tarea)   	
-		db.commit()
-		db.refresh(db_tarea)			
+		await db.commit()
+		await db.refresh(db_tarea)			
 		return db_tarea
 	except IntegrityError as e:
 		raise HTTPException(status_code=500, detail="Error de integridad creando objeto Tarea")
@@ -40,20 +90,23 @@ async def crear_tarea(current_user: Annotated[User_InDB, Security(get_current_us
 
 @router.delete("/eliminar_tarea/{id}", status_code=status.HTTP_201_CREATED) 
 async def eliminar_tarea(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					id: str, db: Session = Depends(get_db)):
-	db_tarea = db.query(Tarea).filter(Tarea.id_tarea == id).first()
+					id: str, db: AsyncSession = Depends(get_db)):
+	db_tarea = (await db.execute(select(Tarea).filter(Tarea.id_tarea == id))).scalars().first()
 	if db_tarea is None:
 		raise HTTPException(status_code=404, detail="La tarea no existe en la base de datos")	
-	db.delete(db_tarea)	
-	db.commit()
+	#Filas del almacen de caracteristicas que dependen del objeto eliminado
+	tareas, concertaciones = await db.run_sync(afectados, tareas=[db_tarea.id_tarea])
+	await db.delete(db_tarea)	
+	await db.run_sync(refrescar, tareas, concertaciones)
+	await db.commit()
 	return {"Result": "Tarea eliminada satisfactoriamente"}
 
 
 @router.put("/actualizar_tarea/{id}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_tarea(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor"])], 
-				id: str, tarea: Tarea_Record, db: Session = Depends(get_db)):
+				id: str, tarea: Tarea_Record, db: AsyncSession = Depends(get_db)):
 	
-	db_tarea = db.query(Tarea).filter(Tarea.id_tarea == id).first()
+	db_tarea = (await db.execute(select(Tarea).filter(Tarea.id_tarea == id))).scalars().first()
 	if db_tarea is None:
 		raise HTTPException(status_code=404, detail="La asignacion de tareas seleccionada no existen en la base de datos")
 	db_tarea.tarea_descripcion = tarea.tarea_descripcion
@@ -62,31 +115,36 @@ async def actualizar_tarea(current_user: Annotated[User_InDB, Security(get_curre
 	db_tarea.tarea_complejidad_estimada = tarea.tarea_complejidad_estimada
 	db_tarea.tarea_participantes = tarea.tarea_participantes
 	db_tarea.tarea_tipo = tarea.tarea_tipo
-	db.commit()
-	db.refresh(db_tarea)	
+	#Mantener el almacen de caracteristicas en la misma transaccion
+	await db.run_sync(refrescar_afectados, tareas=[db_tarea.id_tarea])
+	await db.commit()
+	await db.refresh(db_tarea)	
 	return {"Result": "Datos de la asignacion actualizados satisfactoriamente"}	
 	
 
 @router.put("/evaluar_tarea/{id}", status_code=status.HTTP_201_CREATED) 
 async def evaluar_tarea(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor"])], 
-				id: str, tarea_eva: Tarea_Eval, db: Session = Depends(get_db)):
-	db_tarea = db.query(Tarea).filter(Tarea.id_tarea == id).first()
+				id: str, tarea_eva: Tarea_Eval, db: AsyncSession = Depends(get_db)):
+	db_tarea = (await db.execute(select(Tarea).filter(Tarea.id_tarea == id))).scalars().first()
 	if db_tarea is None:
 		raise HTTPException(status_code=404, detail="Tarea no existe ne la base de datos")
 	db_tarea.tarea_evaluacion = tarea_eva.tarea_evaluacion 	
-	db.commit()
-	db.refresh(db_tarea)	
+	db_tarea.tarea_evaluada = datetime.utcnow()
+	await db.commit()
+	await db.refresh(db_tarea)	
+	#Etiqueta nueva para el reentrenamiento incremental del modelo
+	await etiquetas.registrar(db, "tarea")
 	return db_tarea
 
 @router.get("/leer_tarea_estudiante/", status_code=status.HTTP_201_CREATED)  
 async def leer_tarea_estudiante(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["estudiante"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):    
 	
-	db_estudiante = db.query(Estudiante).filter(Estudiante.user_estudiante_id == current_user.id).first()
-	db_tarea = db.query(Tarea).filter(
-		Tarea.id_tarea == db_estudiante.tareas_estudiantes_id).first()
-	db_concertacion = db.query(Concertacion_Tema).filter(
-		Concertacion_Tema.id_conc_tema == db_tarea.concertacion_tarea_id).first()
+	db_estudiante = (await db.execute(select(Estudiante).filter(Estudiante.user_estudiante_id == current_user.id))).scalars().first()
+	db_tarea = (await db.execute(select(Tarea).filter(
+		Tarea.id_tarea == db_estudiante.tareas_estudiantes_id))).scalars().first()
+	db_concertacion = (await db.execute(select(Concertacion_Tema).filter(
+		Concertacion_Tema.id_conc_tema == db_tarea.concertacion_tarea_id))).scalars().first()
 	return {"concertacion": db_concertacion, 
 		 	"tarea": db_tarea, 
 			"estudiante": db_estudiante, 
@@ -94,10 +152,10 @@ async def leer_tarea_estudiante(current_user: Annotated[User_InDB, Security(get_
 
 @router.get("/leer_tareas_cliente/", status_code=status.HTTP_201_CREATED)  
 async def leer_tareas_cliente(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["cliente"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					request: Request, response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
 
 	#Datos Profesor
-	est_query = db.query(
+	est_query = select(
 		User.id.label('est_user_id'),
 		User.nombre.label('est_nombre'),
 		User.primer_appellido.label('est_primer_appellido'),
@@ -107,7 +165,7 @@ async def leer_tareas_cliente(current_user: Annotated[User_InDB, Security(get_cu
 	).subquery()
 
 	#Datos Profesor
-	prf_query = db.query(
+	prf_query = select(
 		User.id.label('prf_user_id'),
 		User.nombre.label('prf_nombre'),
 		User.primer_appellido.label('prf_primer_appellido'),
@@ -117,7 +175,7 @@ async def leer_tareas_cliente(current_user: Annotated[User_InDB, Security(get_cu
 	).subquery()
 	
 	#Datos Cliente
-	cli_query = db.query(
+	cli_query = select(
 		User.id.label('cli_user_id'),
 		User.nombre.label('cli_nombre'),
 		User.primer_appellido.label('cli_primer_appellido'),
@@ -126,7 +184,7 @@ async def leer_tareas_cliente(current_user: Annotated[User_InDB, Security(get_cu
 		User
 	).subquery()	
 
-	db_tarea = db.query(
+	consulta = select(
 			#Datos de Concertacion
 			Concertacion_Tema.id_conc_tema,
 			Concertacion_Tema.conc_tema,
@@ -172,59 +230,24 @@ async def leer_tareas_cliente(current_user: Annotated[User_InDB, Security(get_cu
 			).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id	
 			).join(cli_query, cli_query.c.cli_user_id == Cliente.user_cliente_id	
 			).filter(Cliente.user_cliente_id == current_user.id
-			).all()	 
+			)
+
+	formato = exportacion.formato(request)
+	if formato:
+		return exportacion.exportar(consulta, (Estudiante.id_estudiante,), pagina, CAMPOS_TAREA, formato, "tareas_cliente")
+	db_tarea = await paginar(db, consulta, (Estudiante.id_estudiante,), pagina, response)	 
 
 	# Serializar los datos
-	result = [
-        {
-			#Datos de Concertacion
-			"id_conc_tema": tarea[0],
-			"conc_tema": tarea[1],
-			"conc_cliente_id": tarea[2],
-			"conc_profesor_id": tarea[3],
-			#Datos de profesor
-			"id_profesor": tarea[4],			
-			"prf_ci": tarea[5],
-			"prf_nombre": tarea[6],
-			"prf_primer_appellido": tarea[7],
-			"prf_segundo_appellido": tarea[8],
-			#Datos de cliente
-			"id_cliente": tarea[9],
-			"cli_user_id": tarea[10],
-			"cli_nombre": tarea[11],
-			"cli_primer_appellido": tarea[12],
-			"cli_segundo_appellido": tarea[13],
-			#Datos de estudiante
-			"id_estudiante": tarea[14],
-			"est_user_id": tarea[15],
-			"est_nombre": tarea[16],
-			"est_primer_appellido": tarea[17],
-			"est_segundo_appellido": tarea[18],
-			#Datos de Tarea
-			"id_tarea": tarea[19],
-			"concertacion_tarea_id": tarea[20],
-			"tarea_activa": tarea[21],
-			"tarea_asignada": tarea[22],
-			"tarea_complejidad_estimada": tarea[23],
-			"tarea_descripcion": tarea[24],
-			"tarea_evaluacion": tarea[25],
-			"tarea_evaluacion_pred": tarea[26],
-			"tarea_fecha_fin": tarea[27],
-			"tarea_fecha_inicio": tarea[28],
-			"tarea_participantes": tarea[29],
-			"tarea_tipo": tarea[30]
-        }
-        for tarea in db_tarea
-    ] 
+	result = [dict(zip(CAMPOS_TAREA, tarea)) for tarea in db_tarea]
     
 	return result
 
 @router.get("/leer_tareas_profesor/", status_code=status.HTTP_201_CREATED)  
 async def leer_tareas_profesor(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					request: Request, response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
         
 	#Datos Profesor
-	est_query = db.query(
+	est_query = select(
 		User.id.label('est_user_id'),
 		User.nombre.label('est_nombre'),
 		User.primer_appellido.label('est_primer_appellido'),
@@ -234,7 +257,7 @@ async def leer_tareas_profesor(current_user: Annotated[User_InDB, Security(get_c
 	).subquery()
 
 	#Datos Profesor
-	prf_query = db.query(
+	prf_query = select(
 		User.id.label('prf_user_id'),
 		User.nombre.label('prf_nombre'),
 		User.primer_appellido.label('prf_primer_appellido'),
@@ -244,7 +267,7 @@ async def leer_tareas_profesor(current_user: Annotated[User_InDB, Security(get_c
 	).subquery()
 	
 	#Datos Cliente
-	cli_query = db.query(
+	cli_query = select(
 		User.id.label('cli_user_id'),
 		User.nombre.label('cli_nombre'),
 		User.primer_appellido.label('cli_primer_appellido'),
@@ -253,7 +276,7 @@ async def leer_tareas_profesor(current_user: Annotated[User_InDB, Security(get_c
 		User
 	).subquery()	
 
-	db_tarea = db.query(
+	consulta = select(
 			#Datos de Concertacion
 			Concertacion_Tema.id_conc_tema,
 			Concertacion_Tema.conc_tema,
@@ -299,59 +322,24 @@ async def leer_tareas_profesor(current_user: Annotated[User_InDB, Security(get_c
 			).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id	
 			).join(cli_query, cli_query.c.cli_user_id == Cliente.user_cliente_id	
 			).filter(Profesor.user_profesor_id == current_user.id
-			).all()	 
+			)
+
+	formato = exportacion.formato(request)
+	if formato:
+		return exportacion.exportar(consulta, (Estudiante.id_estudiante,), pagina, CAMPOS_TAREA, formato, "tareas_profesor")
+	db_tarea = await paginar(db, consulta, (Estudiante.id_estudiante,), pagina, response)	 
 
 	# Serializar los datos
-	result = [
-        {
-			#Datos de Concertacion
-			"id_conc_tema": tarea[0],
-			"conc_tema": tarea[1],
-			"conc_cliente_id": tarea[2],
-			"conc_profesor_id": tarea[3],
-			#Datos de profesor
-			"id_profesor": tarea[4],			
-			"prf_ci": tarea[5],
-			"prf_nombre": tarea[6],
-			"prf_primer_appellido": tarea[7],
-			"prf_segundo_appellido": tarea[8],
-			#Datos de cliente
-			"id_cliente": tarea[9],
-			"cli_user_id": tarea[10],
-			"cli_nombre": tarea[11],
-			"cli_primer_appellido": tarea[12],
-			"cli_segundo_appellido": tarea[13],
-			#Datos de estudiante
-			"id_estudiante": tarea[14],
-			"est_user_id": tarea[15],
-			"est_nombre": tarea[16],
-			"est_primer_appellido": tarea[17],
-			"est_segundo_appellido": tarea[18],
-			#Datos de Tarea
-			"id_tarea": tarea[19],
-			"concertacion_tarea_id": tarea[20],
-			"tarea_activa": tarea[21],
-			"tarea_asignada": tarea[22],
-			"tarea_complejidad_estimada": tarea[23],
-			"tarea_descripcion": tarea[24],
-			"tarea_evaluacion": tarea[25],
-			"tarea_evaluacion_pred": tarea[26],
-			"tarea_fecha_fin": tarea[27],
-			"tarea_fecha_inicio": tarea[28],
-			"tarea_participantes": tarea[29],
-			"tarea_tipo": tarea[30]
-        }
-        for tarea in db_tarea
-    ] 
+	result = [dict(zip(CAMPOS_TAREA, tarea)) for tarea in db_tarea]
     
 	return result	
 
 
 @router.get("/leer_tareas/", status_code=status.HTTP_201_CREATED)  
 async def leer_tareas(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
+					request: Request, response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
 	#Datos Profesor
-	est_query = db.query(
+	est_query = select(
 		User.id.label('est_user_id'),
 		User.nombre.label('est_nombre'),
 		User.primer_appellido.label('est_primer_appellido'),
@@ -361,7 +349,7 @@ async def leer_tareas(current_user: Annotated[User_InDB, Security(get_current_us
 	).subquery()
 
 	#Datos Profesor
-	prf_query = db.query(
+	prf_query = select(
 		User.id.label('prf_user_id'),
 		User.nombre.label('prf_nombre'),
 		User.primer_appellido.label('prf_primer_appellido'),
@@ -371,7 +359,7 @@ async def leer_tareas(current_user: Annotated[User_InDB, Security(get_current_us
 	).subquery()
 	
 	#Datos Cliente
-	cli_query = db.query(
+	cli_query = select(
 		User.id.label('cli_user_id'),
 		User.nombre.label('cli_nombre'),
 		User.primer_appellido.label('cli_primer_appellido'),
@@ -380,7 +368,7 @@ async def leer_tareas(current_user: Annotated[User_InDB, Security(get_current_us
 		User
 	).subquery()	
 
-	db_tarea = db.query(
+	consulta = select(
 			#Datos de Concertacion
 			Concertacion_Tema.id_conc_tema,
 			Concertacion_Tema.conc_tema,
@@ -425,106 +413,77 @@ async def leer_tareas(current_user: Annotated[User_InDB, Security(get_current_us
 			).join(prf_query, prf_query.c.prf_user_id == Profesor.user_profesor_id	
 			).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id	
 			).join(cli_query, cli_query.c.cli_user_id == Cliente.user_cliente_id	
-			).all()	 
+			)
+
+	formato = exportacion.formato(request)
+	if formato:
+		return exportacion.exportar(consulta, (Estudiante.id_estudiante,), pagina, CAMPOS_TAREA, formato, "tareas")
+	db_tarea = await paginar(db, consulta, (Estudiante.id_estudiante,), pagina, response)	 
 
 	# Serializar los datos
-	result = [
-        {
-			#Datos de Concertacion
-			"id_conc_tema": tarea[0],
-			"conc_tema": tarea[1],
-			"conc_cliente_id": tarea[2],
-			"conc_profesor_id": tarea[3],
-			#Datos de profesor
-			"id_profesor": tarea[4],			
-			"prf_ci": tarea[5],
-			"prf_nombre": tarea[6],
-			"prf_primer_appellido": tarea[7],
-			"prf_segundo_appellido": tarea[8],
-			#Datos de cliente
-			"id_cliente": tarea[9],
-			"cli_user_id": tarea[10],
-			"cli_nombre": tarea[11],
-			"cli_primer_appellido": tarea[12],
-			"cli_segundo_appellido": tarea[13],
-			#Datos de estudiante
-			"id_estudiante": tarea[14],
-			"est_user_id": tarea[15],
-			"est_nombre": tarea[16],
-			"est_primer_appellido": tarea[17],
-			"est_segundo_appellido": tarea[18],
-			#Datos de Tarea
-			"id_tarea": tarea[19],
-			"concertacion_tarea_id": tarea[20],
-			"tarea_activa": tarea[21],
-			"tarea_asignada": tarea[22],
-			"tarea_complejidad_estimada": tarea[23],
-			"tarea_descripcion": tarea[24],
-			"tarea_evaluacion": tarea[25],
-			"tarea_evaluacion_pred": tarea[26],
-			"tarea_fecha_fin": tarea[27],
-			"tarea_fecha_inicio": tarea[28],
-			"tarea_participantes": tarea[29],
-			"tarea_tipo": tarea[30]
-        }
-        for tarea in db_tarea
-    ] 
+	result = [dict(zip(CAMPOS_TAREA, tarea)) for tarea in db_tarea]
     
 	return result	
 
+@router.post("/simular_tareas/", status_code=status.HTTP_201_CREATED)
+async def simular_tareas(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					solicitud: Tarea_Simulacion):
+	#Candidatos que aun no existen: se predicen juntos y se devuelven ordenados, sin escribir nada
+	base = solicitud.model_dump(include={"conc_complejidad", "conc_actores_externos", "tarea_complejidad_estimada", "tarea_participantes", "tarea_tipo"})
+	try:
+		candidatos = await ejecutar_en_hilo(simulacion.candidatos_tarea, base, solicitud.estudiantes, solicitud.filas)
+		version, resultados = await run_in_threadpool(simulacion.puntuar, "tarea", candidatos, solicitud.limite)
+	except CandidateNotFound as e:
+		raise HTTPException(status_code=404, detail=str(e))
+	except SimulationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except ModelNotAvailable:
+		raise HTTPException(status_code=503, detail="Modelo de tareas no disponible")
+	return StreamingResponse(simulacion.ndjson(resultados), media_type="application/x-ndjson",
+		headers={"X-Model-Version": version})
+
+@router.post("/proponer_asignacion/", status_code=status.HTTP_201_CREATED)
+async def proponer_asignacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					propuesta: Tarea_Propuesta):
+	#Estudiantes libres x plazas de tareas activas, resuelto como asignacion lineal; no escribe nada
+	try:
+		return await ejecutar_en_hilo(asignacion.proponer, propuesta.universidad, propuesta.minimo)
+	except AssignmentError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except ModelNotAvailable:
+		raise HTTPException(status_code=503, detail="Modelo de tareas no disponible")
+
+
+@router.put("/confirmar_asignacion/", status_code=status.HTTP_201_CREATED)
+async def confirmar_asignacion(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+					confirmacion: Tarea_Asignacion, db: AsyncSession = Depends(get_db)):
+	try:
+		resultado = await db.run_sync(asignacion.confirmar, [(a.id_estudiante, a.id_tarea) for a in confirmacion.asignaciones])
+	except AssignmentConflict as e:
+		#Deshace el UPDATE parcial antes de responder
+		await db.rollback()
+		raise HTTPException(status_code=409, detail=str(e))
+	except AssignmentError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	await db.commit()
+	return resultado
+
 @router.get("/prediccion_tarea/{id}", status_code=status.HTTP_201_CREATED)
 async def prediccion_tarea(current_user: Annotated[User_InDB, Depends(get_current_user)],
-					id: str, db: Session = Depends(get_db)):
+					id: str, db: AsyncSession = Depends(get_db)):
 	
-	#Datos Estudiante
-	est_query = db.query(
-		User.id.label('est_user_id'),
-		User.estado_civil.label('est_estadocivil'),
-		User.genero.label('est_genero'),
-		User.hijos.label('est_hijos'),
-	).select_from(
-		User
-	).subquery()
-	
-	#Datos para predecir las actividades de tareas			
-	db_tarea = db.query(
-		#Datos de Concertacion
-		Concertacion_Tema.conc_actores_externos,
-		Concertacion_Tema.conc_complejidad,
-		#Datos de estudiante
-		Estudiante.est_becado,
-		Estudiante.est_pos_tecnica_escuela,
-		Estudiante.est_pos_tecnica_hogar,
-		Estudiante.est_posibilidad_economica,
-		Estudiante.est_trab_remoto,
-		Estudiante.est_trabajo,
-		#Datos de tareas
-		Tarea.tarea_complejidad_estimada,
-		Tarea.tarea_participantes,
-		Tarea.tarea_tipo
-		).select_from(Tarea
-		).join(Concertacion_Tema, Concertacion_Tema.id_conc_tema == Tarea.concertacion_tarea_id
-		).join(Estudiante, Estudiante.tareas_estudiantes_id == Tarea.id_tarea
-		).join(est_query, est_query.c.est_user_id == Estudiante.user_estudiante_id	
-		).join(Profesor, Profesor.id_profesor == Concertacion_Tema.conc_profesor_id	
-		).join(Cliente, Cliente.id_cliente == Concertacion_Tema.conc_cliente_id	
-		).where(Tarea.id_tarea == id
-		).statement
-				
-	#Preparando datos
-	datos = pd.read_sql(db_tarea, con=engine)
-	#Leer modelo
-	loaded_modelo = joblib.load(config.UPLOAD_TRAIN_MODELS_PATH + 'tarea_rf_model.pkl')
-	#Realizar prediccion
-	if datos.empty:
+	#Una prediccion repetida sale de la cache sin consultar la base de datos ni el modelo;
+	#si no, caracteristicas desde el almacen (lectura por llave primaria) y planificador por lotes
+	try:
+		prediccion = await prediction_cache.obtener("tarea", id, db, leer_tarea)
+	except ModelNotAvailable:
+		raise HTTPException(status_code=503, detail="Modelo de tareas no disponible")
+	if prediccion is None:
 		raise HTTPException(status_code=404, detail="No existen ejemplos para predecir")
-		
-	prediccion = loaded_modelo.predict(datos)
-	prob = loaded_modelo.predict_proba(datos)
 	resdic = {
-		"clase": prediccion[0],
-		"prob1": prob[0][0],
-		"prob2": prob[0][1]
+		"clase": prediccion.clase,
+		"prob1": prediccion.probs[0],
+		"prob2": prediccion.probs[1]
 	}
 
 	return resdic
@@ -532,5 +491,10 @@ async def prediccion_tarea(current_user: Annotated[User_InDB, Depends(get_curren
 
 @router.get("/leer_tareas_contenido/", status_code=status.HTTP_201_CREATED)  
 async def leer_tareas_contenido(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
-	return db.query(Tarea).all()
+					request: Request, response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
+	formato = exportacion.formato(request)
+	if formato:
+		#Columnas en lugar de la entidad: sin objetos ORM ni identity map por fila
+		columnas = Tarea.__table__.columns
+		return exportacion.exportar(select(*columnas), (Tarea.id_tarea,), pagina, [columna.name for columna in columnas], formato, "tareas_contenido")
+	return [fila[0] for fila in await paginar(db, select(Tarea), (Tarea.id_tarea,), pagina, response)]
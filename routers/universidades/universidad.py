@@ -1,18 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, engine, get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Security
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.paginacion import Pagina, paginar
+from db.database import get_db
 from models.data import Universidad
 from schemas.universidad import UniversidadAdd, Universidad_InDB
 from schemas.user import User_InDB
 from security.auth import get_current_active_user, get_current_user
 from typing_extensions import Annotated
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from ml.feature_store import afectados, refrescar
 
 router = APIRouter()
 
 @router.post("/crear_universidad/", status_code=status.HTTP_201_CREATED)
 async def crear_universidad(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					universidad: UniversidadAdd, db: Session = Depends(get_db)):
+					universidad: UniversidadAdd, db: AsyncSession = Depends(get_db)):
 	try:
 		db_universidad = Universidad(
 			universidad_nombre = universidad.universidad_nombre,
@@ -22,8 +25,8 @@ async def crear_universidad(current_user: Annotated[User_InDB, Security(get_curr
 			universidad_teletrab = universidad.universidad_teletrab
 		)			
 		db.add(db_universidad)   	
-		db.commit()
-		db.refresh(db_universidad)			
+		await db.commit()
+		await db.refresh(db_universidad)			
 		return db_universidad
 	except IntegrityError as e:
 		raise HTTPException(status_code=500, detail="Error de integridad creando objeto Universidad")
@@ -33,28 +36,31 @@ async def crear_universidad(current_user: Annotated[User_InDB, Security(get_curr
 
 @router.get("/leer_universidades/", status_code=status.HTTP_201_CREATED)  
 async def leer_universidades(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["profesor", "cliente", "estudiante"])],
-					skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    
-	db_universidades = db.query(Universidad).all()	
+					response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    
+	db_universidades = [fila[0] for fila in await paginar(db, select(Universidad), (Universidad.id_universidad,), pagina, response)]	
 	return db_universidades
 	
 
 @router.delete("/eliminar_universidad/{id}", status_code=status.HTTP_201_CREATED) 
 async def eliminar_universidad(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-					id: str, db: Session = Depends(get_db)):
-	db_universidad = db.query(Universidad
+					id: str, db: AsyncSession = Depends(get_db)):
+	db_universidad = (await db.execute(select(Universidad
 						).filter(Universidad.id_universidad == id
-						).first()
+						))).scalars().first()
 	if db_universidad is None:
 		raise HTTPException(status_code=404, detail="La univeridad no existe en la base de datos")	
-	db.delete(db_universidad)	
-	db.commit()
+	#Filas del almacen de caracteristicas que dependen del objeto eliminado
+	tareas, concertaciones = await db.run_sync(afectados, universidades=[db_universidad.id_universidad])
+	await db.delete(db_universidad)	
+	await db.run_sync(refrescar, tareas, concertaciones)
+	await db.commit()
 	return {"Result": "Univeridad eliminada satisfactoriamente"}
 
 
 @router.put("/actualizar_universidad/{id}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_universidad(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])], 
-				id: str, universidad_nueva: UniversidadAdd, db: Session = Depends(get_db)):
-	db_universidad = db.query(Universidad).filter(Universidad.id_universidad == id).first()
+				id: str, universidad_nueva: UniversidadAdd, db: AsyncSession = Depends(get_db)):
+	db_universidad = (await db.execute(select(Universidad).filter(Universidad.id_universidad == id))).scalars().first()
 	if db_universidad is None:
 		raise HTTPException(status_code=404, detail="La universidad seleccionada no existe en la base de datos")
 	db_universidad.universidad_nombre=universidad_nueva.universidad_nombre
@@ -62,7 +68,7 @@ async def actualizar_universidad(current_user: Annotated[User_InDB, Security(get
 	db_universidad.universidad_tec=universidad_nueva.universidad_tec	
 	db_universidad.universidad_transp=universidad_nueva.universidad_transp
 	db_universidad.universidad_teletrab=universidad_nueva.universidad_teletrab
-	db.commit()
-	db.refresh(db_universidad)	
+	await db.commit()
+	await db.refresh(db_universidad)	
 	return {"Result": "Universidad actualizada satisfactoriamente"}	
 	
@@ -1,56 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
-from db.database import SessionLocal, get_db
-from models.data import User
-from schemas.user import User_Record, User_List, User_Activate, User_Read, User_ResetPassword, User_InDB
-from security.auth import get_password_hash, get_current_active_user, get_current_user, pwd_context
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Security
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.paginacion import Pagina, paginar
+from db.database import get_db
+from models.data import User, User_Role
+from schemas.user import User_Record, User_List, User_Activate, User_Read, User_ResetPassword, User_InDB, User_Response
+from security.auth import get_password_hash, get_current_active_user, get_current_user, revocaciones
 from typing_extensions import Annotated
+from typing import List
+from security import refresh
+from ml.feature_store import afectados, refrescar, refrescar_afectados
 
 
 router = APIRouter()
 
-@router.post("/crear_usuario/", status_code=status.HTTP_201_CREATED)
-async def create_user(user: User_Record, db: Session = Depends(get_db)): 
-    user.hashed_password = get_password_hash(user.hashed_password)
+@router.post("/crear_usuario/", response_model=User_Response, status_code=status.HTTP_201_CREATED)
+async def create_user(user: User_Record, db: AsyncSession = Depends(get_db)): 
+    user.hashed_password = await get_password_hash(user.hashed_password)
     db_user = User(**user.dict())
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-@router.get("/leer_usuarios/", status_code=status.HTTP_201_CREATED) 
+@router.get("/leer_usuarios/", response_model=List[User_Response], status_code=status.HTTP_201_CREATED) 
 async def leer_usuarios(usuario_actual: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-		skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    	
-	db_users = db.query(User).offset(skip).limit(limit).all()    
+		response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    	
+	db_users = [fila[0] for fila in await paginar(db, select(User), (User.id,), pagina, response)]    
 	return db_users
 
 @router.delete("/eliminar_usuario/{usuario}", status_code=status.HTTP_201_CREATED) 
 async def eliminar_usuario(usuario_actual: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-				usuario: str, db: Session = Depends(get_db)):
-	db_user = db.query(User).filter(User.usuario == usuario).first()
+				usuario: str, db: AsyncSession = Depends(get_db)):
+	db_user = (await db.execute(select(User).filter(User.usuario == usuario))).scalars().first()
 	if db_user is None:
 		raise HTTPException(status_code=404, detail="Usuario no encontrado")	
 	if usuario != usuario_actual.usuario:
-		db.delete(db_user)	
-		db.commit()
+		#Filas del almacen de caracteristicas que dependen del objeto eliminado
+		tareas, concertaciones = await db.run_sync(afectados, usuarios=[db_user.id])
+		await revocaciones.revocar(db, db_user, eliminado=True)
+		await refresh.revocar_usuario(db, db_user.id)
+		await db.delete(db_user)	
+		await db.run_sync(refrescar, tareas, concertaciones)
+		await db.commit()
 	return {"Eliminar": "Usuario eliminado satisfactoriamente"}
 	
-@router.put("/activar_usuario/{usuario}", status_code=status.HTTP_201_CREATED) 
+@router.put("/activar_usuario/{usuario}", response_model=User_Response, status_code=status.HTTP_201_CREATED) 
 async def activar_usuario(usuario_actual: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-				usuario: str, nuevo_usuario: User_Activate, db: Session = Depends(get_db)):
-	db_user = db.query(User).filter(User.usuario == usuario).first()
+				usuario: str, nuevo_usuario: User_Activate, db: AsyncSession = Depends(get_db)):
+	db_user = (await db.execute(select(User).filter(User.usuario == usuario))).scalars().first()
 	if db_user is None:
 		raise HTTPException(status_code=404, detail="Usuario no encontrado")
 	if usuario != usuario_actual.usuario:
+		if db_user.deshabilitado != nuevo_usuario.deshabilitado:
+			await revocaciones.revocar(db, db_user)
+			await refresh.revocar_usuario(db, db_user.id)
 		db_user.deshabilitado = nuevo_usuario.deshabilitado		
-		db.commit()
-		db.refresh(db_user)	
+		await db.commit()
+		await db.refresh(db_user)	
 	return db_user	
 	
-@router.put("/actualizar_usuario/{usuario}", status_code=status.HTTP_201_CREATED) 
+@router.put("/actualizar_usuario/{usuario}", response_model=User_Response, status_code=status.HTTP_201_CREATED) 
 async def actualizar_usuario(usuario_actual: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])], 
-				usuario: str, nuevo_usuario: User_Read, db: Session = Depends(get_db)):
-	db_user = db.query(User).filter(User.usuario == usuario).first()
+				usuario: str, nuevo_usuario: User_Read, db: AsyncSession = Depends(get_db)):
+	db_user = (await db.execute(select(User).filter(User.usuario == usuario))).scalars().first()
 	if db_user is None:
 		raise HTTPException(status_code=404, detail="Usuario no encontrado en la base de datos")
 	db_user.nombre=nuevo_usuario.nombre	
@@ -61,32 +74,51 @@ async def actualizar_usuario(usuario_actual: Annotated[User_InDB, Security(get_c
 	db_user.genero=nuevo_usuario.genero
 	db_user.estado_civil=nuevo_usuario.estado_civil
 	db_user.hijos=nuevo_usuario.hijos
+	if set(db_user.role) != set(nuevo_usuario.role):
+		#Los tokens emitidos llevan los roles anteriores
+		await revocaciones.revocar(db, db_user)
 	db_user.role=nuevo_usuario.role
-	db.commit()
-	db.refresh(db_user)	
+	#Mantener el almacen de caracteristicas en la misma transaccion
+	await db.run_sync(refrescar_afectados, usuarios=[db_user.id])
+	await db.commit()
+	await db.refresh(db_user)	
 	return db_user	
 
 @router.put("/actualizar_contrasenna/{usuario}", status_code=status.HTTP_201_CREATED) 
 async def actualizar_contrasenna(usuario_actual: Annotated[User_InDB, Security(get_current_user, scopes=["profesor", "cliente", "estudiante"])],
-				usuario: str, password: User_ResetPassword, db: Session = Depends(get_db)):
-	db_user = db.query(User).filter(User.usuario == usuario).first()
+				usuario: str, password: User_ResetPassword, db: AsyncSession = Depends(get_db)):
+	db_user = (await db.execute(select(User).filter(User.usuario == usuario))).scalars().first()
 	if db_user is None:
 		raise HTTPException(status_code=404, detail="Usuario no encontrado en la base de datos")	
-	db_user.hashed_password=pwd_context.hash(password.newpassword)
-	db.commit()
-	db.refresh(db_user)	
+	db_user.hashed_password=await get_password_hash(password.newpassword)
+	await revocaciones.revocar(db, db_user)
+	await refresh.revocar_usuario(db, db_user.id)
+	await db.commit()
+	await db.refresh(db_user)	
 	return {"Resultado": "Contraseña actualizada satisfactoriamente"}
 
-@router.get("/obtener_usuarios/{categoria}", status_code=status.HTTP_201_CREATED) 
+@router.put("/revocar_sesiones/{usuario}", status_code=status.HTTP_201_CREATED) 
+async def revocar_sesiones(usuario_actual: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
+				usuario: str, db: AsyncSession = Depends(get_db)):
+	#Cierra todas las sesiones: refresh tokens y access tokens emitidos
+	db_user = (await db.execute(select(User).filter(User.usuario == usuario))).scalars().first()
+	if db_user is None:
+		raise HTTPException(status_code=404, detail="Usuario no encontrado en la base de datos")
+	await revocaciones.revocar(db, db_user)
+	await refresh.revocar_usuario(db, db_user.id)
+	await db.commit()
+	return {"Resultado": "Sesiones revocadas satisfactoriamente"}
+
+@router.get("/obtener_usuarios/{categoria}", response_model=List[User_Response], status_code=status.HTTP_201_CREATED) 
 async def obtener_usuarios(usuario_actual: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])],
-		categoria: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):    	
+		categoria: str, response: Response, pagina: Pagina = Depends(), db: AsyncSession = Depends(get_db)):    	
 	roles_permitidos = ["admin", "estudiante", "profesor", "cliente", "usuario"]
 	if categoria not in roles_permitidos:
 		raise HTTPException(
 			status_code=status.HTTP_400_BAD_REQUEST,
 			detail=f"Categoría inválida. Opciones válidas: {', '.join(roles_permitidos)}"
 		)
-	db_users_categoria = db.query(User).filter(
-		User.role.contains(categoria)  #User.role.contains([categoria])
-	).offset(skip).limit(limit).all()
+	db_users_categoria = [fila[0] for fila in await paginar(db, select(User).join(User.roles).filter(
+		User_Role.role == categoria
+	), (User.id,), pagina, response)]
 	return db_users_categoria
\ No newline at end of file
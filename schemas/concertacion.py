@@ -1,4 +1,4 @@
-from typing import Union, Optional, List
+from typing import Union, Optional, List, Dict, Any
 from datetime import date
 from pydantic import BaseModel, EmailStr 
 
@@ -24,6 +24,7 @@ class Concertacion_InDB(ConcertacionAdd):
 	conc_activa : bool
 	conc_evaluacion : Union[str, None] = None
 	conc_evaluacion_pred : Union[str, None] = None
+	conc_evaluacion_prob : Union[float, None] = None
 
 class Concertacion_Eval(BaseModel):
 	conc_evaluacion : str #Positiva, Ngativa, Mejorable
@@ -34,3 +35,20 @@ class Concertacion_Activate(BaseModel):
 class Concertacion_Actores(BaseModel):
 	conc_profesor_id : str   
 	conc_cliente_id : str 
+
+class Concertacion_Simulacion(BaseModel):
+	#Atributos comunes a todas las parejas profesor x cliente
+	conc_complejidad : Union[str, None] = None #Alta, Baja, Media
+	conc_actores_externos : Union[int, None] = None
+	profesores : List[str] = []
+	clientes : List[str] = []
+	#Filas hipoteticas completas con las columnas del modelo
+	filas : List[Dict[str, Any]] = []
+	limite : Union[int, None] = None
+
+class Concertacion_Emparejamiento(BaseModel):
+	conc_complejidad : Union[str, None] = None #Alta, Baja, Media
+	conc_actores_externos : Union[int, None] = None
+	universidad : Union[str, None] = None #Solo profesores de esta universidad
+	centro : Union[str, None] = None #Solo clientes de este centro de practicas
+	k : int = 5
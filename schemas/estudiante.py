@@ -42,9 +42,9 @@ class EstudianteSchema(BaseModel):
 	primer_appellido: str
 	segundo_appellido: str
 	email: str
-	id_tarea: UUID
-	tarea_tipo: str
-	tarea_descripcion: str
+	id_tarea: Union[UUID, None] = None
+	tarea_tipo: Union[str, None] = None
+	tarea_descripcion: Union[str, None] = None
 
 	class Config:
 		from_attributes = True  # Permite que Pydantic trabaje con objetos ORM
@@ -0,0 +1,11 @@
+from typing import Union, Optional, List
+from pydantic import BaseModel
+
+class Recalculo(BaseModel):
+	ids : Union[List[str], None] = None
+	solo_activas : bool = True
+
+class Entrenamiento(BaseModel):
+	fuente : str = "archivo" #archivo, db
+	archivo : Union[str, None] = None
+	promover : bool = False
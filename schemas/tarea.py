@@ -1,4 +1,4 @@
-from typing import Union, Optional, List
+from typing import Union, Optional, List, Dict, Any
 from datetime import date
 from pydantic import BaseModel, EmailStr 
 from uuid import UUID
@@ -25,10 +25,34 @@ class Tarea_InDB(TareaAdd):
 	tarea_activa : Union[str, None] = True
 	tarea_evaluacion : Union[str, None] = None
 	tarea_evaluacion_pred : Union[str, None] = None
+	tarea_evaluacion_prob : Union[float, None] = None
 	
 class Tarea_Eval(BaseModel):
 	tarea_evaluacion : str
 
+class Tarea_Propuesta(BaseModel):
+	universidad : Union[str, None] = None #Solo estudiantes de esta universidad
+	minimo : float = 0.0 #Probabilidad minima de exito para proponer una asignacion
+
+class Asignacion(BaseModel):
+	id_estudiante : str
+	id_tarea : str
+
+class Tarea_Asignacion(BaseModel):
+	asignaciones : List[Asignacion]
+
+class Tarea_Simulacion(BaseModel):
+	#Atributos comunes de la tarea y su concertacion para todos los estudiantes
+	conc_complejidad : Union[str, None] = None #Alta, Baja, Media
+	conc_actores_externos : Union[int, None] = None
+	tarea_complejidad_estimada : Union[str, None] = None
+	tarea_participantes : Union[int, None] = None
+	tarea_tipo : Union[str, None] = None
+	estudiantes : List[str] = []
+	#Filas hipoteticas completas con las columnas del modelo
+	filas : List[Dict[str, Any]] = []
+	limite : Union[int, None] = None
+
 
 class TareaSchema(BaseModel):
 	id_conc_tema: UUID
@@ -5,7 +5,14 @@ from pydantic import BaseModel, EmailStr
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Union[str, None] = None
+
+class Token_Refresh(BaseModel):
+	refresh_token: str
 
 class TokenData(BaseModel):
 	usuario: Union[str, None] = None
-	scopes: List[str] = []	
\ No newline at end of file
+	scopes: List[str] = []
+	id: Union[str, None] = None
+	deshabilitado: bool = False
+	token_version: Union[int, None] = None	
\ No newline at end of file
@@ -1,5 +1,6 @@
 from typing import Union, Optional, List
 from datetime import date
+from uuid import UUID
 from pydantic import BaseModel, EmailStr 
 
 class User_Read(BaseModel):	
@@ -27,6 +28,19 @@ class User_InDB(User_Record):
 	id: str
 	deshabilitado: Union[bool, None] = None	
 
+class User_Response(User_List):
+	#Lo que devuelven los endpoints de usuarios: role se lee de user_role, sin el hash de la contraseña
+	id: UUID
+	deshabilitado: Union[bool, None] = None
+
+class User_Principal(BaseModel):
+	#Usuario reconstruido de los claims del token, sin consultar la base de datos
+	id: str
+	usuario: str
+	role: List[str] = []
+	deshabilitado: bool = False
+	token_version: int = 0
+	
 class User_Activate(BaseModel):	
 	deshabilitado: Union[bool, None] = None
 		
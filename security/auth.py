@@ -1,45 +1,112 @@
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status, Security, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, SecurityScopes
 from datetime import datetime, timedelta
+import multiprocessing
+import threading
 from jose import JWTError, jwt
 from pydantic import ValidationError
 from typing_extensions import Annotated
 from typing import Union
-from db.database import get_db
+from db.database import get_db, async_engine
 from core import config
-from models.data import User
+from models.data import User, Token_Revocado
 from schemas.token import TokenData
-from schemas.user import User_InDB
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from schemas.user import User_InDB, User_Principal
+from security.passwords import pwd_context, contrasennas
 
 oauth2_scheme = OAuth2PasswordBearer(
 	tokenUrl="token",
 	scopes={"admin": "Add, edit and delete information.", "profesor": "Create and read information.", "cliente": "Create and read information.", "estudiante": "Create and read information."}
 )
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await contrasennas.verificar(plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await contrasennas.hash(password)
+
+def _minutos_token():
+	return int(config.ACCESS_TOKEN_EXPIRE_MINUTES or 30)
+
+class TokenRevocations:
+	#Usuario -> version minima aceptada, solo para los usuarios con tokens revocados que aun no
+	#expiran: un conjunto pequeño que se revisa en memoria y se recarga de token_revocado
+	#cuando cambia la generacion compartida (creada antes del fork)
+	def __init__(self):
+		self._minimas = {}
+		self._lock = threading.Lock()
+		self._cargada = -1
+		self._generacion = multiprocessing.Value("Q", 0)
+
+	async def _recargar(self):
+		generacion = self._generacion.value
+		async with async_engine.connect() as conn:
+			filas = (await conn.execute(
+				select(Token_Revocado.id_usuario, Token_Revocado.token_version).where(Token_Revocado.expira > datetime.utcnow())
+			)).all()
+		with self._lock:
+			self._minimas = {str(id): version for id, version in filas}
+			self._cargada = generacion
+
+	async def vigente(self, id, version):
+		if self._cargada != self._generacion.value:
+			await self._recargar()
+		minima = self._minimas.get(id)
+		return minima is None or version >= minima
+
+	async def revocar(self, db: AsyncSession, user, eliminado=False):
+		#En la transaccion del endpoint: incrementa token_version y los workers recargan tras el commit.
+		#Un usuario eliminado no emite tokens nuevos, se rechazan todos los que tenga
+		if not eliminado:
+			user.token_version = (user.token_version or 0) + 1
+		ahora = datetime.utcnow()
+		await db.execute(delete(Token_Revocado).where(Token_Revocado.expira <= ahora))
+		await db.merge(Token_Revocado(
+			id_usuario=user.id,
+			token_version=(user.token_version or 0) + (1 if eliminado else 0),
+			expira=ahora + timedelta(minutes=_minutos_token()),
+		))
+		event.listen(db.sync_session, "after_commit", lambda session: self._incrementar(), once=True)
+
+	def _incrementar(self):
+		with self._generacion.get_lock():
+			self._generacion.value += 1
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
 
-def get_user(db: Session, usuario: str):
-	db_user = db.query(User).filter(User.usuario == usuario).first()	
+revocaciones = TokenRevocations()
+
+async def get_user(db: AsyncSession, usuario: str):
+	db_user = (await db.execute(select(User).where(User.usuario == usuario))).scalars().first()	
 	if db_user is not None:
 		return db_user 
 
-def authenticate_user(usuario: str, password: str,  db: Session = Depends(get_db)):
-    user = get_user(db, usuario)
+async def authenticate_user(usuario: str, password: str,  db: AsyncSession = Depends(get_db)):
+    user = await get_user(db, usuario)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password): #secret
+    valido, nuevo_hash = await verify_password(password, user.hashed_password) #secret
+    if not valido:
         return False
+    if nuevo_hash is not None:
+        #Hash con otro costo de bcrypt: se reemplaza con la contraseña ya verificada
+        user.hashed_password = nuevo_hash
+        await db.commit()
+        await db.refresh(user)
     return user
 	
+def token_claims(user):
+	#Lo necesario para autorizar sin consultar User: id, roles, estado y version del token
+	return {
+		"sub": user.usuario,
+		"uid": str(user.id),
+		"scopes": list(user.role),
+		"dis": bool(user.deshabilitado),
+		"ver": user.token_version or 0,
+	}
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -52,8 +119,7 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
 	
 async def get_current_user(
 			security_scopes: SecurityScopes, 
-			token: Annotated[str, Depends(oauth2_scheme)],
-			db: Session = Depends(get_db)):
+			token: Annotated[str, Depends(oauth2_scheme)]):
 	if security_scopes.scopes:
 		authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
 	else:
@@ -71,18 +137,24 @@ async def get_current_user(
 		if usuario is None:
 			raise credentials_exception			
 		token_scopes = payload.get("scopes", [])
-		token_data = TokenData(scopes=token_scopes, usuario=usuario)
+		token_data = TokenData(
+			scopes=token_scopes, 
+			usuario=usuario, 
+			id=payload.get("uid"), 
+			deshabilitado=payload.get("dis", False), 
+			token_version=payload.get("ver"),
+		)
 
 	except (JWTError, ValidationError):
 		raise credentials_exception
-
-	except JWTError:
-		raise credentials_exception
 	
-	user = get_user(db, usuario=token_data.usuario)
-
-	if user is None:
+	#Tokens emitidos sin id o version: hay que volver a autenticarse
+	if token_data.id is None or token_data.token_version is None:
+		raise credentials_exception
+	if not await revocaciones.vigente(token_data.id, token_data.token_version):
 		raise credentials_exception
+	if token_data.deshabilitado:
+		raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuario deshabilitado")
 		
 	for user_scope in security_scopes.scopes:
 		if user_scope not in token_data.scopes:
@@ -92,6 +164,26 @@ async def get_current_user(
 				headers={"WWW-Authenticate": authenticate_value},
 			)
 			
+	return User_Principal(
+		id=token_data.id, 
+		usuario=token_data.usuario, 
+		role=token_data.scopes, 
+		deshabilitado=token_data.deshabilitado, 
+		token_version=token_data.token_version,
+	)
+	
+async def get_current_db_user(
+			current_user: Annotated[User_Principal, Depends(get_current_user)],
+			db: AsyncSession = Depends(get_db)):
+	#Solo para los endpoints que necesitan la fila completa de User (/users/me); los demas
+	#autorizan con los claims del token (get_current_user) sin leer User
+	user = await get_user(db, usuario=current_user.usuario)
+	if user is None or str(user.id) != current_user.id or (user.token_version or 0) != current_user.token_version:
+		raise HTTPException(
+			status_code=status.HTTP_401_UNAUTHORIZED,
+			detail="Imposible validar credenciales para el usuario",
+			headers={"WWW-Authenticate": "Bearer"},
+		)
 	return user
 	
 async def get_current_active_user(current_user: Annotated[User_InDB, Security(get_current_user, scopes=["admin"])]):  
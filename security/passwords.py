@@ -0,0 +1,103 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from core import config
+
+#Con deprecated="auto" un hash con otro costo queda marcado para actualizar (verify_and_update)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config.BCRYPT_ROUNDS)
+
+
+class _Metricas:
+	def __init__(self):
+		self.operaciones = 0
+		self.rechazadas = 0
+		self.rehash = 0
+		self.max_en_cola = 0
+		self.espera_total = 0.0
+		self.espera_maxima = 0.0
+		self.hash_total = 0.0
+
+	def registrar(self, espera, duracion):
+		self.operaciones += 1
+		self.espera_total += espera
+		self.espera_maxima = max(self.espera_maxima, espera)
+		self.hash_total += duracion
+
+	def resumen(self):
+		return {
+			"operaciones": self.operaciones,
+			"rechazadas": self.rechazadas,
+			"rehash": self.rehash,
+			"max_en_cola": self.max_en_cola,
+			"espera_promedio_ms": 1000 * self.espera_total / self.operaciones if self.operaciones else 0,
+			"espera_maxima_ms": 1000 * self.espera_maxima,
+			"bcrypt_promedio_ms": 1000 * self.hash_total / self.operaciones if self.operaciones else 0,
+		}
+
+
+class PasswordPool:
+	#bcrypt en hilos propios (la biblioteca libera el GIL): el event loop sigue atendiendo
+	#las demas solicitudes. Mas de max_pendientes operaciones esperando se rechazan con 503
+	def __init__(self, workers: int, max_pendientes: int):
+		self.workers = workers
+		self.max_pendientes = max_pendientes
+		self._executor = None
+		self._pendientes = 0
+		self._metricas = _Metricas()
+
+	async def _ejecutar(self, funcion, *args):
+		if self._pendientes >= self.max_pendientes:
+			self._metricas.rechazadas += 1
+			raise HTTPException(
+				status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+				detail="Demasiadas solicitudes de autenticación, intente de nuevo",
+				headers={"Retry-After": "1"},
+			)
+		if self._executor is None:
+			self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+		#Solo se modifica desde el event loop, no necesita lock
+		self._pendientes += 1
+		self._metricas.max_en_cola = max(self._metricas.max_en_cola, self._pendientes - self.workers)
+		encolado = time.perf_counter()
+
+		def tarea():
+			inicio = time.perf_counter()
+			resultado = funcion(*args)
+			return resultado, inicio - encolado, time.perf_counter() - inicio
+
+		try:
+			resultado, espera, duracion = await asyncio.get_running_loop().run_in_executor(self._executor, tarea)
+		finally:
+			self._pendientes -= 1
+		self._metricas.registrar(espera, duracion)
+		return resultado
+
+	async def hash(self, password):
+		return await self._ejecutar(pwd_context.hash, password)
+
+	async def verificar(self, password, hashed_password):
+		#(valido, nuevo_hash): nuevo_hash no es None si el costo configurado cambio
+		valido, nuevo_hash = await self._ejecutar(pwd_context.verify_and_update, password, hashed_password)
+		if nuevo_hash is not None:
+			self._metricas.rehash += 1
+		return valido, nuevo_hash
+
+	def detener(self):
+		if self._executor is not None:
+			self._executor.shutdown(wait=False)
+			self._executor = None
+
+	def metricas(self):
+		return {
+			"hilos": self.workers,
+			"en_proceso": self._pendientes,
+			"rounds": config.BCRYPT_ROUNDS,
+			**self._metricas.resumen(),
+		}
+
+
+contrasennas = PasswordPool(workers=config.BCRYPT_WORKERS, max_pendientes=config.BCRYPT_MAX_PENDING)
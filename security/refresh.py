@@ -0,0 +1,84 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete
+
+from core import config
+from models.data import User, Refresh_Token, uuid7
+
+#Refresh tokens opacos y aleatorios: basta un sha256 para buscarlos, sin bcrypt.
+#Cada uso marca el token como usado y emite otro de la misma familia; presentar uno ya
+#usado indica que fue robado y se elimina toda la familia.
+
+
+def _huella(token):
+	return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _credenciales_invalidas():
+	return HTTPException(
+		status_code=status.HTTP_401_UNAUTHORIZED,
+		detail="Refresh token no valido",
+		headers={"WWW-Authenticate": "Bearer"},
+	)
+
+
+async def emitir(db, user, familia=None):
+	#Devuelve el token en claro, solo se conoce en esta respuesta
+	ahora = datetime.utcnow()
+	await db.execute(delete(Refresh_Token).where(
+		Refresh_Token.refresh_user_id == user.id, Refresh_Token.expira <= ahora
+	))
+	token = secrets.token_urlsafe(32)
+	db.add(Refresh_Token(
+		token_hash=_huella(token),
+		familia=familia or uuid7(),
+		refresh_user_id=user.id,
+		creado=ahora,
+		expira=ahora + timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS),
+	))
+	return token
+
+
+async def rotar(db, token):
+	#(usuario, nuevo refresh token); el llamador hace commit
+	ahora = datetime.utcnow()
+	db_token = (await db.execute(select(Refresh_Token).where(Refresh_Token.token_hash == _huella(token)))).scalars().first()
+	if db_token is None or db_token.expira <= ahora:
+		raise _credenciales_invalidas()
+	#Condicional: de dos usos simultaneos del mismo token solo uno lo marca
+	marcado = (await db.execute(
+		update(Refresh_Token)
+		.where(Refresh_Token.id_refresh == db_token.id_refresh, Refresh_Token.usado.is_(None))
+		.values(usado=ahora)
+	)).rowcount
+	if not marcado:
+		await revocar_familia(db, db_token.familia)
+		await db.commit()
+		raise _credenciales_invalidas()
+	user = await db.get(User, db_token.refresh_user_id)
+	if user is None:
+		raise _credenciales_invalidas()
+	if user.deshabilitado:
+		await revocar_usuario(db, user.id)
+		await db.commit()
+		raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuario deshabilitado")
+	return user, await emitir(db, user, db_token.familia)
+
+
+async def revocar_familia(db, familia):
+	await db.execute(delete(Refresh_Token).where(Refresh_Token.familia == familia))
+
+
+async def revocar_token(db, token):
+	#Cierra la sesion de un dispositivo: toda la familia del token presentado
+	familia = (await db.execute(select(Refresh_Token.familia).where(Refresh_Token.token_hash == _huella(token)))).scalar()
+	if familia is not None:
+		await revocar_familia(db, familia)
+
+
+async def revocar_usuario(db, user_id):
+	#Todas las sesiones del usuario
+	await db.execute(delete(Refresh_Token).where(Refresh_Token.refresh_user_id == user_id))
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from ml.features import FeatureEncoder, TAREA_SCHEMAS
+from ml.forest import CompactForest, compactar, muestras_paridad
+from ml.training import construir_pipeline
+
+#El bosque compacto debe reproducir exactamente al de sklearn: INFERENCE_BACKEND=compact lo sirve en su lugar
+
+
+def _datos(schema, n, semilla):
+	rng = np.random.default_rng(semilla)
+	datos = {}
+	for feature in schema.features:
+		if feature.tipo == "cat":
+			datos[feature.nombre] = pd.Series(rng.choice(list(feature.vocabulario), n), dtype=object)
+		elif feature.tipo == "bool":
+			datos[feature.nombre] = rng.integers(0, 2, n).astype(float)
+		else:
+			datos[feature.nombre] = rng.integers(0, 12, n).astype(float)
+	X = pd.DataFrame(datos)
+	y = np.where(rng.random(n) < 0.5, "Positiva", "Mejorable")
+	return X, y
+
+
+@pytest.fixture
+def encoder():
+	schema = TAREA_SCHEMAS[0]
+	X, y = _datos(schema, 300, 0)
+	pipeline = construir_pipeline(schema, n_jobs=1)
+	pipeline.named_steps["classifier"].set_params(n_estimators=15)
+	pipeline.fit(X, y)
+	return FeatureEncoder.desde_modelo(pipeline, TAREA_SCHEMAS)
+
+
+def test_compactar_conserva_predict_proba(encoder):
+	X = muestras_paridad(encoder, 500, semilla=1)
+	antes = encoder.predict_proba(X)
+	paridad = compactar(encoder, n=200)
+	assert isinstance(encoder.clasificador, CompactForest)
+	assert paridad["proba_identica"] and paridad["predict_identico"]
+	assert np.array_equal(encoder.predict_proba(X), antes)
+
+
+def test_compactar_con_archivo_mapeado(encoder, tmp_path):
+	X = muestras_paridad(encoder, 500, semilla=2)
+	antes = encoder.predict_proba(X)
+	ruta = str(tmp_path / "tarea.forest")
+	compactar(encoder, n=200, ruta=ruta)
+	assert isinstance(encoder.clasificador.value, np.memmap)
+	assert np.array_equal(encoder.predict_proba(X), antes)
+
+
+def test_desde_sklearn_en_los_umbrales():
+	#Filas a una diferencia minima de los umbrales de los arboles: sklearn compara en float32 y
+	#el bosque compacto debe tomar la misma rama
+	rng = np.random.default_rng(3)
+	X = rng.normal(size=(400, 6))
+	y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int) + (X[:, 3] > 1)
+	forest = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+	compacto = CompactForest.desde_sklearn(forest)
+	umbrales = {columna: [] for columna in range(X.shape[1])}
+	for estimador in forest.estimators_:
+		tree = estimador.tree_
+		for columna, umbral in zip(tree.feature, tree.threshold):
+			if columna >= 0:
+				umbrales[columna].append(umbral)
+	prueba = rng.normal(size=(1000, 6))
+	for columna, valores in umbrales.items():
+		if valores:
+			prueba[:, columna] = rng.choice(valores, len(prueba)) + rng.choice([-1e-9, 0.0, 1e-9], len(prueba))
+	assert np.array_equal(compacto.predict_proba(prueba), forest.predict_proba(prueba))
+	assert np.array_equal(compacto.predict(prueba), forest.predict(prueba))